@@ -1,5 +1,7 @@
 import os
 from functools import wraps
+from typing import Any, Dict, Optional, Set
+from fastapi import Header, HTTPException
 from flask import request, jsonify
 from supabase_client import supabase
 
@@ -71,3 +73,25 @@ def student_or_admin_required(f):
 
         return f(*args, **kwargs)
     return decorated_function
+
+def _current_user_with_role(authorization: Optional[str], allowed_roles: Set[str]) -> Dict[str, Any]:
+    """Resolve the bearer token of a FastAPI request to its user, requiring one of `allowed_roles`."""
+    if not authorization or not authorization.startswith('Bearer '):
+        raise HTTPException(status_code=401, detail="Authorization token missing or invalid")
+
+    user_id = get_user_id_from_jwt(authorization.split(' ')[1])
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    user_roles = get_user_roles(user_id)
+    if not allowed_roles.intersection(user_roles):
+        raise HTTPException(status_code=403, detail=f"Access denied: one of {sorted(allowed_roles)} roles required")
+    return {"id": user_id, "roles": user_roles}
+
+def get_current_admin_user(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """FastAPI dependency counterpart of admin_required."""
+    return _current_user_with_role(authorization, {'admin'})
+
+def get_current_teacher_or_admin_user(authorization: Optional[str] = Header(None)) -> Dict[str, Any]:
+    """FastAPI dependency for routes open to admins, teachers and counselors."""
+    return _current_user_with_role(authorization, {'admin', 'teacher', 'counselor'})
@@ -0,0 +1,67 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+import pandas as pd
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    """
+    Parse a column to ISO date strings (None where empty or unparseable). The whole column is
+    parsed with one inferred format first; only cells that format missed are parsed one by one.
+    """
+    parsed = pd.to_datetime(values, errors="coerce")
+    missed = parsed.isna() & values.notna()
+    if missed.any():
+        parsed[missed] = pd.to_datetime(values[missed].astype(str), errors="coerce", format="mixed")
+    return parsed.dt.strftime("%Y-%m-%d").astype(object).where(parsed.notna(), None)
+
+def _to_text(values: pd.Series) -> pd.Series:
+    return values.astype(str).where(values.notna(), None)
+
+def normalize_columns(
+    df: pd.DataFrame,
+    columns: Optional[Dict[str, str]] = None,
+    date_columns: Iterable[str] = (),
+    email_columns: Iterable[str] = (),
+    float_columns: Iterable[str] = (),
+    int_columns: Iterable[str] = (),
+    text_columns: Iterable[str] = (),
+    json_columns: Iterable[str] = ()
+) -> pd.DataFrame:
+    """
+    Normalize an uploaded sheet a whole column at a time instead of row by row.
+
+    `columns` maps source column names to output names (e.g. "First Name" -> "first_name") and
+    selects them; a missing source column becomes an all-empty column. The remaining arguments
+    name output columns to convert: dates to ISO strings, emails trimmed and lowercased, numbers
+    coerced (unparseable values become empty, ints truncated), values to text, and dicts/lists
+    serialized as JSON. Empty values are left as NaN/None; frame_to_records turns them into None.
+    """
+    if columns is not None:
+        df = pd.DataFrame(
+            {target: df[source] if source in df.columns else pd.Series(None, index=df.index, dtype=object)
+             for source, target in columns.items()},
+            index=df.index
+        )
+    else:
+        df = df.copy()
+
+    for column in date_columns:
+        df[column] = _parse_dates(df[column])
+    for column in email_columns:
+        values = df[column]
+        df[column] = values.astype(str).str.strip().str.lower().where(values.notna(), None)
+    for column in float_columns:
+        df[column] = pd.to_numeric(df[column], errors="coerce")
+    for column in int_columns:
+        df[column] = np.trunc(pd.to_numeric(df[column], errors="coerce")).astype("Int64")
+    for column in text_columns:
+        df[column] = _to_text(df[column])
+    for column in json_columns:
+        df[column] = df[column].map(lambda value: json.dumps(value) if isinstance(value, (dict, list)) else value)
+    return df
+
+def frame_to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Convert a normalized frame to row dicts in one pass, with every missing value (NaN, NaT, NA) as None.
+    """
+    return df.astype(object).where(df.notna(), None).to_dict("records")
@@ -0,0 +1,53 @@
+import ast
+import json
+import math
+from typing import Any, Dict, Iterable, List
+import pandas as pd
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+def _decode_cell(cell: str) -> Any:
+    try:
+        return _json_loads(cell)
+    except ValueError as json_error:
+        # Older exports wrote nested cells as Python literals (single quotes, True/None)
+        try:
+            return ast.literal_eval(cell)
+        except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+            raise json_error
+
+def decode_json_column(values: Iterable[Any], column: str, errors: List[Dict[str, Any]], first_row: int = 1) -> List[Any]:
+    """
+    Decode a column of JSON cells in one pass. Empty cells decode to None and already-decoded
+    values are kept. A malformed cell decodes to None and is recorded in `errors` as
+    {"row", "column", "error"}, with `row` the 1-based data row number (first_row for the first value).
+    """
+    decoded: List[Any] = []
+    for row_number, cell in enumerate(values, start=first_row):
+        if not isinstance(cell, str):
+            # NaN is how pandas reads an empty cell
+            decoded.append(None if isinstance(cell, float) and math.isnan(cell) else cell)
+            continue
+        if not cell.strip():
+            decoded.append(None)
+            continue
+        try:
+            decoded.append(_decode_cell(cell))
+        except ValueError as e:
+            errors.append({"row": row_number, "column": column, "error": f"Malformed JSON: {e}"})
+            decoded.append(None)
+    return decoded
+
+def decode_json_columns(df: pd.DataFrame, columns: Iterable[str], errors: List[Dict[str, Any]], first_row: int = 1) -> Dict[str, List[Any]]:
+    """
+    Decode every column of `columns` present in `df`, column by column. Returns column -> decoded values.
+    """
+    return {
+        column: decode_json_column(df[column].tolist(), column, errors, first_row)
+        for column in columns
+        if column in df.columns
+    }
@@ -6,7 +6,7 @@ from auth_utils import get_user_id_from_jwt, get_user_roles
 from student_ingestion_route import register_student_ingestion_routes
 
 app = Flask(__name__)
-CORS(app) # Enable CORS for all routes
+CORS(app, expose_headers=["X-Next-Cursor"]) # Enable CORS for all routes
 
 # Register student ingestion and management routes
 register_student_ingestion_routes(app)
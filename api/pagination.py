@@ -0,0 +1,145 @@
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Columns a student list may be sorted by; 'id' is always the tiebreaker for stable keyset ordering
+STUDENT_SORT_COLUMNS = {
+    "id",
+    "full_name",
+    "first_name",
+    "last_name",
+    "grade_level",
+    "academic_year",
+    "status",
+    "major",
+    "advisor",
+    "enrollment_date",
+    "created_at",
+    "latest_gpa",
+    "gpa_delta",
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Response header carrying the cursor for the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(sort_value: Any, row_id: Any) -> str:
+    """
+    Encode the sort value and id of the last row on a page into an opaque cursor.
+    """
+    raw = json.dumps([sort_value, str(row_id)], default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[Any, str]:
+    """
+    Decode a cursor produced by encode_cursor. Raises ValueError if it is malformed.
+    """
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Invalid pagination cursor.")
+    return sort_value, row_id
+
+def _quote(value: Any) -> str:
+    # Double-quote values inside PostgREST logic trees so commas and parentheses are literal
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{text}"'
+
+def apply_student_filters(
+    query: Any,
+    grade_level: Optional[int] = None,
+    status: Optional[str] = None,
+    academic_year: Optional[str] = None,
+    major: Optional[str] = None,
+    advisor: Optional[str] = None,
+    has_504_plan: Optional[bool] = None,
+    email: Optional[str] = None,
+) -> Any:
+    """
+    Push student list filters down to PostgREST. Filters left as None are not applied.
+    The has_504_plan filter requires iep_504_plans(has_plan) to be embedded in the select
+    (see student_select_columns).
+    """
+    if grade_level is not None:
+        query = query.eq("grade_level", grade_level)
+    if status is not None:
+        query = query.eq("status", status)
+    if academic_year is not None:
+        query = query.eq("academic_year", academic_year)
+    if major is not None:
+        query = query.eq("major", major)
+    if advisor is not None:
+        query = query.eq("advisor", advisor)
+    if email is not None:
+        # Emails are stored lowercased; this is a point lookup on the unique email index
+        query = query.eq("email", email.strip().lower())
+    if has_504_plan is not None:
+        # Only embed plans with has_plan = true, then keep students where that embed is (not) empty
+        query = query.eq("iep_504_plans.has_plan", True)
+        if has_504_plan:
+            query = query.not_.is_("iep_504_plans", "null")
+        else:
+            query = query.is_("iep_504_plans", "null")
+    return query
+
+def student_select_columns(columns: str, has_504_plan: Optional[bool] = None) -> str:
+    """
+    Return the select list for a student list query, embedding iep_504_plans when the
+    has_504_plan filter needs it.
+    """
+    if has_504_plan is not None:
+        return f"{columns}, iep_504_plans(has_plan)"
+    return columns
+
+def apply_keyset_page(
+    query: Any,
+    sort: str = "id",
+    descending: bool = False,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+) -> Any:
+    """
+    Order by (sort, id) and seek past the cursor row. One extra row is requested so the
+    caller can tell whether another page exists (see next_page_cursor).
+    Ascending sorts put NULLs last and descending sorts put them first, matching Postgres defaults.
+    """
+    if sort not in STUDENT_SORT_COLUMNS:
+        raise ValueError(f"Cannot sort by '{sort}'.")
+
+    if cursor:
+        last_value, last_id = decode_cursor(cursor)
+        if sort == "id":
+            query = query.lt("id", last_id) if descending else query.gt("id", last_id)
+        elif last_value is None:
+            conditions = [f"and({sort}.is.null,id.gt.{_quote(last_id)})"]
+            if descending:
+                conditions.insert(0, f"{sort}.not.is.null")
+            query = query.or_(",".join(conditions))
+        else:
+            conditions = [
+                f"{sort}.{'lt' if descending else 'gt'}.{_quote(last_value)}",
+                f"and({sort}.eq.{_quote(last_value)},id.gt.{_quote(last_id)})",
+            ]
+            if not descending:
+                conditions.append(f"{sort}.is.null")
+            query = query.or_(",".join(conditions))
+
+    query = query.order(sort, desc=descending)
+    if sort != "id":
+        query = query.order("id")
+    return query.limit(limit + 1)
+
+def next_page_cursor(rows: List[Dict[str, Any]], sort: str, limit: int) -> Optional[str]:
+    """
+    Trim the extra look-ahead row fetched by apply_keyset_page and return the cursor for
+    the next page, or None if this is the last page. Mutates `rows` in place.
+    """
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    last_row = rows[-1]
+    return encode_cursor(last_row.get(sort), last_row["id"])
@@ -1,15 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
 from pydantic import BaseModel, EmailStr, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import date
 from supabase import Client
-from supabase_client import get_supabase_client, supabase_client
+from supabase_client import get_supabase_client, supabase
 from auth_utils import get_current_teacher_or_admin_user, get_current_admin_user
 import pandas as pd
+import numpy as np
 import io
+import os
 from flask import request, jsonify
-from supabase_client import supabase
 from auth_utils import admin_required
+from column_normalization import normalize_columns, frame_to_records
+from pagination import apply_keyset_page, apply_student_filters, next_page_cursor, student_select_columns, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
 
 router = APIRouter()
 
@@ -265,6 +268,134 @@ async def ingest_student_data(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Spreadsheet rows sent per students upsert in upload_students_data
+UPLOAD_STUDENTS_CHUNK_SIZE = int(os.getenv("UPLOAD_STUDENTS_CHUNK_SIZE", "500"))
+
+def upsert_students_by_email(client: Client, student_rows: List[Dict[str, Any]]) -> Tuple[Dict[str, str], List[Dict[str, Any]]]:
+    """
+    Insert new students and update existing ones, matched on the unique email column, with one
+    upsert per UPLOAD_STUDENTS_CHUNK_SIZE rows instead of a lookup and a write per row.
+    Rows repeating an email are merged, the last one winning. Returns email -> student id for
+    every student written, and one {"students", "emails", "error"} entry per failed chunk
+    ("students" is the chunk's range among the merged rows).
+    """
+    rows = list({row["email"]: row for row in student_rows}.values())
+    student_ids: Dict[str, str] = {}
+    failures: List[Dict[str, Any]] = []
+    for chunk_start in range(0, len(rows), UPLOAD_STUDENTS_CHUNK_SIZE):
+        chunk = rows[chunk_start:chunk_start + UPLOAD_STUDENTS_CHUNK_SIZE]
+        try:
+            response = client.table('students').upsert(chunk, on_conflict='email').execute()
+        except Exception as e:
+            print(f"Failed to write students {chunk_start + 1}-{chunk_start + len(chunk)}: {e}")
+            failures.append({
+                "students": f"{chunk_start + 1}-{chunk_start + len(chunk)}",
+                "emails": [row["email"] for row in chunk],
+                "error": getattr(e, "message", None) or str(e),
+            })
+            continue
+        for student in response.data or []:
+            student_ids[student['email']] = student['id']
+    return student_ids, failures
+
+def raise_for_failed_student_chunks(student_ids: Dict[str, str], failures: List[Dict[str, Any]]) -> None:
+    """
+    Fail an upload some of whose student chunks could not be written, listing the failed chunks
+    so the caller can fix and re-upload them (re-uploads update the students already written).
+    """
+    if failures:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail={
+            "message": f"{sum(len(failure['emails']) for failure in failures)} students could not be written; {len(student_ids)} were written.",
+            "failed": failures,
+        })
+
+# Columns of the /upload-students/ sheet
+STUDENT_UPLOAD_COLUMNS = ["first_name", "last_name", "date_of_birth", "enrollment_date", "major", "email", "gpa", "semester", "year"]
+
+def map_student_upload_rows(df: pd.DataFrame) -> Tuple[List[Dict[str, Any]], pd.DataFrame]:
+    """
+    Normalize an /upload-students/ sheet column by column. Returns the students rows and a frame
+    of GPA history (email, gpa, semester, year) for the rows with all three GPA fields.
+    Rows without an email cannot be matched to a student and are skipped.
+    """
+    normalized = normalize_columns(
+        df,
+        {column: column for column in STUDENT_UPLOAD_COLUMNS},
+        date_columns=["date_of_birth", "enrollment_date"],
+        email_columns=["email"],
+        float_columns=["gpa"],
+        int_columns=["year"],
+        text_columns=["semester"]
+    )
+    missing_email = normalized["email"].isna()
+    if missing_email.any():
+        print(f"Skipping {int(missing_email.sum())} rows without an email.")
+        normalized = normalized[~missing_email]
+
+    student_rows = frame_to_records(normalized[["first_name", "last_name", "date_of_birth", "enrollment_date", "major", "email"]])
+    has_gpa = normalized[["gpa", "semester", "year"]].notna().all(axis=1)
+    return student_rows, normalized.loc[has_gpa, ["email", "gpa", "semester", "year"]]
+
+def gpa_history_for_students(pending_gpa_history: pd.DataFrame, student_ids: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    gpa_history rows for the GPA frame from map_student_upload_rows, skipping students whose write failed.
+    """
+    student_id = pending_gpa_history["email"].map(student_ids)
+    linked = pending_gpa_history.assign(student_id=student_id)[student_id.notna()]
+    return frame_to_records(linked[["student_id", "gpa", "semester", "year"]])
+
+# Spreadsheet header -> students column for the Excel uploads
+EXCEL_STUDENT_COLUMNS = {
+    "First Name": "first_name",
+    "Last Name": "last_name",
+    "Date of Birth": "date_of_birth",
+    "Gender": "gender",
+    "Email": "email",
+    "Phone Number": "phone_number",
+    "Address": "address",
+    "City": "city",
+    "State": "state",
+    "Zip Code": "zip_code",
+    "Enrollment Date": "enrollment_date",
+    "Major": "major",
+    "Current GPA": "current_gpa",
+    "Academic Standing": "academic_standing",
+    "Advisor": "advisor",
+    "Expected Graduation Date": "expected_graduation_date",
+    "Profile Picture URL": "profile_picture_url",
+    "User ID": "user_id",  # Assuming User ID is provided in the Excel for linking
+}
+
+def map_excel_students(df: pd.DataFrame) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Normalize an Excel sheet of students (headers as in EXCEL_STUDENT_COLUMNS) column by column.
+    Returns the students rows and, for rows with a Current GPA, gpa_history rows whose "position"
+    is the index of their student in the students rows.
+    """
+    students = normalize_columns(
+        df,
+        EXCEL_STUDENT_COLUMNS,
+        date_columns=["date_of_birth", "enrollment_date", "expected_graduation_date"],
+        float_columns=["current_gpa"]
+    )
+    has_gpa = students["current_gpa"].notna().to_numpy()
+    gpa_history = pd.DataFrame({
+        "position": np.flatnonzero(has_gpa),
+        "gpa": students["current_gpa"].to_numpy()[has_gpa],
+        "date_recorded": str(date.today())
+    })
+    return frame_to_records(students), frame_to_records(gpa_history)
+
+def link_gpa_history(gpa_history: List[Dict[str, Any]], inserted_students: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Attach student ids from the inserted students (returned in insert order) to the gpa_history rows from map_excel_students.
+    """
+    return [
+        {"student_id": inserted_students[row["position"]]["id"], "gpa": row["gpa"], "date_recorded": row["date_recorded"]}
+        for row in gpa_history
+        if row["position"] < len(inserted_students)
+    ]
+
 @router.post("/upload-students/", summary="Upload student data from CSV/Excel", tags=["Admin"])
 async def upload_students_data(
     file: UploadFile = File(...),
@@ -285,59 +416,18 @@ async def upload_students_data(
             raise HTTPException(status_code=400, detail="Unsupported file type. Please upload a CSV or Excel file.")
 
         # Validate required columns
-        required_columns = ["first_name", "last_name", "date_of_birth", "enrollment_date", "major", "email", "gpa", "semester", "year"]
-        if not all(col in df.columns for col in required_columns):
-            raise HTTPException(status_code=400, detail=f"Missing required columns. Ensure all of {required_columns} are present.")
+        if not all(col in df.columns for col in STUDENT_UPLOAD_COLUMNS):
+            raise HTTPException(status_code=400, detail=f"Missing required columns. Ensure all of {STUDENT_UPLOAD_COLUMNS} are present.")
 
-        students_to_insert = []
-        gpa_history_to_insert = []
+        # Normalize whole columns; the student id is filled into GPA history once the students are written
+        student_rows, pending_gpa_history = map_student_upload_rows(df)
 
-        for index, row in df.iterrows():
-            student_email = str(row["email"]).lower()
-            
-            # Check if student already exists by email
-            existing_student_response = supabase.table('students').select('id').eq('email', student_email).limit(1).execute()
-            existing_student_id = None
-            if existing_student_response.data:
-                existing_student_id = existing_student_response.data[0]['id']
-
-            student_data = {
-                "first_name": row["first_name"],
-                "last_name": row["last_name"],
-                "date_of_birth": pd.to_datetime(row["date_of_birth"]).date().isoformat() if pd.notna(row["date_of_birth"]) else None,
-                "enrollment_date": pd.to_datetime(row["enrollment_date"]).date().isoformat() if pd.notna(row["enrollment_date"]) else None,
-                "major": row["major"],
-                "email": student_email
-            }
-
-            if existing_student_id:
-                # Update existing student
-                update_response = supabase.table('students').update(student_data).eq('id', existing_student_id).execute()
-                if update_response.data:
-                    print(f"Updated existing student: {student_email}")
-                    current_student_id = existing_student_id
-                else:
-                    print(f"Failed to update student {student_email}: {update_response.error}")
-                    continue # Skip GPA insertion if student update failed
-            else:
-                # Insert new student
-                insert_response = supabase.table('students').insert(student_data).execute()
-                if insert_response.data:
-                    current_student_id = insert_response.data[0]['id']
-                    print(f"Inserted new student: {student_email}")
-                else:
-                    print(f"Failed to insert new student {student_email}: {insert_response.error}")
-                    continue # Skip GPA insertion if student insertion failed
-
-            # Prepare GPA history data
-            if pd.notna(row["gpa"]) and pd.notna(row["semester"]) and pd.notna(row["year"]):
-                gpa_data = {
-                    "student_id": current_student_id,
-                    "gpa": float(row["gpa"]),
-                    "semester": str(row["semester"]),
-                    "year": int(row["year"])
-                }
-                gpa_history_to_insert.append(gpa_data)
+        # Insert new and update existing students, matched on email, a chunk of rows per request
+        student_ids, failed_chunks = upsert_students_by_email(supabase, student_rows)
+        print(f"Inserted or updated {len(student_ids)} students.")
+
+        # Skip GPA insertion for students whose write failed
+        gpa_history_to_insert = gpa_history_for_students(pending_gpa_history, student_ids)
 
         # Batch insert GPA history
         if gpa_history_to_insert:
@@ -347,6 +437,7 @@ async def upload_students_data(
             else:
                 print(f"Failed to insert GPA history: {gpa_insert_response.error}")
 
+        raise_for_failed_student_chunks(student_ids, failed_chunks)
         return {"message": "Student data uploaded and processed successfully!"}
 
     except HTTPException as e:
@@ -366,7 +457,7 @@ async def create_student_profile(
     try:
         # Insert student_info into the 'students' table
         student_info_data = payload.student_profile.student_info.model_dump(exclude_unset=True)
-        response = supabase_client.from("students").insert(student_info_data).execute()
+        response = supabase.from_("students").insert(student_info_data).execute()
         if response.data:
             student_id = response.data[0]['student_id']
         else:
@@ -381,7 +472,7 @@ async def create_student_profile(
             courses_data = [c.model_dump() for c in payload.student_profile.courses]
             for course in courses_data:
                 course['student_id'] = student_id # Link to the newly created student
-            supabase_client.from("courses").insert(courses_data).execute()
+            supabase.from_("courses").insert(courses_data).execute()
 
         # Similarly for other lists: assessment_breakdown_by_type, gpa_history, extracurricular_activities, college_counseling_milestones
         # And for unstructured data: narrative_teacher_comments, advisory_counselor_notes, behavior_social_emotional_notes
@@ -401,7 +492,7 @@ async def get_all_students(
     Requires 'admin', 'teacher', or 'counselor' role.
     """
     try:
-        response = supabase_client.from("students").select(
+        response = supabase.from_("students").select(
             "student_id:id, full_name, grade_level, academic_year, status, iep_504_plan_information"
         ).execute()
 
@@ -432,13 +523,13 @@ async def get_student_profile(
     """
     try:
         # Fetch student info
-        student_response = supabase_client.from("students").select("*").eq("student_id", student_id).single().execute()
+        student_response = supabase.from_("students").select("*").eq("student_id", student_id).single().execute()
         student_info = student_response.data
         if not student_info:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
 
         # Fetch related data (example for courses)
-        courses_response = supabase_client.from("courses").select("*").eq("student_id", student_id).execute()
+        courses_response = supabase.from_("courses").select("*").eq("student_id", student_id).execute()
         courses = courses_response.data or []
 
         # Construct the full payload
@@ -485,7 +576,7 @@ async def update_student_profile(
         nested_list_updates = {k: v for k, v in update_data.items() if k not in StudentInfoCore.model_fields}
 
         if student_info_updates:
-            response = supabase_client.from("students").update(student_info_updates).eq("student_id", student_id).execute()
+            response = supabase.from_("students").update(student_info_updates).eq("student_id", student_id).execute()
             if not response.data:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found or no changes applied.")
 
@@ -497,11 +588,11 @@ async def update_student_profile(
 
         if "courses" in nested_list_updates and nested_list_updates["courses"] is not None:
             # Delete existing courses for this student and insert new ones
-            supabase_client.from("courses").delete().eq("student_id", student_id).execute()
+            supabase.from_("courses").delete().eq("student_id", student_id).execute()
             new_courses_data = [c.model_dump() for c in nested_list_updates["courses"]]
             for course in new_courses_data:
                 course['student_id'] = student_id
-            supabase_client.from("courses").insert(new_courses_data).execute()
+            supabase.from_("courses").insert(new_courses_data).execute()
         
         # Repeat for other nested lists as needed
 
@@ -524,13 +615,13 @@ async def delete_student_profile(
     try:
         # Delete related data first to avoid foreign key constraints
         # (e.g., courses, attendance, notes, etc.)
-        supabase_client.from("courses").delete().eq("student_id", student_id).execute()
+        supabase.from_("courses").delete().eq("student_id", student_id).execute()
         # ... delete from other related tables ...
 
-        response = supabase_client.from("students").delete().eq("student_id", student_id).execute()
+        response = supabase.from_("students").delete().eq("student_id", student_id).execute()
         if not response.data: # Supabase delete returns empty data on success
             # Check if the student actually existed before deletion
-            check_response = supabase_client.from("students").select("student_id").eq("student_id", student_id).execute()
+            check_response = supabase.from_("students").select("student_id").eq("student_id", student_id).execute()
             if not check_response.data:
                 raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found.")
         return
@@ -554,48 +645,13 @@ def register_student_ingestion_routes(app):
                 df = pd.read_excel(file)
                 # Process DataFrame and insert into Supabase
                 # This is a simplified example. You'd need robust validation and error handling.
-                students_to_insert = []
-                gpa_history_to_insert = []
-
-                for index, row in df.iterrows():
-                    student_data = {
-                        "first_name": row.get("First Name"),
-                        "last_name": row.get("Last Name"),
-                        "date_of_birth": str(row.get("Date of Birth").date()) if pd.notna(row.get("Date of Birth")) else None,
-                        "gender": row.get("Gender"),
-                        "email": row.get("Email"),
-                        "phone_number": row.get("Phone Number"),
-                        "address": row.get("Address"),
-                        "city": row.get("City"),
-                        "state": row.get("State"),
-                        "zip_code": row.get("Zip Code"),
-                        "enrollment_date": str(row.get("Enrollment Date").date()) if pd.notna(row.get("Enrollment Date")) else None,
-                        "major": row.get("Major"),
-                        "current_gpa": row.get("Current GPA"),
-                        "academic_standing": row.get("Academic Standing"),
-                        "advisor": row.get("Advisor"),
-                        "expected_graduation_date": str(row.get("Expected Graduation Date").date()) if pd.notna(row.get("Expected Graduation Date")) else None,
-                        "profile_picture_url": row.get("Profile Picture URL"),
-                        "user_id": row.get("User ID") # Assuming User ID is provided in the CSV for linking
-                    }
-                    students_to_insert.append(student_data)
-
-                    # Assuming GPA history is also in the same row or needs to be derived
-                    if pd.notna(row.get("Current GPA")):
-                        gpa_history_to_insert.append({
-                            "student_id": None, # Will be updated after student insertion
-                            "gpa": row.get("Current GPA"),
-                            "date_recorded": str(pd.Timestamp.now().date())
-                        })
+                students_to_insert, gpa_history = map_excel_students(df)
 
                 # Insert students
                 student_response = supabase.table('students').insert(students_to_insert).execute()
                 if student_response.data:
                     # Link GPA history to newly inserted students
-                    for i, student in enumerate(student_response.data):
-                        if i < len(gpa_history_to_insert):
-                            gpa_history_to_insert[i]["student_id"] = student["id"]
-                    
+                    gpa_history_to_insert = link_gpa_history(gpa_history, student_response.data)
                     if gpa_history_to_insert:
                         supabase.table('gpa_history').insert(gpa_history_to_insert).execute()
 
@@ -609,8 +665,42 @@ def register_student_ingestion_routes(app):
     @app.route('/api/students', methods=['GET'])
     def get_students():
         try:
-            response = supabase.table('students').select('*').execute()
-            return jsonify(response.data), 200
+            limit = min(max(request.args.get('limit', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+            sort = request.args.get('sort', 'id')
+            has_504_plan = request.args.get('has_504_plan')
+            if has_504_plan is not None:
+                has_504_plan = has_504_plan.lower() == 'true'
+
+            query = supabase.table('students').select(student_select_columns('*', has_504_plan))
+            query = apply_student_filters(
+                query,
+                grade_level=request.args.get('grade_level', type=int),
+                status=request.args.get('status'),
+                academic_year=request.args.get('academic_year'),
+                major=request.args.get('major'),
+                advisor=request.args.get('advisor'),
+                has_504_plan=has_504_plan,
+                email=request.args.get('email'),
+            )
+            try:
+                query = apply_keyset_page(
+                    query,
+                    sort=sort,
+                    descending=request.args.get('order', 'asc') == 'desc',
+                    cursor=request.args.get('cursor'),
+                    limit=limit,
+                )
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+
+            response = query.execute()
+            students = response.data or []
+            next_cursor = next_page_cursor(students, sort, limit)
+            for student in students:
+                student.pop('iep_504_plans', None)
+
+            headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else {}
+            return jsonify(students), 200, headers
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
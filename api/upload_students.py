@@ -1,28 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from supabase import Client
-from supabase_client import get_supabase_client, supabase_client
+from supabase_client import get_supabase_client, supabase
 import pandas as pd
 import io
 from datetime import date
-from pydantic import BaseModel, EmailStr
-from student_ingestion_route import StudentIngestionPayload, StudentProfileData, StudentInfoCore, Course, GPAHistoryEntry, ExtracurricularActivity, CollegeMilestone, NarrativeComment, StaffNote, SoftSkillInference, UnstructuredData, AssessmentBreakdown, AttendanceData, IEP504Plan
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, EmailStr, ValidationError
+from student_ingestion_route import StudentIngestionPayload, upsert_students_by_email, raise_for_failed_student_chunks, map_student_upload_rows, gpa_history_for_students, map_excel_students, link_gpa_history, STUDENT_UPLOAD_COLUMNS
+from typing import List, Dict, Any, Optional, Tuple
 from auth_utils import get_current_admin_user
+from csv_decoding import decode_json_columns
 import os
 from dotenv import load_dotenv
 
 # Load environment variables from .env file if running locally
 load_dotenv()
 
-def get_supabase_client() -> Client:
-    url: str = os.environ.get("SUPABASE_URL")
-    key: str = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") # Use service role key for backend
-    if not url or not key:
-        raise ValueError("Supabase URL and Service Role Key must be set in environment variables.")
-    return create_client(url, key)
-
-supabase: Client = get_supabase_client()
-
 router = APIRouter()
 
 class StudentProfileUpload(BaseModel):
@@ -43,164 +35,111 @@ class StudentProfileUpload(BaseModel):
     financial_aid_status: str
     scholarship_amount: float
 
-def parse_csv_to_student_payloads(contents: bytes) -> List[StudentIngestionPayload]:
+# CSV columns copied onto StudentInfoCore
+STUDENT_INFO_CSV_COLUMNS = [
+    "first_name", "last_name", "email", "enrollment_date", "grade_level", "academic_year", "gender",
+    "phone_number", "address", "city", "state", "zip_code", "date_of_birth", "major", "gpa",
+    "academic_standing", "advisor_id", "emergency_contact_name", "emergency_contact_phone",
+    "medical_conditions", "notes", "status", "advisor", "enrollment_status", "financial_aid_status",
+    "scholarship_amount",
+]
+
+# Nested CSV columns (one JSON list or object per cell) and where each goes in StudentIngestionPayload
+NESTED_CSV_COLUMNS = {
+    "courses": ("student_profile", "courses"),
+    "assessment_breakdown_by_type": ("student_profile", "assessment_breakdown_by_type"),
+    "gpa_history": ("student_profile", "gpa_history"),
+    "attendance": ("student_profile", "attendance"),
+    "extracurricular_activities": ("student_profile", "extracurricular_activities"),
+    "iep_504_plan_information": ("student_profile", "iep_504_plan_information"),
+    "college_counseling_milestones": ("student_profile", "college_counseling_milestones"),
+    "narrative_teacher_comments": ("unstructured_data", "narrative_teacher_comments"),
+    "advisory_counselor_notes": ("unstructured_data", "advisory_counselor_notes"),
+    "behavior_social_emotional_notes": ("unstructured_data", "behavior_social_emotional_notes"),
+    "soft_skill_inferences": ("soft_skill_inferences",),
+}
+
+# Nested columns holding a single object; the others hold lists
+NESTED_CSV_OBJECT_COLUMNS = {"attendance", "iep_504_plan_information"}
+
+def _error_column(loc: Tuple[Any, ...]) -> str:
+    # Name the CSV column a validation error location points at
+    for column, path in NESTED_CSV_COLUMNS.items():
+        if tuple(loc[:len(path)]) == path:
+            return column
+    if tuple(loc[:2]) == ("student_profile", "student_info") and len(loc) > 2:
+        return str(loc[2])
+    return ".".join(str(part) for part in loc)
+
+def _nested_target(row: Dict[str, Any], column: str) -> Tuple[Dict[str, Any], str]:
+    # The dict and key holding a nested column's value in an assembled payload row
+    *parents, field = NESTED_CSV_COLUMNS[column]
+    target = row
+    for parent in parents:
+        target = target[parent]
+    return target, field
+
+def _validate_csv_row(row: Dict[str, Any], row_number: int, errors: List[Dict[str, Any]]) -> Optional[StudentIngestionPayload]:
+    """
+    Validate one assembled row. A nested section that fails validation is reported and dropped,
+    keeping the rest of the row; errors in the student's own columns reject the row.
+    """
+    try:
+        return StudentIngestionPayload.model_validate(row)
+    except ValidationError as e:
+        failed_columns = {_error_column(error["loc"]) for error in e.errors()}
+        for error in e.errors():
+            errors.append({"row": row_number, "column": _error_column(error["loc"]), "error": error["msg"]})
+        if not failed_columns <= NESTED_CSV_COLUMNS.keys():
+            return None
+
+    for column in failed_columns:
+        target, field = _nested_target(row, column)
+        target.pop(field, None)
+    return StudentIngestionPayload.model_validate(row)
+
+def parse_csv_to_student_payloads(contents: bytes) -> Tuple[List[StudentIngestionPayload], List[Dict[str, Any]]]:
+    """
+    Parse a CSV of student profiles into ingestion payloads. Nested columns are decoded column by
+    column as JSON instead of per cell, and each row is validated in a single model_validate call.
+    Returns the payloads and the problems found as {"row", "column", "error"} entries: malformed
+    or invalid nested cells leave that section empty, invalid student columns skip the row.
+    """
     df = pd.read_csv(io.StringIO(contents.decode('utf-8')))
-    payloads: List[StudentIngestionPayload] = []
+    errors: List[Dict[str, Any]] = []
+    nested_columns = decode_json_columns(df, NESTED_CSV_COLUMNS, errors)
+    # Missing cells become None once per column rather than per value
+    info_columns = {
+        column: df[column].astype(object).where(df[column].notna(), None).tolist()
+        for column in STUDENT_INFO_CSV_COLUMNS
+        if column in df.columns
+    }
 
-    for index, row in df.iterrows():
-        # Basic Student Info
-        student_info = StudentInfoCore(
-            first_name=row['first_name'],
-            last_name=row['last_name'],
-            full_name=f"{row['first_name']} {row['last_name']}",
-            email=row['email'],
-            enrollment_date=row['enrollment_date'],
-            grade_level=int(row['grade_level']),
-            academic_year=row['academic_year'],
-            gender=row.get('gender', 'Unknown'),
-            phone_number=row.get('phone_number'),
-            address=row.get('address'),
-            city=row.get('city'),
-            state=row.get('state'),
-            zip_code=row.get('zip_code'),
-            date_of_birth=row.get('date_of_birth'),
-            major=row.get('major'),
-            gpa=float(row['gpa']) if pd.notna(row.get('gpa')) else None,
-            academic_standing=row.get('academic_standing'),
-            advisor_id=row.get('advisor_id'),
-            emergency_contact_name=row.get('emergency_contact_name'),
-            emergency_contact_phone=row.get('emergency_contact_phone'),
-            medical_conditions=row.get('medical_conditions'),
-            notes=row.get('notes'),
-            status=row.get('status', 'None'),
-            advisor=row.get('advisor'),
-            enrollment_status=row.get('enrollment_status'),
-            financial_aid_status=row.get('financial_aid_status'),
-            scholarship_amount=float(row['scholarship_amount']) if pd.notna(row.get('scholarship_amount')) else None,
-            assessment_breakdown_by_type=[] # Will be populated below if available
-        )
-
-        # Nested data (assuming JSON strings in CSV or separate columns)
-        courses = []
-        if 'courses' in row and pd.notna(row['courses']):
-            try:
-                courses_data = eval(row['courses']) # Use ast.literal_eval in production for safety
-                for c in courses_data:
-                    courses.append(Course(**c))
-            except:
-                pass # Handle parsing errors
-
-        gpa_history = []
-        if 'gpa_history' in row and pd.notna(row['gpa_history']):
-            try:
-                gpa_history_data = eval(row['gpa_history'])
-                for gpa_entry in gpa_history_data:
-                    gpa_history.append(GPAHistoryEntry(**gpa_entry))
-            except:
-                pass
-
-        extracurricular_activities = []
-        if 'extracurricular_activities' in row and pd.notna(row['extracurricular_activities']):
-            try:
-                activities_data = eval(row['extracurricular_activities'])
-                for activity in activities_data:
-                    extracurricular_activities.append(ExtracurricularActivity(**activity))
-            except:
-                pass
-
-        college_counseling_milestones = []
-        if 'college_counseling_milestones' in row and pd.notna(row['college_counseling_milestones']):
-            try:
-                milestones_data = eval(row['college_counseling_milestones'])
-                for milestone in milestones_data:
-                    college_counseling_milestones.append(CollegeMilestone(**milestone))
-            except:
-                pass
-
-        narrative_teacher_comments = []
-        if 'narrative_teacher_comments' in row and pd.notna(row['narrative_teacher_comments']):
-            try:
-                comments_data = eval(row['narrative_teacher_comments'])
-                for comment in comments_data:
-                    narrative_teacher_comments.append(NarrativeComment(**comment))
-            except:
-                pass
-
-        advisory_counselor_notes = []
-        if 'advisory_counselor_notes' in row and pd.notna(row['advisory_counselor_notes']):
-            try:
-                notes_data = eval(row['advisory_counselor_notes'])
-                for note in notes_data:
-                    advisory_counselor_notes.append(StaffNote(**note))
-            except:
-                pass
-
-        behavior_social_emotional_notes = []
-        if 'behavior_social_emotional_notes' in row and pd.notna(row['behavior_social_emotional_notes']):
-            try:
-                notes_data = eval(row['behavior_social_emotional_notes'])
-                for note in notes_data:
-                    behavior_social_emotional_notes.append(StaffNote(**note))
-            except:
-                pass
-
-        soft_skill_inferences = []
-        if 'soft_skill_inferences' in row and pd.notna(row['soft_skill_inferences']):
-            try:
-                inferences_data = eval(row['soft_skill_inferences'])
-                for inference in inferences_data:
-                    soft_skill_inferences.append(SoftSkillInference(**inference))
-            except:
-                pass
-
-        assessment_breakdown_by_type = []
-        if 'assessment_breakdown_by_type' in row and pd.notna(row['assessment_breakdown_by_type']):
-            try:
-                breakdown_data = eval(row['assessment_breakdown_by_type'])
-                for breakdown in breakdown_data:
-                    assessment_breakdown_by_type.append(AssessmentBreakdown(**breakdown))
-            except:
-                pass
-
-        attendance = None
-        if 'attendance' in row and pd.notna(row['attendance']):
-            try:
-                attendance_data = eval(row['attendance'])
-                attendance = AttendanceData(**attendance_data)
-            except:
-                pass
-
-        iep_504_plan_information = None
-        if 'iep_504_plan_information' in row and pd.notna(row['iep_504_plan_information']):
-            try:
-                iep_data = eval(row['iep_504_plan_information'])
-                iep_504_plan_information = IEP504Plan(**iep_data)
-            except:
-                pass
-
-        student_profile_data = StudentProfileData(
-            student_info=student_info,
-            courses=courses,
-            assessment_breakdown_by_type=assessment_breakdown_by_type,
-            gpa_history=gpa_history,
-            attendance=attendance,
-            extracurricular_activities=extracurricular_activities,
-            iep_504_plan_information=iep_504_plan_information,
-            college_counseling_milestones=college_counseling_milestones,
-        )
-
-        unstructured_data = UnstructuredData(
-            narrative_teacher_comments=narrative_teacher_comments,
-            advisory_counselor_notes=advisory_counselor_notes,
-            behavior_social_emotional_notes=behavior_social_emotional_notes,
-        )
-
-        payloads.append(StudentIngestionPayload(
-            student_profile=student_profile_data,
-            unstructured_data=unstructured_data,
-            soft_skill_inferences=soft_skill_inferences,
-        ))
-    return payloads
+    payloads: List[StudentIngestionPayload] = []
+    for position in range(len(df)):
+        student_info = {column: values[position] for column, values in info_columns.items() if values[position] is not None}
+        student_info["full_name"] = f"{student_info.get('first_name')} {student_info.get('last_name')}"
+        if student_info.get("gender") is None:
+            student_info["gender"] = "Unknown"
+        if student_info.get("status") is None:
+            student_info["status"] = "None"
+
+        student_info["assessment_breakdown_by_type"] = []
+
+        row: Dict[str, Any] = {"student_profile": {"student_info": student_info}, "unstructured_data": {}}
+        for column in NESTED_CSV_COLUMNS:
+            value = nested_columns[column][position] if column in nested_columns else None
+            # Empty lists are passed explicitly: validating them is far cheaper than pydantic copying list defaults
+            if value is None and column not in NESTED_CSV_OBJECT_COLUMNS:
+                value = []
+            if value is not None:
+                target, field = _nested_target(row, column)
+                target[field] = value
+
+        payload = _validate_csv_row(row, position + 1, errors)
+        if payload is not None:
+            payloads.append(payload)
+    return payloads, errors
 
 def upload_students_to_supabase(payloads: List[StudentIngestionPayload], supabase: Client):
     for payload in payloads:
@@ -287,48 +226,14 @@ def upload_students_from_excel(file_path):
     try:
         df = pd.read_excel(file_path)
 
-        students_to_insert = []
-        gpa_history_to_insert = []
-
-        for index, row in df.iterrows():
-            student_data = {
-                "first_name": row.get("First Name"),
-                "last_name": row.get("Last Name"),
-                "date_of_birth": str(row.get("Date of Birth").date()) if pd.notna(row.get("Date of Birth")) else None,
-                "gender": row.get("Gender"),
-                "email": row.get("Email"),
-                "phone_number": row.get("Phone Number"),
-                "address": row.get("Address"),
-                "city": row.get("City"),
-                "state": row.get("State"),
-                "zip_code": row.get("Zip Code"),
-                "enrollment_date": str(row.get("Enrollment Date").date()) if pd.notna(row.get("Enrollment Date")) else None,
-                "major": row.get("Major"),
-                "current_gpa": row.get("Current GPA"),
-                "academic_standing": row.get("Academic Standing"),
-                "advisor": row.get("Advisor"),
-                "expected_graduation_date": str(row.get("Expected Graduation Date").date()) if pd.notna(row.get("Expected Graduation Date")) else None,
-                "profile_picture_url": row.get("Profile Picture URL"),
-                "user_id": row.get("User ID") # Assuming User ID is provided in the Excel for linking
-            }
-            students_to_insert.append(student_data)
-
-            if pd.notna(row.get("Current GPA")):
-                gpa_history_to_insert.append({
-                    "student_id": None, # Will be updated after student insertion
-                    "gpa": row.get("Current GPA"),
-                    "date_recorded": str(pd.Timestamp.now().date())
-                })
+        students_to_insert, gpa_history = map_excel_students(df)
 
         # Insert students
         student_response = supabase.table('students').insert(students_to_insert).execute()
         if student_response.data:
             print(f"Inserted {len(student_response.data)} students.")
             # Link GPA history to newly inserted students
-            for i, student in enumerate(student_response.data):
-                if i < len(gpa_history_to_insert):
-                    gpa_history_to_insert[i]["student_id"] = student["id"]
-            
+            gpa_history_to_insert = link_gpa_history(gpa_history, student_response.data)
             if gpa_history_to_insert:
                 gpa_response = supabase.table('gpa_history').insert(gpa_history_to_insert).execute()
                 print(f"Inserted {len(gpa_response.data)} GPA history records.")
@@ -350,9 +255,9 @@ async def upload_students_csv_direct(
 
     try:
         contents = await file.read()
-        student_payloads = parse_csv_to_student_payloads(contents)
+        student_payloads, row_errors = parse_csv_to_student_payloads(contents)
         upload_students_to_supabase(student_payloads, supabase)
-        return {"message": f"Successfully uploaded {len(student_payloads)} student profiles."}
+        return {"message": f"Successfully uploaded {len(student_payloads)} student profiles.", "errors": row_errors}
     except pd.errors.EmptyDataError:
         raise HTTPException(status_code=400, detail="CSV file is empty.")
     except pd.errors.ParserError:
@@ -380,59 +285,18 @@ async def upload_students_data(
             raise HTTPException(status_code=400, detail="Unsupported file type. Please upload a CSV or Excel file.")
 
         # Validate required columns
-        required_columns = ["first_name", "last_name", "date_of_birth", "enrollment_date", "major", "email", "gpa", "semester", "year"]
-        if not all(col in df.columns for col in required_columns):
-            raise HTTPException(status_code=400, detail=f"Missing required columns. Ensure all of {required_columns} are present.")
+        if not all(col in df.columns for col in STUDENT_UPLOAD_COLUMNS):
+            raise HTTPException(status_code=400, detail=f"Missing required columns. Ensure all of {STUDENT_UPLOAD_COLUMNS} are present.")
 
-        students_to_insert = []
-        gpa_history_to_insert = []
+        # Normalize whole columns; the student id is filled into GPA history once the students are written
+        student_rows, pending_gpa_history = map_student_upload_rows(df)
 
-        for index, row in df.iterrows():
-            student_email = str(row["email"]).lower()
-            
-            # Check if student already exists by email
-            existing_student_response = supabase.table('students').select('id').eq('email', student_email).limit(1).execute()
-            existing_student_id = None
-            if existing_student_response.data:
-                existing_student_id = existing_student_response.data[0]['id']
-
-            student_data = {
-                "first_name": row["first_name"],
-                "last_name": row["last_name"],
-                "date_of_birth": pd.to_datetime(row["date_of_birth"]).date().isoformat() if pd.notna(row["date_of_birth"]) else None,
-                "enrollment_date": pd.to_datetime(row["enrollment_date"]).date().isoformat() if pd.notna(row["enrollment_date"]) else None,
-                "major": row["major"],
-                "email": student_email
-            }
-
-            if existing_student_id:
-                # Update existing student
-                update_response = supabase.table('students').update(student_data).eq('id', existing_student_id).execute()
-                if update_response.data:
-                    print(f"Updated existing student: {student_email}")
-                    current_student_id = existing_student_id
-                else:
-                    print(f"Failed to update student {student_email}: {update_response.error}")
-                    continue # Skip GPA insertion if student update failed
-            else:
-                # Insert new student
-                insert_response = supabase.table('students').insert(student_data).execute()
-                if insert_response.data:
-                    current_student_id = insert_response.data[0]['id']
-                    print(f"Inserted new student: {student_email}")
-                else:
-                    print(f"Failed to insert new student {student_email}: {insert_response.error}")
-                    continue # Skip GPA insertion if student insertion failed
-
-            # Prepare GPA history data
-            if pd.notna(row["gpa"]) and pd.notna(row["semester"]) and pd.notna(row["year"]):
-                gpa_data = {
-                    "student_id": current_student_id,
-                    "gpa": float(row["gpa"]),
-                    "semester": str(row["semester"]),
-                    "year": int(row["year"])
-                }
-                gpa_history_to_insert.append(gpa_data)
+        # Insert new and update existing students, matched on email, a chunk of rows per request
+        student_ids, failed_chunks = upsert_students_by_email(supabase, student_rows)
+        print(f"Inserted or updated {len(student_ids)} students.")
+
+        # Skip GPA insertion for students whose write failed
+        gpa_history_to_insert = gpa_history_for_students(pending_gpa_history, student_ids)
 
         # Batch insert GPA history
         if gpa_history_to_insert:
@@ -442,6 +306,7 @@ async def upload_students_data(
             else:
                 print(f"Failed to insert GPA history: {gpa_insert_response.error}")
 
+        raise_for_failed_student_chunks(student_ids, failed_chunks)
         return {"message": "Student data uploaded and processed successfully!"}
 
     except HTTPException as e:
@@ -2,10 +2,11 @@ import os
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import jwt, JWTError
+from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends, Request, APIRouter
 from pydantic import BaseModel, EmailStr
 from supabase import Client
-from supabase_client import get_supabase_client, supabase
+from supabase_client import get_supabase_client, execute_query, run_blocking
 from fastapi.security import OAuth2PasswordBearer
 
 # Password hashing context
@@ -80,6 +81,9 @@ async def get_current_active_user(current_user: TokenData = Depends(get_current_
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_current_user_role(current_user: TokenData = Depends(get_current_user)) -> str:
+    return current_user.role
+
 async def get_current_admin_user(current_user: TokenData = Depends(get_current_user)) -> TokenData:
     if current_user.role != "admin":
         raise HTTPException(
@@ -89,15 +93,15 @@ async def get_current_admin_user(current_user: TokenData = Depends(get_current_u
     return current_user
 
 @router.post("/login")
-async def login_for_access_token(user_login: UserLogin):
-    response = supabase.auth.sign_in_with_password({
+async def login_for_access_token(user_login: UserLogin, supabase: Client = Depends(get_supabase_client)):
+    response = await run_blocking(supabase.auth.sign_in_with_password, {
         "email": user_login.email,
         "password": user_login.password,
     })
 
     if response.user:
         # Fetch user's role from your 'users' table
-        user_data_res = supabase.from_("users").select("role").eq("id", response.user.id).single().execute()
+        user_data_res = await execute_query(supabase.from_("users").select("role").eq("id", response.user.id).single())
         user_role = user_data_res.data["role"] if user_data_res.data else "default"
 
         # Create a custom JWT that includes the role
@@ -120,9 +124,9 @@ async def read_users_me(current_user: TokenData = Depends(get_current_user)):
     return {"role": current_user.role}
 
 @router.post("/admin/users", status_code=status.HTTP_201_CREATED)
-async def create_user(user_create: UserLogin, current_admin_user: TokenData = Depends(get_current_admin_user)):
+async def create_user(user_create: UserLogin, supabase: Client = Depends(get_supabase_client), current_admin_user: TokenData = Depends(get_current_admin_user)):
     # Create user in Supabase Auth
-    auth_response = supabase.auth.admin.create_user({
+    auth_response = await run_blocking(supabase.auth.admin.create_user, {
         "email": user_create.email,
         "password": user_create.password,
         "email_confirm": True # Automatically confirm email for admin created users
@@ -130,23 +134,23 @@ async def create_user(user_create: UserLogin, current_admin_user: TokenData = De
 
     if auth_response.user:
         # Insert user into your 'users' table with role
-        db_response = supabase.from_("users").insert({
+        db_response = await execute_query(supabase.from_("users").insert({
             "id": str(auth_response.user.id), # Ensure UUID is converted to string
             "email": user_create.email,
             "role": "default" # Assuming a default role for simplicity
-        }).execute()
+        }))
         if db_response.data:
             return {"message": "User created successfully", "user_id": str(auth_response.user.id)}
         else:
             # If DB insert fails, consider deleting the auth user or logging
-            supabase.auth.admin.delete_user(str(auth_response.user.id))
+            await run_blocking(supabase.auth.admin.delete_user, str(auth_response.user.id))
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to save user role")
     else:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=auth_response.error.message)
 
 @router.get("/admin/users", status_code=status.HTTP_200_OK)
-async def get_users(current_admin_user: TokenData = Depends(get_current_admin_user)):
-    response = supabase.from_("users").select("id, email, role").execute()
+async def get_users(supabase: Client = Depends(get_supabase_client), current_admin_user: TokenData = Depends(get_current_admin_user)):
+    response = await execute_query(supabase.from_("users").select("id, email, role"))
     if response.data:
         return response.data
     if response.error:
@@ -154,13 +158,13 @@ async def get_users(current_admin_user: TokenData = Depends(get_current_admin_us
     return []
 
 @router.patch("/admin/users/{user_id}", status_code=status.HTTP_200_OK)
-async def update_user(user_id: str, user_update: UserUpdate, current_admin_user: TokenData = Depends(get_current_admin_user)):
+async def update_user(user_id: str, user_update: UserUpdate, supabase: Client = Depends(get_supabase_client), current_admin_user: TokenData = Depends(get_current_admin_user)):
     update_data = user_update.model_dump(exclude_unset=True)
     if not update_data:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No fields to update")
 
     # Update in 'users' table
-    response = supabase.from_("users").update(update_data).eq("id", user_id).execute()
+    response = await execute_query(supabase.from_("users").update(update_data).eq("id", user_id))
     if response.data:
         return {"message": "User updated successfully", "user_id": user_id}
     if response.error:
@@ -168,14 +172,14 @@ async def update_user(user_id: str, user_update: UserUpdate, current_admin_user:
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found or no changes made")
 
 @router.delete("/admin/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_user(user_id: str, current_admin_user: TokenData = Depends(get_current_admin_user)):
+async def delete_user(user_id: str, supabase: Client = Depends(get_supabase_client), current_admin_user: TokenData = Depends(get_current_admin_user)):
     # Delete from Supabase Auth
-    auth_response = supabase.auth.admin.delete_user(user_id)
+    auth_response = await run_blocking(supabase.auth.admin.delete_user, user_id)
     if auth_response.error:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=auth_response.error.message)
 
     # Delete from 'users' table
-    db_response = supabase.from_("users").delete().eq("id", user_id).execute()
+    db_response = await execute_query(supabase.from_("users").delete().eq("id", user_id))
     if db_response.error:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=db_response.error.message)
     return
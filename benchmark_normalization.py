@@ -0,0 +1,239 @@
+"""
+Benchmark for the column-wise upload normalization.
+
+Generates synthetic upload sheets and times column_normalization against the
+previous DataFrame.iterrows loops of upload_students_data, the Excel upload
+handler and upload_students_from_dataframe.
+
+Usage: python benchmark_normalization.py [row_count ...]
+"""
+import json
+import sys
+import time
+from datetime import date
+import numpy as np
+import pandas as pd
+from column_normalization import normalize_columns, frame_to_records
+
+MAJORS = ["Biology", "History", "Mathematics", "Computer Science", None]
+SEMESTERS = ["Fall", "Spring", None]
+
+def generate_upload_sheet(row_count, seed=42):
+    """
+    An /upload-students/ sheet as read from CSV: dates and emails as text, some GPA fields empty.
+    """
+    rng = np.random.default_rng(seed)
+    birth_dates = pd.Timestamp("2004-01-01") + pd.to_timedelta(rng.integers(0, 1500, row_count), unit="D")
+    enrollment_dates = pd.Timestamp("2020-08-15") + pd.to_timedelta(rng.integers(0, 1200, row_count), unit="D")
+    gpa = np.round(rng.uniform(1.0, 4.0, row_count), 2)
+    gpa[rng.random(row_count) < 0.1] = np.nan
+    return pd.DataFrame({
+        "first_name": [f"First{i}" for i in range(row_count)],
+        "last_name": [f"Last{i}" for i in range(row_count)],
+        "date_of_birth": birth_dates.strftime("%Y-%m-%d"),
+        "enrollment_date": enrollment_dates.strftime("%Y-%m-%d"),
+        "major": rng.choice(np.array(MAJORS, dtype=object), row_count),
+        "email": [f"Student.{i}@School.EDU" for i in range(row_count)],
+        "gpa": gpa,
+        "semester": rng.choice(np.array(SEMESTERS, dtype=object), row_count),
+        "year": rng.integers(2021, 2026, row_count),
+    })
+
+def generate_excel_sheet(row_count, seed=42):
+    """
+    An Excel students sheet as read_excel returns it: title-case headers and Timestamp dates.
+    """
+    rng = np.random.default_rng(seed)
+    gpa = np.round(rng.uniform(1.0, 4.0, row_count), 2)
+    gpa[rng.random(row_count) < 0.2] = np.nan
+    graduation = pd.Series(pd.Timestamp("2026-05-15") + pd.to_timedelta(rng.integers(0, 1000, row_count), unit="D"))
+    graduation[rng.random(row_count) < 0.3] = pd.NaT
+    return pd.DataFrame({
+        "First Name": [f"First{i}" for i in range(row_count)],
+        "Last Name": [f"Last{i}" for i in range(row_count)],
+        "Date of Birth": pd.Timestamp("2004-01-01") + pd.to_timedelta(rng.integers(0, 1500, row_count), unit="D"),
+        "Gender": rng.choice(["Female", "Male", "Nonbinary"], row_count),
+        "Email": [f"student{i}@school.edu" for i in range(row_count)],
+        "Phone Number": [f"555-{i % 10000:04d}" for i in range(row_count)],
+        "City": rng.choice(["Springfield", "Riverton", "Lakeside"], row_count),
+        "State": rng.choice(["CA", "NY", "TX"], row_count),
+        "Zip Code": rng.integers(10000, 99999, row_count),
+        "Enrollment Date": pd.Timestamp("2020-08-15") + pd.to_timedelta(rng.integers(0, 1200, row_count), unit="D"),
+        "Major": rng.choice(np.array(MAJORS, dtype=object), row_count),
+        "Current GPA": gpa,
+        "Expected Graduation Date": graduation,
+    })
+
+def generate_student_frame(row_count, seed=42):
+    """
+    A frame for upload_students_from_dataframe: JSONB columns as dicts/lists, some cells empty.
+    """
+    rng = np.random.default_rng(seed)
+    student_ids = pd.Series([f"S{i:07d}" for i in range(row_count)], dtype=object)
+    student_ids[rng.random(row_count) < 0.05] = None
+    grade_level = rng.integers(9, 13, row_count).astype(float)
+    grade_level[rng.random(row_count) < 0.1] = np.nan
+    return pd.DataFrame({
+        "student_id": student_ids,
+        "full_name": [f"Student {i}" for i in range(row_count)],
+        "grade_level": grade_level,
+        "attendance": [{"excused": int(e), "unexcused": 0} for e in rng.integers(0, 5, row_count)],
+        "soft_skills": [["Teamwork"] if flag else None for flag in rng.random(row_count) < 0.5],
+    })
+
+def legacy_upload_rows(df):
+    """
+    The per-row mapping upload_students_data used before column_normalization.
+    """
+    student_rows = []
+    pending_gpa_history = []
+    for index, row in df.iterrows():
+        student_email = str(row["email"]).lower()
+        student_rows.append({
+            "first_name": row["first_name"],
+            "last_name": row["last_name"],
+            "date_of_birth": pd.to_datetime(row["date_of_birth"]).date().isoformat() if pd.notna(row["date_of_birth"]) else None,
+            "enrollment_date": pd.to_datetime(row["enrollment_date"]).date().isoformat() if pd.notna(row["enrollment_date"]) else None,
+            "major": row["major"],
+            "email": student_email
+        })
+        if pd.notna(row["gpa"]) and pd.notna(row["semester"]) and pd.notna(row["year"]):
+            pending_gpa_history.append({"email": student_email, "gpa": float(row["gpa"]), "semester": str(row["semester"]), "year": int(row["year"])})
+    return student_rows, pending_gpa_history
+
+def normalized_upload_rows(df):
+    """
+    Mirrors map_student_upload_rows in api/student_ingestion_route.py.
+    """
+    normalized = normalize_columns(
+        df,
+        {column: column for column in df.columns},
+        date_columns=["date_of_birth", "enrollment_date"],
+        email_columns=["email"],
+        float_columns=["gpa"],
+        int_columns=["year"],
+        text_columns=["semester"]
+    )
+    student_rows = frame_to_records(normalized[["first_name", "last_name", "date_of_birth", "enrollment_date", "major", "email"]])
+    has_gpa = normalized[["gpa", "semester", "year"]].notna().all(axis=1)
+    return student_rows, frame_to_records(normalized.loc[has_gpa, ["email", "gpa", "semester", "year"]])
+
+def legacy_excel_rows(df):
+    """
+    The per-row mapping of the Excel upload handler before column_normalization.
+    """
+    students_to_insert = []
+    gpa_history_to_insert = []
+    for index, row in df.iterrows():
+        students_to_insert.append({
+            "first_name": row.get("First Name"),
+            "last_name": row.get("Last Name"),
+            "date_of_birth": str(row.get("Date of Birth").date()) if pd.notna(row.get("Date of Birth")) else None,
+            "gender": row.get("Gender"),
+            "email": row.get("Email"),
+            "phone_number": row.get("Phone Number"),
+            "address": row.get("Address"),
+            "city": row.get("City"),
+            "state": row.get("State"),
+            "zip_code": row.get("Zip Code"),
+            "enrollment_date": str(row.get("Enrollment Date").date()) if pd.notna(row.get("Enrollment Date")) else None,
+            "major": row.get("Major"),
+            "current_gpa": row.get("Current GPA"),
+            "academic_standing": row.get("Academic Standing"),
+            "advisor": row.get("Advisor"),
+            "expected_graduation_date": str(row.get("Expected Graduation Date").date()) if pd.notna(row.get("Expected Graduation Date")) else None,
+            "profile_picture_url": row.get("Profile Picture URL"),
+            "user_id": row.get("User ID")
+        })
+        if pd.notna(row.get("Current GPA")):
+            gpa_history_to_insert.append({"position": index, "gpa": row.get("Current GPA"), "date_recorded": str(pd.Timestamp.now().date())})
+    return students_to_insert, gpa_history_to_insert
+
+EXCEL_COLUMNS = {
+    "First Name": "first_name", "Last Name": "last_name", "Date of Birth": "date_of_birth", "Gender": "gender",
+    "Email": "email", "Phone Number": "phone_number", "Address": "address", "City": "city", "State": "state",
+    "Zip Code": "zip_code", "Enrollment Date": "enrollment_date", "Major": "major", "Current GPA": "current_gpa",
+    "Academic Standing": "academic_standing", "Advisor": "advisor", "Expected Graduation Date": "expected_graduation_date",
+    "Profile Picture URL": "profile_picture_url", "User ID": "user_id",
+}
+
+def normalized_excel_rows(df):
+    """
+    Mirrors map_excel_students in api/student_ingestion_route.py.
+    """
+    students = normalize_columns(
+        df,
+        EXCEL_COLUMNS,
+        date_columns=["date_of_birth", "enrollment_date", "expected_graduation_date"],
+        float_columns=["current_gpa"]
+    )
+    has_gpa = students["current_gpa"].notna().to_numpy()
+    gpa_history = pd.DataFrame({
+        "position": np.flatnonzero(has_gpa),
+        "gpa": students["current_gpa"].to_numpy()[has_gpa],
+        "date_recorded": str(date.today())
+    })
+    return frame_to_records(students), frame_to_records(gpa_history)
+
+def legacy_dataframe_rows(df):
+    """
+    The per-row cleanup upload_students_from_dataframe did before column_normalization.
+    """
+    rows = []
+    for index, row in df.iterrows():
+        student_data = row.to_dict()
+        for key, value in student_data.items():
+            if isinstance(value, (dict, list)):
+                student_data[key] = json.dumps(value)
+            elif pd.isna(value):
+                student_data[key] = None
+        if student_data.get('student_id') is None:
+            continue
+        rows.append(student_data)
+    return rows
+
+def normalized_dataframe_rows(df):
+    """
+    Mirrors upload_students_from_dataframe in upload_students.py.
+    """
+    normalized = normalize_columns(df, json_columns=[column for column in df.columns if df[column].dtype == object])
+    return frame_to_records(normalized[normalized["student_id"].notna()])
+
+def _nan_to_none(rows):
+    # The legacy loops passed empty text cells through as NaN, which is not valid JSON
+    return [{key: None if isinstance(value, float) and np.isnan(value) else value for key, value in row.items()} for row in rows]
+
+def best_of(func, repeat, *args, **kwargs):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+CASES = [
+    ("upload_students_data", generate_upload_sheet, legacy_upload_rows, normalized_upload_rows),
+    ("excel upload", generate_excel_sheet, legacy_excel_rows, normalized_excel_rows),
+    ("upload_students_from_dataframe", generate_student_frame, lambda df: (legacy_dataframe_rows(df),), lambda df: (normalized_dataframe_rows(df),)),
+]
+
+def main(row_counts):
+    for row_count in row_counts:
+        for name, generate, legacy_func, normalized_func in CASES:
+            df = generate(row_count)
+            legacy_time, legacy = best_of(legacy_func, 3, df)
+            normalized_time, normalized = best_of(normalized_func, 3, df)
+
+            # The legacy loops pass numpy scalars through; compare by value
+            for normalized_rows, legacy_rows in zip(normalized, legacy):
+                assert normalized_rows == _nan_to_none(legacy_rows)
+
+            print(
+                f"{row_count:>7} rows, {name:<31}: "
+                f"iterrows {legacy_time * 1000:8.1f} ms, columns {normalized_time * 1000:8.1f} ms "
+                f"({legacy_time / normalized_time:.1f}x)"
+            )
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [10_000, 100_000])
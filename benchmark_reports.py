@@ -0,0 +1,126 @@
+"""
+Benchmark for the in-process reports/trends aggregation.
+
+Generates a synthetic roster (students, GPA history, soft skills) and times
+reports_engine.compute_reports_trends against the previous per-student loop.
+
+Usage: python benchmark_reports.py [student_count ...]
+"""
+import sys
+import time
+import uuid
+import numpy as np
+from reports_engine import compute_reports_trends
+
+ACADEMIC_YEARS = ["2021-2022", "2022-2023", "2023-2024", "2024-2025"]
+# Fall/Spring only, so the legacy lexical term order and term_ordinal agree and results can be compared
+TERMS = ["Fall", "Spring"]
+SKILLS = ["Communication", "Teamwork", "Leadership", "Time Management", "Problem Solving", "Adaptability"]
+
+def generate_roster(student_count, seed=42):
+    rng = np.random.default_rng(seed)
+    students = [
+        {
+            "id": str(uuid.UUID(int=int(i) + 1)),
+            "full_name": f"Student {i}",
+            "grade_level": int(rng.integers(9, 13)),
+            "academic_year": ACADEMIC_YEARS[-1],
+            "status": "Active",
+        }
+        for i in range(student_count)
+    ]
+
+    gpa_history = []
+    soft_skills = []
+    for student in students:
+        gpa = float(rng.uniform(1.5, 4.0))
+        for year in ACADEMIC_YEARS[int(rng.integers(0, 3)):]:
+            for term in TERMS:
+                gpa = float(np.clip(gpa + rng.normal(0, 0.3), 0.0, 4.0))
+                gpa_history.append({"id": str(uuid.UUID(int=len(gpa_history) + 1)), "student_id": student["id"], "academic_year": year, "term": term, "gpa_value": round(gpa, 2)})
+        for skill in rng.choice(SKILLS, size=int(rng.integers(0, 4)), replace=False):
+            soft_skills.append({"student_id": student["id"], "skill_name": str(skill)})
+    return students, gpa_history, soft_skills
+
+def legacy_reports_trends(students, gpa_history, soft_skills, min_gpa=None, max_gpa=None):
+    """
+    The per-student aggregation get_reports_trends used before reports_engine.
+    """
+    gpa_map = {}
+    for entry in gpa_history:
+        gpa_map.setdefault(entry["student_id"], []).append(entry)
+    skill_map = {}
+    for entry in soft_skills:
+        skill_map.setdefault(entry["student_id"], []).append(entry)
+    term_key = lambda x: (x.get("academic_year", ""), x.get("term", ""))
+
+    processed = [dict(s, gpa_history=gpa_map.get(s["id"], []), soft_skill_inferences=skill_map.get(s["id"], [])) for s in students]
+    if min_gpa is not None or max_gpa is not None:
+        kept = []
+        for student in processed:
+            history = sorted(student["gpa_history"], key=term_key, reverse=True)
+            latest_gpa = history[0].get("gpa_value") if history else None
+            if latest_gpa is not None and (min_gpa is None or latest_gpa >= min_gpa) and (max_gpa is None or latest_gpa <= max_gpa):
+                kept.append(student)
+        processed = kept
+
+    gpa_ranges = {"0.0-1.0": 0, "1.1-2.0": 0, "2.1-3.0": 0, "3.1-4.0": 0}
+    for student in processed:
+        history = sorted(student["gpa_history"], key=term_key, reverse=True)
+        latest_gpa = history[0].get("gpa_value") if history else None
+        if latest_gpa is None:
+            continue
+        for label in gpa_ranges:
+            lower, upper = (float(b) for b in label.split("-"))
+            if lower <= latest_gpa <= upper:
+                gpa_ranges[label] += 1
+                break
+
+    skill_counts = {}
+    for student in processed:
+        for skill in student["soft_skill_inferences"]:
+            if skill.get("skill_name"):
+                skill_counts[skill["skill_name"]] = skill_counts.get(skill["skill_name"], 0) + 1
+
+    drops = []
+    for student in processed:
+        history = sorted(student["gpa_history"], key=term_key)
+        if len(history) >= 2:
+            gpa1, gpa2 = history[-2].get("gpa_value"), history[-1].get("gpa_value")
+            if gpa1 is not None and gpa2 is not None and round(gpa1 - gpa2, 2) > 0.3:
+                drops.append(student["id"])
+
+    return {
+        "gpa_histogram": [{"range": r, "count": c} for r, c in gpa_ranges.items()],
+        "soft_skill_coverage": [{"skill_name": s, "count": c} for s, c in skill_counts.items()],
+        "gpa_drops_students": drops,
+    }
+
+def best_of(func, repeat, *args, **kwargs):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main(student_counts):
+    for student_count in student_counts:
+        students, gpa_history, soft_skills = generate_roster(student_count)
+        for filters in ({}, {"min_gpa": 2.0, "max_gpa": 3.5}):
+            legacy_time, legacy = best_of(legacy_reports_trends, 3, students, gpa_history, soft_skills, **filters)
+            engine_time, engine = best_of(compute_reports_trends, 3, students, gpa_history, soft_skills, **filters)
+
+            assert engine["gpa_histogram"] == legacy["gpa_histogram"]
+            assert engine["soft_skill_coverage"] == legacy["soft_skill_coverage"]
+            assert [d["student_id"] for d in engine["gpa_drops_students"]] == legacy["gpa_drops_students"]
+
+            print(
+                f"{student_count:>7} students, {len(gpa_history):>7} GPA rows, filters={filters or 'none'}: "
+                f"legacy {legacy_time * 1000:8.1f} ms, engine {engine_time * 1000:8.1f} ms "
+                f"({legacy_time / engine_time:.1f}x)"
+            )
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [10_000, 100_000])
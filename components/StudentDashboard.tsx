@@ -36,14 +36,20 @@ export default function StudentDashboard() {
 
           let data: StudentProfileType[] = []
           if (isAdmin) {
-            // Admins fetch all students
-            const res = await fetch(`${backendUrl}/students`, {
-              headers: {
-                Authorization: `Bearer ${session.access_token}`,
-              },
-            })
-            if (!res.ok) throw new Error("Failed to fetch all students")
-            data = await res.json()
+            // Admins fetch every student, following the X-Next-Cursor header page by page until it is absent
+            let cursor: string | null = null
+            do {
+              const params = new URLSearchParams({ limit: "500" })
+              if (cursor) params.set("cursor", cursor)
+              const res: Response = await fetch(`${backendUrl}/students?${params}`, {
+                headers: {
+                  Authorization: `Bearer ${session.access_token}`,
+                },
+              })
+              if (!res.ok) throw new Error("Failed to fetch all students")
+              data = data.concat(await res.json())
+              cursor = res.headers.get("X-Next-Cursor")
+            } while (cursor)
           } else {
             // Non-admins fetch their own student profile
             const userRes = await fetch(`${backendUrl}/users/me`, {
@@ -55,7 +61,7 @@ export default function StudentDashboard() {
             const userData = await userRes.json()
 
             if (userData.email) {
-              const studentRes = await fetch(`${backendUrl}/students?email=${userData.email}`, {
+              const studentRes = await fetch(`${backendUrl}/students?email=${encodeURIComponent(userData.email)}&limit=1`, {
                 headers: {
                   Authorization: `Bearer ${session.access_token}`,
                 },
@@ -0,0 +1,30 @@
+import asyncio
+import os
+from typing import Any, Dict, Iterable, List
+from supabase_client import execute_query
+
+# Keys per stored-hash lookup; each chunk is one `in.(...)` filter, which has to fit in the URL
+CONTENT_HASH_LOOKUP_CHUNK_SIZE = int(os.getenv("CONTENT_HASH_LOOKUP_CHUNK_SIZE", "200"))
+
+def _lookup_queries(client: Any, key_column: str, keys: Iterable[Any]) -> List[Any]:
+    keys = list(dict.fromkeys(key for key in keys if key is not None))
+    return [
+        client.from_("students").select(f"id, {key_column}, content_hash").in_(key_column, keys[chunk_start:chunk_start + CONTENT_HASH_LOOKUP_CHUNK_SIZE])
+        for chunk_start in range(0, len(keys), CONTENT_HASH_LOOKUP_CHUNK_SIZE)
+    ]
+
+def _by_key(responses: List[Any], key_column: str) -> Dict[Any, Dict[str, Any]]:
+    return {row[key_column]: row for response in responses for row in response.data or []}
+
+async def fetch_stored_hashes(client: Any, key_column: str, keys: Iterable[Any]) -> Dict[Any, Dict[str, Any]]:
+    """
+    Look up the stored students matching `keys` on the natural key `key_column`, in one query per
+    CONTENT_HASH_LOOKUP_CHUNK_SIZE keys run concurrently. Returns key -> {"id", key_column, "content_hash"}.
+    """
+    return _by_key(await asyncio.gather(*(execute_query(query) for query in _lookup_queries(client, key_column, keys))), key_column)
+
+def fetch_stored_hashes_sync(client: Any, key_column: str, keys: Iterable[Any]) -> Dict[Any, Dict[str, Any]]:
+    """
+    Blocking form of fetch_stored_hashes, for the scripts that upload outside the event loop.
+    """
+    return _by_key([query.execute() for query in _lookup_queries(client, key_column, keys)], key_column)
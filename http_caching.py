@@ -0,0 +1,51 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Any, Dict, Optional
+from fastapi import Response, status
+
+def make_etag(*parts: Any) -> str:
+    """
+    Build a strong ETag from the parts identifying a representation, e.g. the row id,
+    its updated_at version and the response variant.
+    """
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header value against an ETag ('*' matches anything). Uses the weak
+    comparison If-None-Match calls for (RFC 9110, 13.1.2): a W/ prefix, as added by proxies
+    and CDNs that transform the response, is ignored.
+    """
+    if not if_none_match:
+        return False
+    candidates = [c.strip() for c in if_none_match.split(",")]
+    return "*" in candidates or _opaque_tag(etag) in (_opaque_tag(c) for c in candidates)
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+def http_date(updated_at: Optional[str]) -> Optional[str]:
+    """
+    Format a Postgres timestamptz string as an HTTP Last-Modified date.
+    """
+    if not updated_at:
+        return None
+    try:
+        return format_datetime(datetime.fromisoformat(updated_at).astimezone(timezone.utc), usegmt=True)
+    except ValueError:
+        return None
+
+def validator_headers(etag: str, updated_at: Optional[str]) -> Dict[str, str]:
+    headers = {"ETag": etag}
+    last_modified = http_date(updated_at)
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    return headers
+
+def not_modified(etag: str, updated_at: Optional[str]) -> Response:
+    """
+    Empty 304 response carrying the current validators.
+    """
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=validator_headers(etag, updated_at))
@@ -0,0 +1,278 @@
+import asyncio
+import contextlib
+import csv
+import io
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+from supabase_client import get_supabase_client, execute_query
+
+# Uploads processed at the same time; further jobs wait in the queue
+INGEST_JOB_CONCURRENCY = int(os.getenv("INGEST_JOB_CONCURRENCY", "2"))
+# Seconds a finished job (and its error report) stays available
+INGEST_JOB_RETENTION_SECONDS = float(os.getenv("INGEST_JOB_RETENTION_SECONDS", "3600"))
+# Per-row errors kept per job; failures beyond this are still counted
+INGEST_JOB_MAX_ERRORS = int(os.getenv("INGEST_JOB_MAX_ERRORS", "10000"))
+# Seconds between saves of a queued or running job's progress to the ingestion_jobs table, and
+# the age after which an unfinished job's last save means the worker running it has stopped
+INGEST_JOB_SAVE_INTERVAL_SECONDS = float(os.getenv("INGEST_JOB_SAVE_INTERVAL_SECONDS", "2"))
+INGEST_JOB_STALE_SECONDS = float(os.getenv("INGEST_JOB_STALE_SECONDS", "60"))
+
+class IngestionJob:
+    """
+    Progress of one upload: rows written and failed, throughput, and the per-row errors.
+    Also used by the synchronous upload endpoints to collect their results.
+    """
+
+    def __init__(self, filename: Optional[str] = None, total_rows: Optional[int] = None):
+        self.id = str(uuid.uuid4())
+        self.filename = filename
+        self.status = "queued"
+        self.total_rows = total_rows
+        self.rows_processed = 0
+        self.rows_failed = 0
+        # Rows skipped because the stored student already has the same content
+        self.rows_unchanged = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # The IngestionPipeline processing the upload, for its per-stage timings
+        self.pipeline: Optional[Any] = None
+        # Error count and stage timings of a job loaded from the ingestion_jobs table
+        self._stored_error_count = 0
+        self._stored_stages: Optional[Dict[str, Any]] = None
+
+    def record_processed(self, count: int) -> None:
+        self.rows_processed += count
+
+    def record_unchanged(self, count: int) -> None:
+        self.rows_unchanged += count
+
+    def record_failed(self, row: Optional[int], message: str, count: int = 1) -> None:
+        """
+        Count `count` failed rows; `row` is the 1-based data row number in the file, or None when
+        the error is not tied to a single row.
+        """
+        self.rows_failed += count
+        if len(self.errors) < INGEST_JOB_MAX_ERRORS:
+            self.errors.append({"row": row, "column": None, "rows": count, "error": message})
+
+    def record_cell_error(self, row: int, column: str, message: str) -> None:
+        """
+        Report a bad cell in a row that is still ingested (without that field's value).
+        """
+        if len(self.errors) < INGEST_JOB_MAX_ERRORS:
+            self.errors.append({"row": row, "column": column, "rows": 0, "error": message})
+
+    def error_messages(self) -> List[str]:
+        return [
+            (f"Row {e['row']}" + (f", column '{e['column']}'" if e["column"] else "") + f": {e['error']}") if e["row"] is not None else e["error"]
+            for e in self.errors
+        ]
+
+    def error_report_csv(self) -> str:
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["row", "column", "rows_failed", "error"])
+        for e in self.errors:
+            writer.writerow([e["row"], e["column"], e["rows"], e["error"]])
+        return output.getvalue()
+
+    def to_record(self, include_errors: bool = False) -> Dict[str, Any]:
+        """
+        Row of the ingestion_jobs table for this job. The (possibly large) error list is only
+        included once the job has finished.
+        """
+        record = {
+            "id": self.id,
+            "status": self.status,
+            "state": {
+                "filename": self.filename,
+                "total_rows": self.total_rows,
+                "rows_processed": self.rows_processed,
+                "rows_failed": self.rows_failed,
+                "rows_unchanged": self.rows_unchanged,
+                "error_count": len(self.errors),
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "stages": self.pipeline.timings() if self.pipeline else None,
+            },
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }
+        if include_errors:
+            record["errors"] = self.errors
+        return record
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "IngestionJob":
+        """
+        Rebuild a job saved by another worker (or before a restart) from its ingestion_jobs row.
+        A queued or running job that has not been saved for INGEST_JOB_STALE_SECONDS lost its
+        worker (restart, redeploy or crash) and is reported as failed.
+        """
+        state = record["state"]
+        job = cls(filename=state.get("filename"), total_rows=state.get("total_rows"))
+        job.id = record["id"]
+        job.status = record["status"]
+        job.rows_processed = state.get("rows_processed", 0)
+        job.rows_failed = state.get("rows_failed", 0)
+        job.rows_unchanged = state.get("rows_unchanged", 0)
+        job.errors = record.get("errors") or []
+        job.error = state.get("error")
+        job.created_at = state.get("created_at") or job.created_at
+        job.started_at = state.get("started_at")
+        job.finished_at = state.get("finished_at")
+        job._stored_error_count = state.get("error_count", 0)
+        job._stored_stages = state.get("stages")
+        saved_at = datetime.fromisoformat(record["updated_at"]).timestamp()
+        if job.status in ("queued", "running") and time.time() - saved_at > INGEST_JOB_STALE_SECONDS:
+            job.status = "failed"
+            job.finished_at = saved_at
+            job.error = "The worker running this job stopped (restart or redeploy) before it finished. Upload the file again; rows already written are skipped as unchanged."
+        return job
+
+    def summary(self) -> Dict[str, Any]:
+        done = self.rows_processed + self.rows_failed + self.rows_unchanged
+        elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+        if self.status in ("completed", "failed"):
+            remaining = 0
+        elif self.total_rows is not None:
+            remaining = max(self.total_rows - done, 0)
+        else:
+            remaining = None
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "rows_processed": self.rows_processed,
+            "rows_failed": self.rows_failed,
+            "rows_unchanged": self.rows_unchanged,
+            "rows_remaining": remaining,
+            "total_rows": self.total_rows,
+            "elapsed_seconds": round(elapsed, 3),
+            "rows_per_second": round(done / elapsed, 1) if elapsed > 0 else None,
+            "error_count": max(len(self.errors), self._stored_error_count),
+            "error": self.error,
+            "stages": self.pipeline.timings() if self.pipeline else self._stored_stages,
+        }
+
+class IngestionJobStore:
+    """
+    Job state in the ingestion_jobs table (schema.sql), so every worker process can report on a
+    job and finished jobs and their error reports survive restarts. A failing store (e.g. the
+    table does not exist yet) is logged and otherwise ignored: jobs are then only visible to the
+    worker running them, until it restarts.
+    """
+
+    def __init__(self, client_factory: Callable[[], Any] = get_supabase_client):
+        self._client_factory = client_factory
+
+    async def save(self, job: IngestionJob, include_errors: bool = False) -> None:
+        try:
+            await execute_query(self._client_factory().from_("ingestion_jobs").upsert(job.to_record(include_errors)))
+        except Exception as e:
+            print(f"Warning: could not save ingestion job {job.id}: {e}")
+
+    async def load(self, job_id: str) -> Optional[IngestionJob]:
+        try:
+            response = await execute_query(self._client_factory().from_("ingestion_jobs").select("*").eq("id", job_id))
+        except Exception as e:
+            print(f"Warning: could not load ingestion job {job_id}: {e}")
+            return None
+        return IngestionJob.from_record(response.data[0]) if response.data else None
+
+    async def prune(self, cutoff: float) -> None:
+        """
+        Delete jobs last saved before `cutoff` (a Unix timestamp).
+        """
+        try:
+            await execute_query(
+                self._client_factory().from_("ingestion_jobs").delete()
+                .lt("updated_at", datetime.fromtimestamp(cutoff, timezone.utc).isoformat())
+            )
+        except Exception as e:
+            print(f"Warning: could not prune ingestion jobs: {e}")
+
+class IngestionJobManager:
+    """
+    Runs upload jobs in the background with at most `max_concurrency` running at once per worker
+    process and keeps finished jobs for `retention_seconds` so their status and error report can be
+    fetched. Progress is saved to `store` while a job runs, so a status request that reaches
+    another worker (or arrives after a restart) is answered from there.
+    """
+
+    def __init__(self, max_concurrency: int, retention_seconds: float, store: Optional[IngestionJobStore] = None):
+        self._jobs: Dict[str, IngestionJob] = {}
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._retention_seconds = retention_seconds
+        self._store = store
+
+    def submit(self, job: IngestionJob, work: Callable[[IngestionJob], Awaitable[None]]) -> IngestionJob:
+        """
+        Queue `work(job)` and return immediately; the job is visible through get() right away.
+        """
+        self._prune()
+        if self._semaphore is None:
+            # Created lazily so it binds to the running event loop
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._jobs[job.id] = job
+        task = asyncio.create_task(self._run(job, work))
+        # Hold a reference so the task is not garbage collected while it runs
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: IngestionJob, work: Callable[[IngestionJob], Awaitable[None]]) -> None:
+        saver = asyncio.create_task(self._save_periodically(job)) if self._store else None
+        try:
+            async with self._semaphore:
+                job.status = "running"
+                job.started_at = time.time()
+                try:
+                    await work(job)
+                    job.status = "completed"
+                except Exception as e:
+                    print(f"Ingestion job {job.id} failed: {e}")
+                    job.status = "failed"
+                    job.error = getattr(e, "detail", None) or str(e)
+                finally:
+                    job.finished_at = time.time()
+        finally:
+            if saver:
+                # Wait for a save in progress, so it cannot land after the final one
+                saver.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await saver
+                await self._store.save(job, include_errors=True)
+
+    async def _save_periodically(self, job: IngestionJob) -> None:
+        # Also the job's heartbeat: see IngestionJob.from_record
+        while True:
+            await self._store.save(job)
+            await asyncio.sleep(INGEST_JOB_SAVE_INTERVAL_SECONDS)
+
+    async def get(self, job_id: str) -> Optional[IngestionJob]:
+        job = self._jobs.get(job_id)
+        if job is None and self._store:
+            job = await self._store.load(job_id)
+        return job
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self._retention_seconds
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+        if self._store:
+            task = asyncio.create_task(self._store.prune(cutoff))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+# Background bulk uploads (POST /upload/students-bulk/jobs)
+ingestion_jobs = IngestionJobManager(INGEST_JOB_CONCURRENCY, INGEST_JOB_RETENTION_SECONDS, IngestionJobStore())
@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+# Chunks buffered between two pipeline stages; a full queue holds back the stage feeding it
+INGEST_PIPELINE_QUEUE_SIZE = int(os.getenv("INGEST_PIPELINE_QUEUE_SIZE", "2"))
+# Chunks validated at once (CSV rows are mapped on threads, JSON items on the validation workers)
+INGEST_VALIDATE_CONCURRENCY = int(os.getenv("INGEST_VALIDATE_CONCURRENCY", str(os.cpu_count() or 1)))
+# Chunks written to Supabase at once
+INGEST_WRITE_CONCURRENCY = int(os.getenv("INGEST_WRITE_CONCURRENCY", "2"))
+
+# Marks the end of a stage's input
+_DONE = object()
+
+class PipelineStage:
+    """
+    One stage of an IngestionPipeline: `concurrency` tasks apply `work` to each chunk and pass
+    its result (unless None) to the next stage. Keeps the timings that show where an upload waits.
+    """
+
+    def __init__(self, name: str, work: Optional[Callable[[Any], Awaitable[Any]]] = None, concurrency: int = 1):
+        self.name = name
+        self.work = work
+        self.concurrency = max(concurrency, 1)
+        self.chunks = 0
+        # Time spent doing the stage's work, summed over its tasks
+        self.busy_seconds = 0.0
+        # Time its tasks sat idle waiting for the previous stage
+        self.input_wait_seconds = 0.0
+        # Time its tasks were held back by a full queue to the next stage
+        self.output_wait_seconds = 0.0
+
+    def timing(self) -> Dict[str, Any]:
+        return {
+            "chunks": self.chunks,
+            "concurrency": self.concurrency,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "input_wait_seconds": round(self.input_wait_seconds, 3),
+            "output_wait_seconds": round(self.output_wait_seconds, 3),
+        }
+
+class IngestionPipeline:
+    """
+    Runs an upload as stages connected by bounded queues: the first stage reads chunks from
+    `source` (parsing), each following stage processes them with its own parallelism. All stages
+    run at once, so the file is parsed while earlier chunks are validated and written, and the
+    queues keep at most INGEST_PIPELINE_QUEUE_SIZE chunks waiting between two stages.
+    """
+
+    def __init__(self, source_name: str, source: AsyncIterator[Any], stages: List[PipelineStage], queue_size: int = INGEST_PIPELINE_QUEUE_SIZE):
+        self.source = source
+        self.stages = [PipelineStage(source_name)] + stages
+        self.queue_size = queue_size
+
+    def timings(self) -> Dict[str, Dict[str, Any]]:
+        return {stage.name: stage.timing() for stage in self.stages}
+
+    async def _put(self, stage: PipelineStage, queue: Optional[asyncio.Queue], item: Any) -> None:
+        if queue is None or item is None:
+            return
+        started = time.perf_counter()
+        await queue.put(item)
+        stage.output_wait_seconds += time.perf_counter() - started
+
+    async def _read_source(self, stage: PipelineStage, output: Optional[asyncio.Queue]) -> None:
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = await self.source.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    stage.busy_seconds += time.perf_counter() - started
+                stage.chunks += 1
+                await self._put(stage, output, item)
+        finally:
+            # Release the source (e.g. the CSV reader) even when a later stage failed
+            if hasattr(self.source, "aclose"):
+                await self.source.aclose()
+
+    async def _process(self, stage: PipelineStage, input_queue: asyncio.Queue, output: Optional[asyncio.Queue]) -> None:
+        while True:
+            started = time.perf_counter()
+            item = await input_queue.get()
+            stage.input_wait_seconds += time.perf_counter() - started
+            if item is _DONE:
+                return
+            started = time.perf_counter()
+            result = await stage.work(item)
+            stage.busy_seconds += time.perf_counter() - started
+            stage.chunks += 1
+            await self._put(stage, output, result)
+
+    async def _run_stage(self, index: int, queues: List[asyncio.Queue]) -> None:
+        stage = self.stages[index]
+        output = queues[index] if index < len(queues) else None
+        if index == 0:
+            await self._read_source(stage, output)
+        else:
+            await asyncio.gather(*(self._process(stage, queues[index - 1], output) for _ in range(stage.concurrency)))
+        if output is not None:
+            # One end marker per task of the next stage
+            for _ in range(self.stages[index + 1].concurrency):
+                await output.put(_DONE)
+
+    async def run(self) -> None:
+        queues = [asyncio.Queue(maxsize=max(self.queue_size, 1)) for _ in self.stages[1:]]
+        tasks = [asyncio.create_task(self._run_stage(index, queues)) for index in range(len(self.stages))]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed stage would leave the others blocked on its queues
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
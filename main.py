@@ -1,20 +1,37 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Response, Header
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter, create_model
 from auth_utils import get_password_hash, verify_password, create_access_token, get_current_user, TokenData, get_current_admin_user
-from supabase_client import get_supabase_client
+from supabase_client import get_supabase_client, init_supabase_client, close_supabase_client, execute_query
 from supabase import Client
 import os
+from contextlib import asynccontextmanager
 from student_ingestion_route import router as student_ingestion_router
-from typing import List
+from typing import List, Optional, Tuple, Type, Any
+from functools import lru_cache
+from profile_cache import profile_cache
+from payload_validation import close_validation_executor
+from report_cache import report_cache
+from http_caching import make_etag, etag_matches, not_modified, validator_headers
+from pagination import apply_keyset_page, apply_student_filters, next_page_cursor, student_select_columns, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from student_models import normalize_email
 from datetime import date
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create the pooled Supabase client once per process and release its connections on shutdown
+    init_supabase_client()
+    yield
+    close_supabase_client()
+    close_validation_executor()
+
 app = FastAPI(
     title="Student Analytics Backend",
     description="API for managing student data, authentication, and analytics.",
     version="1.0.0",
     docs_url="/api/docs",
-    openapi_url="/api/openapi.json"
+    openapi_url="/api/openapi.json",
+    lifespan=lifespan
 )
 
 # CORS configuration
@@ -33,6 +50,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified"],
 )
 
 # Include other routers
@@ -69,6 +87,38 @@ class StudentProfile(BaseModel):
     financial_aid_status: str
     scholarship_amount: float
 
+@lru_cache(maxsize=64)
+def student_projection_model(fields: Tuple[str, ...]) -> Type[BaseModel]:
+    """
+    Build (and cache) a slim response model containing only the requested StudentProfile fields.
+    """
+    return create_model(
+        "StudentProfileProjection",
+        **{name: (StudentProfile.model_fields[name].annotation, ...) for name in fields}
+    )
+
+def parse_student_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """
+    Parse a comma-separated `fields=` parameter into a tuple of StudentProfile field names.
+    Returns None when no projection was requested.
+    """
+    if not fields:
+        return None
+    requested = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in requested if f not in StudentProfile.model_fields]
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested or None
+
+def projected_response(data: Any, fields: Tuple[str, ...], headers: Optional[dict] = None) -> Response:
+    """
+    Validate rows against the projection model and serialize them straight to JSON,
+    bypassing the full StudentProfile response model.
+    """
+    model = student_projection_model(fields)
+    adapter = TypeAdapter(List[model]) if isinstance(data, list) else TypeAdapter(model)
+    return Response(content=adapter.dump_json(adapter.validate_python(data)), media_type="application/json", headers=headers)
+
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the Student Analytics Backend API!"}
@@ -78,7 +128,7 @@ async def register_user(user: UserCreate, supabase: Client = Depends(get_supabas
     hashed_password = get_password_hash(user.password)
     
     # Check if username already exists
-    response = supabase.table("users").select("username").eq("username", user.username).execute()
+    response = await execute_query(supabase.table("users").select("username").eq("username", user.username))
     if response.data:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -86,11 +136,11 @@ async def register_user(user: UserCreate, supabase: Client = Depends(get_supabas
         )
 
     # Insert new user into Supabase
-    response = supabase.table("users").insert({
+    response = await execute_query(supabase.table("users").insert({
         "username": user.username,
         "hashed_password": hashed_password,
         "role": user.role
-    }).execute()
+    }))
 
     if response.data:
         access_token = create_access_token(data={"sub": user.username, "role": user.role})
@@ -103,7 +153,7 @@ async def register_user(user: UserCreate, supabase: Client = Depends(get_supabas
 
 @app.post("/api/token", response_model=Token)
 async def login_for_access_token(user: UserLogin, supabase: Client = Depends(get_supabase_client)):
-    response = supabase.table("users").select("hashed_password, role").eq("username", user.username).single().execute()
+    response = await execute_query(supabase.table("users").select("hashed_password, role").eq("username", user.username).single())
     
     if not response.data:
         raise HTTPException(
@@ -144,29 +194,69 @@ async def read_student_data(current_user: TokenData = Depends(get_current_user),
 async def read_admin_dashboard(current_user: TokenData = Depends(get_current_admin_user)):
     return {"message": f"Welcome admin {current_user.username}! This is the admin dashboard."}
 
-# Route to fetch all students (admin only)
+# Route to fetch all students (admin only), paginated by keyset cursor
 @app.get("/api/students", response_model=List[StudentProfile])
 async def get_all_students(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description=f"Cursor from the previous page's {NEXT_CURSOR_HEADER} header"),
+    sort: str = Query("id", description="Column to sort by"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    grade_level: Optional[int] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    academic_year: Optional[str] = None,
+    major: Optional[str] = None,
+    advisor: Optional[str] = None,
+    has_504_plan: Optional[bool] = None,
+    email: Optional[str] = Query(None, description="Exact email lookup"),
+    fields: Optional[str] = Query(None, description="Comma-separated StudentProfile fields to return"),
     supabase: Client = Depends(get_supabase_client),
     current_user: TokenData = Depends(get_current_admin_user)
 ):
-    response = supabase.table("students").select("*").execute()
-    if response.data:
+    projection = parse_student_fields(fields)
+    # Keyset pagination needs the sort column and id even when they are not returned
+    columns = ", ".join(dict.fromkeys((*projection, sort, "id"))) if projection else "*"
+    query = supabase.table("students").select(student_select_columns(columns, has_504_plan))
+    query = apply_student_filters(
+        query,
+        grade_level=grade_level,
+        status=status_filter,
+        academic_year=academic_year,
+        major=major,
+        advisor=advisor,
+        has_504_plan=has_504_plan,
+        email=email,
+    )
+    try:
+        query = apply_keyset_page(query, sort=sort, descending=order == "desc", cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    result = await execute_query(query)
+    if result.data:
+        next_cursor = next_page_cursor(result.data, sort, limit)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        if projection:
+            return projected_response(result.data, projection, headers={NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None)
         # Convert date strings from Supabase to date objects for Pydantic validation
-        for student in response.data:
+        for student in result.data:
             if 'date_of_birth' in student and isinstance(student['date_of_birth'], str):
                 student['date_of_birth'] = date.fromisoformat(student['date_of_birth'])
             if 'enrollment_date' in student and isinstance(student['enrollment_date'], str):
                 student['enrollment_date'] = date.fromisoformat(student['enrollment_date'])
-        return response.data
-    elif response.error:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=response.error.message)
+        return result.data
+    elif result.error:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=result.error.message)
     return []
 
 # Route to fetch a single student by ID (admin or the student themselves)
 @app.get("/api/students/{student_id}", response_model=StudentProfile)
 async def get_student_by_id(
     student_id: str,
+    response: Response,
+    fields: Optional[str] = Query(None, description="Comma-separated StudentProfile fields to return"),
+    if_none_match: Optional[str] = Header(None),
     supabase: Client = Depends(get_supabase_client),
     current_user: TokenData = Depends(get_current_user)
 ):
@@ -178,16 +268,35 @@ async def get_student_by_id(
         if current_user.username != student_id:
             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this student's data")
 
-    response = supabase.table("students").select("*").eq("student_id", student_id).single().execute()
-    if response.data:
+    projection = parse_student_fields(fields)
+    variant = ",".join(projection) if projection else "*"
+
+    if if_none_match:
+        # Revalidate with a version probe before fetching the row itself
+        probe = await execute_query(supabase.table("students").select("id, updated_at").eq("student_id", student_id).limit(1))
+        if probe.data and probe.data[0].get("updated_at"):
+            updated_at = probe.data[0]["updated_at"]
+            etag = make_etag(student_id, updated_at, variant)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag, updated_at)
+
+    # updated_at is always selected so the ETag can be computed from the same read
+    columns = ", ".join(dict.fromkeys((*projection, "updated_at"))) if projection else "*"
+    result = await execute_query(supabase.table("students").select(columns).eq("student_id", student_id).single())
+    if result.data:
+        updated_at = result.data.get("updated_at")
+        headers = validator_headers(make_etag(student_id, updated_at, variant), updated_at) if updated_at else {}
+        if projection:
+            return projected_response(result.data, projection, headers=headers)
+        response.headers.update(headers)
         # Convert date strings from Supabase to date objects for Pydantic validation
-        if 'date_of_birth' in response.data and isinstance(response.data['date_of_birth'], str):
-            response.data['date_of_birth'] = date.fromisoformat(response.data['date_of_birth'])
-        if 'enrollment_date' in response.data and isinstance(response.data['enrollment_date'], str):
-            response.data['enrollment_date'] = date.fromisoformat(response.data['enrollment_date'])
-        return response.data
-    elif response.error:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=response.error.message)
+        if 'date_of_birth' in result.data and isinstance(result.data['date_of_birth'], str):
+            result.data['date_of_birth'] = date.fromisoformat(result.data['date_of_birth'])
+        if 'enrollment_date' in result.data and isinstance(result.data['enrollment_date'], str):
+            result.data['enrollment_date'] = date.fromisoformat(result.data['enrollment_date'])
+        return result.data
+    elif result.error:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=result.error.message)
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
 
 # Route to update student data (admin only, or student for their own profile with limited fields)
@@ -210,13 +319,18 @@ async def update_student_data(
             if field not in allowed_student_fields:
                 raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"Students are not allowed to update '{field}'")
 
+    if 'email' in student_update and isinstance(student_update['email'], str):
+        student_update['email'] = normalize_email(student_update['email'])
     # Convert date strings to date objects if present in update data
     if 'date_of_birth' in student_update and isinstance(student_update['date_of_birth'], str):
         student_update['date_of_birth'] = date.fromisoformat(student_update['date_of_birth'])
     if 'enrollment_date' in student_update and isinstance(student_update['enrollment_date'], str):
         student_update['enrollment_date'] = date.fromisoformat(student_update['enrollment_date'])
 
-    response = supabase.table("students").update(student_update).eq("student_id", student_id).execute()
+    response = await execute_query(supabase.table("students").update(student_update).eq("student_id", student_id))
+    # Cached full profiles are keyed by students.id
+    profile_cache.invalidate(*(row.get("id") for row in response.data or []))
+    report_cache.invalidate()
     
     if response.data:
         # Supabase update returns the updated rows. Take the first one.
@@ -238,7 +352,9 @@ async def delete_student_data(
     supabase: Client = Depends(get_supabase_client),
     current_user: TokenData = Depends(get_current_admin_user)
 ):
-    response = supabase.table("students").delete().eq("student_id", student_id).execute()
+    response = await execute_query(supabase.table("students").delete().eq("student_id", student_id))
+    profile_cache.invalidate(*(row.get("id") for row in response.data or []))
+    report_cache.invalidate()
     if response.data:
         return {"message": f"Student {student_id} deleted successfully."}
     elif response.error:
@@ -249,12 +365,16 @@ async def delete_student_data(
 async def health_check():
     return {"status": "ok", "message": "Backend is running"}
 
+@app.get("/api/admin/cache-stats")
+async def get_cache_stats(current_admin: TokenData = Depends(get_current_admin_user)):
+    return {"profile_cache": profile_cache.stats(), "report_cache": report_cache.stats()}
+
 @app.get("/api/admin/users")
 async def get_all_users(
     supabase_client: Client = Depends(get_supabase_client),
     current_admin: TokenData = Depends(get_current_admin_user)
 ):
-    response = supabase_client.table("users").select("id, username, role").execute()
+    response = await execute_query(supabase_client.table("users").select("id, username, role"))
     if response.data:
         return response.data
     elif response.error:
@@ -274,13 +394,13 @@ async def create_user(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid role specified.")
 
     # Check if user already exists
-    response = supabase_client.table("users").select("id").eq("username", username).execute()
+    response = await execute_query(supabase_client.table("users").select("id").eq("username", username))
     if response.data:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Username already exists.")
 
     hashed_password = get_password_hash(password)
     user_data = {"username": username, "hashed_password": hashed_password, "role": role}
-    response = supabase_client.table("users").insert(user_data).execute()
+    response = await execute_query(supabase_client.table("users").insert(user_data))
     if response.data:
         return {"message": "User created successfully", "user_id": response.data[0]["id"]}
     else:
@@ -296,7 +416,7 @@ async def update_user_role(
     if new_role not in ["admin", "advisor", "student"]:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid role specified.")
 
-    response = supabase_client.table("users").update({"role": new_role}).eq("id", user_id).execute()
+    response = await execute_query(supabase_client.table("users").update({"role": new_role}).eq("id", user_id))
     if response.data:
         return {"message": f"User {user_id} role updated to {new_role}", "data": response.data[0]}
     elif response.error:
@@ -310,7 +430,7 @@ async def delete_user(
     supabase_client: Client = Depends(get_supabase_client),
     current_admin: TokenData = Depends(get_current_admin_user)
 ):
-    response = supabase_client.table("users").delete().eq("id", user_id).execute()
+    response = await execute_query(supabase_client.table("users").delete().eq("id", user_id))
     if response.data:
         return {"message": f"User {user_id} deleted successfully."}
     elif response.error:
@@ -0,0 +1,114 @@
+import asyncio
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Deque, List, Optional, Tuple, Type
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+# Worker processes validating uploads; with 1, validation runs on a thread of the server process
+INGEST_VALIDATION_WORKERS = int(os.getenv("INGEST_VALIDATION_WORKERS", str(os.cpu_count() or 1)))
+# Items validated per task sent to a worker (defaults to INGEST_BATCH_SIZE, read here rather than
+# imported: workers import this module, which must not pull in the routes and their Supabase client)
+INGEST_VALIDATION_CHUNK_SIZE = int(os.getenv("INGEST_VALIDATION_CHUNK_SIZE", os.getenv("INGEST_BATCH_SIZE", "500")))
+
+# (row number, built row) for the valid items of a chunk and (row number, error) for the invalid ones
+ValidatedChunk = Tuple[List[Tuple[int, Any]], List[Tuple[int, str]]]
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+@lru_cache(maxsize=None)
+def _list_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    # Built once per model and process, so a chunk is validated in a single pydantic-core call
+    return TypeAdapter(List[model])
+
+def validate_chunk(model: Type[BaseModel], build_row: Callable[[Any], Any], items: List[Any], first_row: int) -> ValidatedChunk:
+    """
+    Validate `items` as `model` and convert each valid one with `build_row`. `first_row` is the row
+    number of the first item. Runs in a worker process, so `build_row` should return plain data:
+    pickling nested models back costs more than validating them. `model` and `build_row` are
+    imported by reference in the worker, so they should come from side-effect-free modules
+    such as student_models.
+    """
+    try:
+        models = _list_adapter(model).validate_python(items)
+        return [(first_row + index, build_row(item)) for index, item in enumerate(models)], []
+    except ValidationError:
+        pass
+    # Validate the chunk again item by item so each invalid row is reported with its own errors
+    valid: List[Tuple[int, Any]] = []
+    invalid: List[Tuple[int, str]] = []
+    for row_number, item in enumerate(items, start=first_row):
+        try:
+            valid.append((row_number, build_row(model.model_validate(item))))
+        except ValidationError as e:
+            invalid.append((row_number, str(e)))
+    return valid, invalid
+
+def _validation_executor() -> Optional[Executor]:
+    global _executor
+    if INGEST_VALIDATION_WORKERS <= 1:
+        # The event loop's default thread pool: no parallelism, but still overlapped with writes
+        return None
+    if _executor is None:
+        # Spawned rather than forked: forking a server with live threads can deadlock the child
+        _executor = ProcessPoolExecutor(INGEST_VALIDATION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def close_validation_executor() -> None:
+    """
+    Stop the validation worker processes on app shutdown.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+async def validate_chunk_async(items: List[Any], model: Type[BaseModel], build_row: Callable[[Any], Any], first_row: int = 1) -> ValidatedChunk:
+    """
+    validate_chunk on a worker process (or a thread, with a single worker).
+    """
+    return await asyncio.get_running_loop().run_in_executor(_validation_executor(), validate_chunk, model, build_row, items, first_row)
+
+async def iter_validated_chunks(
+    items: List[Any],
+    model: Type[BaseModel],
+    build_row: Callable[[Any], Any],
+    first_row: int = 1
+) -> AsyncIterator[ValidatedChunk]:
+    """
+    Validate `items` in INGEST_VALIDATION_CHUNK_SIZE chunks across the worker processes and yield
+    each chunk's result (see validate_chunk) in order. One chunk per worker, plus one, is kept in
+    flight, so later chunks are validated while the caller writes the one just yielded.
+    """
+    chunk_starts = iter(range(0, len(items), INGEST_VALIDATION_CHUNK_SIZE))
+    pending: Deque["asyncio.Future[ValidatedChunk]"] = deque()
+
+    def submit_next() -> None:
+        chunk_start = next(chunk_starts, None)
+        if chunk_start is not None:
+            chunk = items[chunk_start:chunk_start + INGEST_VALIDATION_CHUNK_SIZE]
+            pending.append(asyncio.ensure_future(validate_chunk_async(chunk, model, build_row, first_row + chunk_start)))
+
+    for _ in range(max(INGEST_VALIDATION_WORKERS, 1) + 1):
+        submit_next()
+    try:
+        while pending:
+            result = await pending.popleft()
+            submit_next()
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+async def validate_all(items: List[Any], model: Type[BaseModel], build_row: Callable[[Any], Any]) -> ValidatedChunk:
+    """
+    Validate every item across the worker processes; returns all valid rows and all errors, in row order.
+    """
+    valid: List[Tuple[int, Any]] = []
+    invalid: List[Tuple[int, str]] = []
+    async for chunk_valid, chunk_invalid in iter_validated_chunks(items, model, build_row):
+        valid.extend(chunk_valid)
+        invalid.extend(chunk_invalid)
+    return valid, invalid
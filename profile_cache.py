@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from pydantic import BaseModel
+
+# Seconds an assembled profile stays fresh, and the memory budget for all cached profiles
+PROFILE_CACHE_TTL_SECONDS = float(os.getenv("PROFILE_CACHE_TTL_SECONDS", "300"))
+PROFILE_CACHE_MAX_BYTES = int(os.getenv("PROFILE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Recently invalidated keys remembered so a load that started before their invalidation is not cached
+CACHE_INVALIDATION_HISTORY = int(os.getenv("CACHE_INVALIDATION_HISTORY", "4096"))
+
+class TTLCache:
+    """
+    In-process LRU cache of Pydantic models (or plain JSON-serializable values) with a per-entry
+    TTL and a total size budget. Entry size is approximated by the length of the value's JSON serialization.
+
+    A reader that loads a value on a miss takes generation() before loading and passes it to
+    set(), which refuses the value if its key was invalidated in between: the load may have
+    read data from before the write that invalidated it.
+    """
+
+    def __init__(self, ttl_seconds: float, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Invalidation sequence number, the last one per recently invalidated key, and the
+        # latest number forgotten from that history (or of the last clear)
+        self._sequence = 0
+        self._invalidated: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._forgotten_sequence = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._sequence
+
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None) -> None:
+        size = len(value.model_dump_json()) if isinstance(value, BaseModel) else len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation is not None and self._invalidated.get(key, self._forgotten_sequence) > generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def invalidate(self, *keys: Hashable) -> None:
+        with self._lock:
+            for key in keys:
+                if key is None:
+                    continue
+                self._sequence += 1
+                self._invalidated[key] = self._sequence
+                self._invalidated.move_to_end(key)
+                if key in self._entries:
+                    self._remove(key)
+                    self.invalidations += 1
+            while len(self._invalidated) > CACHE_INVALIDATION_HISTORY:
+                _, self._forgotten_sequence = self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._bytes = 0
+            self._sequence += 1
+            self._invalidated.clear()
+            self._forgotten_sequence = self._sequence
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+# Assembled StudentProfileResponse objects keyed by students.id
+profile_cache = TTLCache(PROFILE_CACHE_TTL_SECONDS, PROFILE_CACHE_MAX_BYTES)
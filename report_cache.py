@@ -0,0 +1,71 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from profile_cache import TTLCache
+
+# Seconds a computed report stays fresh, and the memory budget for all cached reports
+REPORT_CACHE_TTL_SECONDS = float(os.getenv("REPORT_CACHE_TTL_SECONDS", "120"))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+class ReportCache:
+    """
+    Cache of computed report results keyed by their normalized filters.
+    Concurrent requests for the same key share a single computation (single-flight), and
+    any write to the underlying tables drops every cached and in-flight result.
+    """
+
+    def __init__(self, ttl_seconds: float, max_bytes: int):
+        self._results = TTLCache(ttl_seconds, max_bytes)
+        self._inflight: Dict[Hashable, "asyncio.Future[Any]"] = {}
+        self._generation = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def trends_key(grade_level: Optional[int], min_gpa: Optional[float], max_gpa: Optional[float]) -> Tuple[Any, ...]:
+        # Normalize so equivalent filters (e.g. min_gpa=3 and min_gpa=3.0) share one entry
+        return (
+            "trends",
+            int(grade_level) if grade_level is not None else None,
+            float(min_gpa) if min_gpa is not None else None,
+            float(max_gpa) if max_gpa is not None else None,
+        )
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached result for `key`, or run `compute` once and share its result with
+        every request that asks for the same key while it is running.
+        """
+        cached = self._results.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute_and_store(key, compute, self._generation))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._inflight.pop(key, None) if self._inflight.get(key) is done else None)
+        else:
+            self.coalesced += 1
+        # Shielded so one caller disconnecting does not cancel the computation the others wait on
+        return await asyncio.shield(task)
+
+    async def _compute_and_store(self, key: Hashable, compute: Callable[[], Awaitable[Any]], generation: int) -> Any:
+        result = await compute()
+        # Don't cache a result computed from data that was written to while it ran
+        if generation == self._generation:
+            self._results.set(key, result)
+        return result
+
+    def invalidate(self) -> None:
+        """
+        Drop all cached reports. Called by every endpoint that writes students, gpa_history or soft_skills.
+        """
+        self._generation += 1
+        self._inflight.clear()
+        self._results.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._results.stats(), "in_flight": len(self._inflight), "coalesced": self.coalesced}
+
+# Results of GET /api/reports/trends keyed by ReportCache.trends_key
+report_cache = ReportCache(REPORT_CACHE_TTL_SECONDS, REPORT_CACHE_MAX_BYTES)
@@ -0,0 +1,165 @@
+import re
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+# (label, lower bound, upper bound) of each GPA histogram bucket, bounds inclusive
+GPA_HISTOGRAM_BUCKETS = [
+    ("0.0-1.0", 0.0, 1.0),
+    ("1.1-2.0", 1.1, 2.0),
+    ("2.1-3.0", 2.1, 3.0),
+    ("3.1-4.0", 3.1, 4.0),
+]
+
+# Term-over-term GPA decrease above which a student is listed as a significant drop
+GPA_DROP_THRESHOLD = 0.3
+
+# Rank of a term within its school year, matched against the lowercased, whitespace-collapsed term.
+# Mirrors the gpa_term_ordinal SQL function; unrecognized terms rank 0.
+TERM_RANKS = [
+    (1, re.compile(r"^(fall|autumn|q1|quarter 1|s1|sem 1|semester 1|t1|trimester 1)\b")),
+    (2, re.compile(r"^(q2|quarter 2|winter|t2|trimester 2)\b")),
+    (3, re.compile(r"^(spring|q3|quarter 3|s2|sem 2|semester 2|t3|trimester 3)\b")),
+    (4, re.compile(r"^(q4|quarter 4)\b")),
+    (5, re.compile(r"^(summer)\b")),
+    (6, re.compile(r"^(full year|year|annual)\b")),
+]
+ACADEMIC_YEAR_PATTERN = re.compile(r"\d{4}")
+
+# Columns the engine reads from gpa_history and soft_skills rows
+GPA_HISTORY_COLUMNS = ["id", "student_id", "academic_year", "term", "gpa_value"]
+SOFT_SKILL_COLUMNS = ["student_id", "skill_name"]
+
+def _academic_year_start(academic_year: Optional[str]) -> Optional[int]:
+    year = ACADEMIC_YEAR_PATTERN.search(academic_year or "")
+    return int(year.group()) if year else None
+
+def _term_rank(term: Optional[str]) -> int:
+    normalized = " ".join((term or "").lower().split())
+    return next((rank for rank, pattern in TERM_RANKS if pattern.match(normalized)), 0)
+
+def term_ordinal(academic_year: Optional[str], term: Optional[str]) -> Optional[int]:
+    """
+    Sortable position of a term: start year of the academic year * 10 plus the term's rank
+    within that year, e.g. ("2023-2024", "Spring") -> 20233. None if the year is missing.
+    """
+    year = _academic_year_start(academic_year)
+    return None if year is None else year * 10 + _term_rank(term)
+
+def _columns(rows: List[Dict[str, Any]], columns: List[str]) -> List[np.ndarray]:
+    """
+    Transpose PostgREST row dicts into one object array per column.
+    """
+    return [np.array([row[column] for row in rows], dtype=object) for column in columns]
+
+def _latest_two_terms(student_positions: np.ndarray, academic_years: np.ndarray, terms: np.ndarray, entry_ids: np.ndarray, student_count: int):
+    """
+    Return, for every student position, the gpa_history row index of the latest and the
+    previous GPA entry (-1 if none). GPA history is sorted once for all students with a single
+    lexsort on (student, term_ordinal, id); the id breaks ties between entries of the same term
+    the way get_reports_trends' ORDER BY term_ordinal DESC NULLS LAST, id DESC does.
+    """
+    latest_rows = np.full(student_count, -1)
+    prev_rows = np.full(student_count, -1)
+    known = np.flatnonzero(student_positions >= 0)
+    if known.size == 0:
+        return latest_rows, prev_rows
+
+    # term_ordinal is evaluated once per distinct academic_year and term; rows without a year sort first
+    year_codes, unique_years = pd.factorize(academic_years[known])
+    term_codes, unique_terms = pd.factorize(terms[known])
+    # (the trailing entries are what code -1, i.e. a missing value, indexes)
+    year_starts = np.array([_academic_year_start(year) for year in unique_years] + [None], dtype=float)
+    term_ranks = np.array([_term_rank(term) for term in unique_terms] + [0])
+    ordinals = np.nan_to_num(year_starts[year_codes] * 10 + term_ranks[term_codes], nan=-1)
+    # Only entries sharing a student and term need the id tiebreak; lowercase UUID strings
+    # sort in the same order as Postgres compares the uuids
+    id_ranks = np.zeros(known.size, dtype=np.int64)
+    tied = pd.DataFrame({"student": student_positions[known], "ordinal": ordinals}).duplicated(keep=False).to_numpy()
+    if tied.any():
+        id_ranks[np.flatnonzero(tied)[np.argsort(entry_ids[known][tied].astype(str))]] = np.arange(np.count_nonzero(tied))
+    order = known[np.lexsort((id_ranks, ordinals, student_positions[known]))]
+    positions = student_positions[order]
+
+    # The last entry of each student's run is the latest term, the one before it the previous term
+    is_last = np.append(positions[1:] != positions[:-1], True)
+    last_idx = np.flatnonzero(is_last)
+    latest_rows[positions[last_idx]] = order[last_idx]
+    has_prev = (last_idx > 0) & (positions[np.maximum(last_idx - 1, 0)] == positions[last_idx])
+    prev_rows[positions[last_idx[has_prev]]] = order[last_idx[has_prev] - 1]
+    return latest_rows, prev_rows
+
+def _take(values: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    # values[rows], with NaN where rows is -1
+    taken = np.full(rows.shape, np.nan)
+    present = rows >= 0
+    taken[present] = values[rows[present]]
+    return taken
+
+def compute_reports_trends(
+    students: List[Dict[str, Any]],
+    gpa_history: List[Dict[str, Any]],
+    soft_skills: List[Dict[str, Any]],
+    min_gpa: Optional[float] = None,
+    max_gpa: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Columnar implementation of the reports/trends aggregation.
+    Computes each student's latest GPA, the GPA histogram, term-over-term drops and
+    soft skill coverage with vectorized pandas/NumPy operations instead of per-student loops.
+    """
+    student_index = pd.Index([s["id"] for s in students])
+    gpa_ids, gpa_student_ids, academic_years, terms, gpa_values = _columns(gpa_history, GPA_HISTORY_COLUMNS)
+    gpa_positions = student_index.get_indexer(gpa_student_ids)
+    gpa_values = pd.to_numeric(pd.Series(gpa_values, dtype=object), errors="coerce").to_numpy(dtype=float)
+    latest_rows, prev_rows = _latest_two_terms(gpa_positions, academic_years, terms, gpa_ids, len(students))
+    latest_gpa = _take(gpa_values, latest_rows)
+    prev_gpa = _take(gpa_values, prev_rows)
+
+    in_report = np.ones(len(students), dtype=bool)
+    if min_gpa is not None or max_gpa is not None:
+        in_report &= ~np.isnan(latest_gpa)
+        if min_gpa is not None:
+            in_report &= latest_gpa >= min_gpa
+        if max_gpa is not None:
+            in_report &= latest_gpa <= max_gpa
+
+    report_gpa = latest_gpa[in_report]
+    gpa_histogram = [
+        {"range": label, "count": int(np.count_nonzero((report_gpa >= lower) & (report_gpa <= upper)))}
+        for label, lower, upper in GPA_HISTOGRAM_BUCKETS
+    ]
+
+    skill_student_ids, skill_names = _columns(soft_skills, SOFT_SKILL_COLUMNS)
+    skill_positions = student_index.get_indexer(skill_student_ids)
+    counted = (skill_positions >= 0) & pd.notna(skill_names) & (skill_names != "")
+    counted[counted] = in_report[skill_positions[counted]]
+    # factorize keeps first-appearance order, so coverage lists skills in the order they were seen
+    skill_codes, unique_skills = pd.factorize(skill_names[counted])
+    skill_counts = np.bincount(skill_codes, minlength=len(unique_skills))
+    soft_skill_coverage = [{"skill_name": name, "count": int(count)} for name, count in zip(unique_skills, skill_counts)]
+
+    drop_amount = np.round(prev_gpa - latest_gpa, 2)
+    gpa_drops_students = []
+    for position in np.flatnonzero(in_report & (drop_amount > GPA_DROP_THRESHOLD)):
+        student = students[position]
+        term1 = gpa_history[prev_rows[position]]
+        term2 = gpa_history[latest_rows[position]]
+        gpa_drops_students.append({
+            "student_id": student["id"],
+            "full_name": student.get("full_name"),
+            "grade_level": student.get("grade_level"),
+            "academic_year": student.get("academic_year"),
+            "status": student.get("status"),
+            "term1": f"{term1.get('academic_year') or 'N/A'} {term1.get('term') or 'N/A'}",
+            "gpa1": float(prev_gpa[position]),
+            "term2": f"{term2.get('academic_year') or 'N/A'} {term2.get('term') or 'N/A'}",
+            "gpa2": float(latest_gpa[position]),
+            "drop_amount": float(drop_amount[position])
+        })
+
+    return {
+        "gpa_histogram": gpa_histogram,
+        "soft_skill_coverage": soft_skill_coverage,
+        "gpa_drops_students": gpa_drops_students
+    }
@@ -159,3 +159,495 @@ CREATE TRIGGER assign_student_role
 AFTER INSERT ON auth.users
 FOR EACH ROW
 EXECUTE FUNCTION handle_new_user();
+
+-- Indexes backing student list filters and keyset pagination (ORDER BY <column>, id)
+CREATE INDEX IF NOT EXISTS idx_students_major_id ON students (major, id);
+CREATE INDEX IF NOT EXISTS idx_students_advisor_id ON students (advisor, id);
+CREATE INDEX IF NOT EXISTS idx_students_last_name_id ON students (last_name, id);
+CREATE INDEX IF NOT EXISTS idx_students_enrollment_date_id ON students (enrollment_date, id);
+CREATE INDEX IF NOT EXISTS idx_students_created_at_id ON students (created_at, id);
+-- students.email is UNIQUE, so ?email= lookups already use its index
+
+-- Store emails trimmed and lowercased (normalize_email in student_models.py), whichever path
+-- writes them, so the exact ?email= lookup finds every student
+CREATE OR REPLACE FUNCTION normalize_student_email()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.email := NULLIF(lower(btrim(NEW.email)), '');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS normalize_student_email ON students;
+CREATE TRIGGER normalize_student_email BEFORE INSERT OR UPDATE OF email ON students
+FOR EACH ROW EXECUTE FUNCTION normalize_student_email();
+
+-- Normalize stored emails; a row whose normalized email already belongs to another student is
+-- left as is (resolve those duplicates by hand)
+UPDATE students s
+SET email = NULLIF(lower(btrim(s.email)), '')
+WHERE s.email IS DISTINCT FROM NULLIF(lower(btrim(s.email)), '')
+  AND NOT EXISTS (
+      SELECT 1 FROM students o
+      WHERE o.id <> s.id AND lower(btrim(o.email)) = lower(btrim(s.email))
+  );
+
+-- Bump students.updated_at whenever a child row changes, so students.updated_at versions the
+-- whole assembled profile (used for ETag / conditional GET revalidation).
+-- Statement-level so a multi-row write touches each affected student once
+CREATE OR REPLACE FUNCTION touch_student_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE students SET updated_at = NOW() WHERE id IN (SELECT DISTINCT student_id FROM new_rows);
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE students SET updated_at = NOW() WHERE id IN (SELECT student_id FROM new_rows UNION SELECT student_id FROM old_rows);
+    ELSE
+        UPDATE students SET updated_at = NOW() WHERE id IN (SELECT DISTINCT student_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    child_table TEXT;
+BEGIN
+    FOREACH child_table IN ARRAY ARRAY[
+        'courses', 'assessment_breakdowns', 'gpa_history', 'attendance', 'extracurricular_activities',
+        'iep_504_plans', 'college_milestones', 'narrative_comments', 'counselor_notes', 'behavior_notes', 'soft_skills'
+    ]
+    LOOP
+        IF to_regclass(child_table) IS NOT NULL THEN
+            -- Replaces the earlier row-level trigger
+            EXECUTE format('DROP TRIGGER IF EXISTS touch_student_updated_at ON %I', child_table);
+            -- Transition tables allow one event per trigger
+            EXECUTE format('DROP TRIGGER IF EXISTS touch_student_updated_at_insert ON %I', child_table);
+            EXECUTE format(
+                'CREATE TRIGGER touch_student_updated_at_insert AFTER INSERT ON %I '
+                'REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION touch_student_updated_at()',
+                child_table
+            );
+            EXECUTE format('DROP TRIGGER IF EXISTS touch_student_updated_at_update ON %I', child_table);
+            EXECUTE format(
+                'CREATE TRIGGER touch_student_updated_at_update AFTER UPDATE ON %I '
+                'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION touch_student_updated_at()',
+                child_table
+            );
+            EXECUTE format('DROP TRIGGER IF EXISTS touch_student_updated_at_delete ON %I', child_table);
+            EXECUTE format(
+                'CREATE TRIGGER touch_student_updated_at_delete AFTER DELETE ON %I '
+                'REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION touch_student_updated_at()',
+                child_table
+            );
+        END IF;
+    END LOOP;
+END;
+$$;
+
+-- Canonical, sortable term position for gpa_history rows: start year of academic_year * 10 plus the
+-- term's rank within the school year (Fall/Q1/S1/T1 = 1, Q2/Winter/T2 = 2, Spring/Q3/S2/T3 = 3,
+-- Q4 = 4, Summer = 5, Full year = 6, unrecognized = 0). Sorting the raw (academic_year, term) strings
+-- puts e.g. "Winter" after "Summer" and "Q1" after "Fall". Keep in sync with reports_engine.term_ordinal.
+CREATE OR REPLACE FUNCTION gpa_term_ordinal(p_academic_year TEXT, p_term TEXT)
+RETURNS INTEGER AS $$
+    SELECT substring(p_academic_year FROM '\d{4}')::INTEGER * 10 + CASE
+        WHEN normalized.term ~ '^(fall|autumn|q1|quarter 1|s1|sem 1|semester 1|t1|trimester 1)\M' THEN 1
+        WHEN normalized.term ~ '^(q2|quarter 2|winter|t2|trimester 2)\M' THEN 2
+        WHEN normalized.term ~ '^(spring|q3|quarter 3|s2|sem 2|semester 2|t3|trimester 3)\M' THEN 3
+        WHEN normalized.term ~ '^(q4|quarter 4)\M' THEN 4
+        WHEN normalized.term ~ '^(summer)\M' THEN 5
+        WHEN normalized.term ~ '^(full year|year|annual)\M' THEN 6
+        ELSE 0
+    END
+    FROM (SELECT lower(regexp_replace(btrim(COALESCE(p_term, '')), '\s+', ' ', 'g')) AS term) normalized;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Stored with each row when it is written, and indexed so "latest N terms" is an index-ordered LIMIT
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'gpa_history' AND column_name = 'term') THEN
+        EXECUTE 'ALTER TABLE gpa_history ADD COLUMN IF NOT EXISTS term_ordinal INTEGER '
+                'GENERATED ALWAYS AS (gpa_term_ordinal(academic_year, term)) STORED';
+        -- id breaks ties between entries of the same term, so "latest" is deterministic
+        EXECUTE 'CREATE INDEX IF NOT EXISTS idx_gpa_history_student_term_ordinal_id '
+                'ON gpa_history (student_id, term_ordinal DESC NULLS LAST, id DESC)';
+        -- Superseded by the composite index above
+        DROP INDEX IF EXISTS idx_gpa_history_student_id;
+        DROP INDEX IF EXISTS idx_gpa_history_student_term_ordinal;
+    END IF;
+END;
+$$;
+
+-- Denormalized GPA summary on students, maintained from gpa_history on every write so reports can
+-- filter by latest GPA and find term-over-term drops with index range scans instead of re-sorting history
+ALTER TABLE students ADD COLUMN IF NOT EXISTS latest_gpa NUMERIC;
+ALTER TABLE students ADD COLUMN IF NOT EXISTS prev_gpa NUMERIC;
+ALTER TABLE students ADD COLUMN IF NOT EXISTS gpa_delta NUMERIC; -- latest_gpa - prev_gpa, rounded to 2 places
+
+CREATE INDEX IF NOT EXISTS idx_students_latest_gpa_id ON students (latest_gpa, id);
+CREATE INDEX IF NOT EXISTS idx_students_gpa_delta ON students (gpa_delta);
+
+CREATE OR REPLACE FUNCTION refresh_student_gpa_summary(p_student_ids UUID[])
+RETURNS VOID AS $$
+BEGIN
+    UPDATE students s
+    SET latest_gpa = summary.latest_gpa,
+        prev_gpa = summary.prev_gpa,
+        gpa_delta = ROUND(summary.latest_gpa - summary.prev_gpa, 2)
+    FROM (
+        SELECT ids.student_id, recent.gpa_values[1] AS latest_gpa, recent.gpa_values[2] AS prev_gpa
+        FROM UNNEST(p_student_ids) AS ids(student_id)
+        CROSS JOIN LATERAL (
+            SELECT ARRAY(
+                SELECT g.gpa_value::NUMERIC
+                FROM gpa_history g
+                WHERE g.student_id = ids.student_id
+                ORDER BY g.term_ordinal DESC NULLS LAST, g.id DESC
+                LIMIT 2
+            ) AS gpa_values
+        ) recent
+    ) summary
+    WHERE s.id = summary.student_id
+      AND (s.latest_gpa, s.prev_gpa) IS DISTINCT FROM (summary.latest_gpa, summary.prev_gpa);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement-level so a multi-row insert refreshes each affected student once
+CREATE OR REPLACE FUNCTION sync_student_gpa_summary()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_student_gpa_summary(ARRAY(SELECT DISTINCT student_id FROM new_rows));
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM refresh_student_gpa_summary(ARRAY(SELECT student_id FROM new_rows UNION SELECT student_id FROM old_rows));
+    ELSE
+        PERFORM refresh_student_gpa_summary(ARRAY(SELECT DISTINCT student_id FROM old_rows));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Only on databases whose gpa_history has the gpa_value/term_ordinal columns the refresh reads;
+-- elsewhere the triggers would fail every gpa_history write
+DO $$
+BEGIN
+    DROP TRIGGER IF EXISTS sync_student_gpa_summary_insert ON gpa_history;
+    DROP TRIGGER IF EXISTS sync_student_gpa_summary_update ON gpa_history;
+    DROP TRIGGER IF EXISTS sync_student_gpa_summary_delete ON gpa_history;
+    IF (SELECT COUNT(*) FROM information_schema.columns
+        WHERE table_name = 'gpa_history' AND column_name IN ('gpa_value', 'term_ordinal')) = 2 THEN
+        CREATE TRIGGER sync_student_gpa_summary_insert
+        AFTER INSERT ON gpa_history
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION sync_student_gpa_summary();
+
+        CREATE TRIGGER sync_student_gpa_summary_update
+        AFTER UPDATE ON gpa_history
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION sync_student_gpa_summary();
+
+        CREATE TRIGGER sync_student_gpa_summary_delete
+        AFTER DELETE ON gpa_history
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION sync_student_gpa_summary();
+
+        -- Backfill existing students
+        PERFORM refresh_student_gpa_summary(ARRAY(SELECT id FROM students));
+    END IF;
+END;
+$$;
+
+-- Reports/trends aggregation (called via RPC from GET /api/reports/trends).
+-- Returns only the final GPA histogram, soft skill coverage and GPA drop list.
+CREATE OR REPLACE FUNCTION get_reports_trends(
+    p_grade_level INTEGER DEFAULT NULL,
+    p_min_gpa NUMERIC DEFAULT NULL,
+    p_max_gpa NUMERIC DEFAULT NULL
+)
+RETURNS JSONB AS $$
+BEGIN
+    RETURN (
+WITH report_students AS (
+    SELECT s.id, s.full_name, s.grade_level, s.academic_year, s.status, s.latest_gpa, s.prev_gpa, s.gpa_delta
+    FROM students s
+    WHERE (p_grade_level IS NULL OR s.grade_level = p_grade_level)
+      AND (p_min_gpa IS NULL OR s.latest_gpa >= p_min_gpa)
+      AND (p_max_gpa IS NULL OR s.latest_gpa <= p_max_gpa)
+)
+SELECT jsonb_build_object(
+    'gpa_histogram', (
+        SELECT jsonb_agg(jsonb_build_object('range', b.label, 'count', (
+            SELECT COUNT(*) FROM report_students r WHERE r.latest_gpa BETWEEN b.lower_bound AND b.upper_bound
+        )) ORDER BY b.lower_bound)
+        FROM (VALUES ('0.0-1.0', 0.0, 1.0), ('1.1-2.0', 1.1, 2.0), ('2.1-3.0', 2.1, 3.0), ('3.1-4.0', 3.1, 4.0))
+            AS b(label, lower_bound, upper_bound)
+    ),
+    'soft_skill_coverage', COALESCE((
+        SELECT jsonb_agg(jsonb_build_object('skill_name', sc.skill_name, 'count', sc.skill_count) ORDER BY sc.skill_name)
+        FROM (
+            SELECT ss.skill_name, COUNT(*) AS skill_count
+            FROM soft_skills ss
+            JOIN report_students r ON r.id = ss.student_id
+            WHERE ss.skill_name IS NOT NULL AND ss.skill_name <> ''
+            GROUP BY ss.skill_name
+        ) sc
+    ), '[]'::jsonb),
+    'gpa_drops_students', COALESCE((
+        SELECT jsonb_agg(jsonb_build_object(
+            'student_id', r.id,
+            'full_name', r.full_name,
+            'grade_level', r.grade_level,
+            'academic_year', r.academic_year,
+            'status', r.status,
+            'term1', terms.labels[2],
+            'gpa1', r.prev_gpa,
+            'term2', terms.labels[1],
+            'gpa2', r.latest_gpa,
+            'drop_amount', -r.gpa_delta
+        ))
+        FROM report_students r
+        CROSS JOIN LATERAL (
+            SELECT ARRAY(
+                SELECT COALESCE(g.academic_year, 'N/A') || ' ' || COALESCE(g.term, 'N/A')
+                FROM gpa_history g
+                WHERE g.student_id = r.id
+                ORDER BY g.term_ordinal DESC NULLS LAST, g.id DESC
+                LIMIT 2
+            ) AS labels
+        ) terms
+        WHERE r.gpa_delta < -0.3
+    ), '[]'::jsonb)
+)
+    );
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+
+-- Hash of the uploaded row or profile a student was last written from, so re-uploads can skip
+-- unchanged students. Any other change to the student (including the updated_at / GPA summary
+-- updates made when its related rows change) clears it, so a later re-upload of the old
+-- content is written again instead of being mistaken for unchanged.
+ALTER TABLE students ADD COLUMN IF NOT EXISTS content_hash TEXT;
+-- Students uploaded without an email are matched on it
+CREATE INDEX IF NOT EXISTS idx_students_content_hash ON students (content_hash);
+
+CREATE OR REPLACE FUNCTION clear_student_content_hash()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.content_hash IS NOT DISTINCT FROM OLD.content_hash THEN
+        NEW.content_hash := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS clear_student_content_hash ON students;
+CREATE TRIGGER clear_student_content_hash BEFORE UPDATE ON students
+FOR EACH ROW EXECUTE FUNCTION clear_student_content_hash();
+
+-- Atomic profile writes (called via RPC from the ingest and full-profile update endpoints).
+-- Writes the students row and every given related table in one transaction: either the whole
+-- profile is written or nothing is. p_student holds students columns; p_children maps a related
+-- table name to the complete list of its rows for the student (student_id is filled in here).
+-- With p_student_id NULL a new student is inserted; otherwise each table listed in p_children
+-- replaces that student's existing rows. Tables listed in p_keys (table name -> natural key
+-- columns) are diffed against the stored rows instead, with the same end result: rows are
+-- paired by key and by occurrence of that key (keys may repeat), unpaired stored rows are
+-- deleted, paired rows whose values differ are updated and unpaired incoming rows are inserted,
+-- so unchanged rows are not touched. An empty key list pairs the student's rows by content
+-- alone (attendance, iep_504_plans hold a single row). A content_hash in p_student is stored after everything else,
+-- since the writes before it clear the hash (see clear_student_content_hash).
+DROP FUNCTION IF EXISTS write_student_profile(UUID, JSONB, JSONB);
+CREATE OR REPLACE FUNCTION write_student_profile(
+    p_student_id UUID,
+    p_student JSONB,
+    p_children JSONB DEFAULT '{}'::jsonb,
+    p_keys JSONB DEFAULT '{}'::jsonb
+)
+RETURNS UUID AS $$
+DECLARE
+    v_student_id UUID := p_student_id;
+    v_content_hash TEXT := p_student ->> 'content_hash';
+    v_columns TEXT;
+    v_rows JSONB;
+    v_key_match TEXT;
+    v_new_partition TEXT;
+    v_old_partition TEXT;
+    v_set_columns TEXT;
+    v_new_values TEXT;
+    v_old_values TEXT;
+    child_table TEXT;
+BEGIN
+    p_student := p_student - 'content_hash';
+    SELECT string_agg(quote_ident(key), ', ') INTO v_columns FROM jsonb_object_keys(COALESCE(p_student, '{}'::jsonb)) AS key;
+
+    IF v_student_id IS NULL THEN
+        EXECUTE format(
+            'INSERT INTO students (%1$s) SELECT %1$s FROM jsonb_populate_record(NULL::students, $1) RETURNING id',
+            v_columns
+        ) INTO v_student_id USING p_student;
+    ELSE
+        -- Lock the student so concurrent writes to the same profile apply one after the other
+        PERFORM 1 FROM students WHERE id = v_student_id FOR UPDATE;
+        IF NOT FOUND THEN
+            RAISE EXCEPTION 'Student % not found.', v_student_id USING ERRCODE = 'P0002';
+        END IF;
+        IF v_columns IS NOT NULL THEN
+            EXECUTE format(
+                'UPDATE students SET (%1$s) = (SELECT %1$s FROM jsonb_populate_record(NULL::students, $1)) WHERE id = $2',
+                v_columns
+            ) USING p_student, v_student_id;
+        END IF;
+    END IF;
+
+    FOR child_table IN SELECT jsonb_object_keys(COALESCE(p_children, '{}'::jsonb))
+    LOOP
+        IF child_table <> ALL (ARRAY[
+            'courses', 'assessment_breakdowns', 'gpa_history', 'attendance', 'extracurricular_activities',
+            'iep_504_plans', 'college_milestones', 'narrative_comments', 'counselor_notes', 'behavior_notes', 'soft_skills'
+        ]) THEN
+            RAISE EXCEPTION 'Unknown profile table: %', child_table USING ERRCODE = '22023';
+        END IF;
+
+        SELECT jsonb_agg(row_data || jsonb_build_object('student_id', v_student_id))
+        INTO v_rows
+        FROM jsonb_array_elements(p_children -> child_table) AS row_data;
+
+        IF p_student_id IS NOT NULL AND COALESCE(p_keys, '{}'::jsonb) ? child_table THEN
+            IF v_rows IS NULL THEN
+                EXECUTE format('DELETE FROM %I WHERE student_id = $1', child_table) USING v_student_id;
+                CONTINUE;
+            END IF;
+
+            -- Natural keys need not be unique (two identical comments, a repeated course_id), so
+            -- rows are paired as multisets: the i-th stored row of a key with the i-th incoming
+            -- row of that key, ordered by content so identical rows pair with each other
+            SELECT COALESCE(string_agg(format('t.%1$I IS NOT DISTINCT FROM n.%1$I', key), ' AND '), 'TRUE'),
+                   COALESCE('PARTITION BY ' || string_agg('n.' || quote_ident(key), ', '), ''),
+                   COALESCE('PARTITION BY ' || string_agg('t.' || quote_ident(key), ', '), '')
+            INTO v_key_match, v_new_partition, v_old_partition
+            FROM jsonb_array_elements_text(p_keys -> child_table) AS key;
+
+            SELECT string_agg(quote_ident(key), ', '),
+                   string_agg('n.' || quote_ident(key), ', '),
+                   string_agg('t.' || quote_ident(key), ', ')
+            INTO v_set_columns, v_new_values, v_old_values
+            FROM jsonb_object_keys(v_rows -> 0) AS key
+            WHERE key <> 'student_id' AND NOT (p_keys -> child_table) ? key;
+
+            SELECT string_agg(quote_ident(key), ', ') INTO v_columns FROM jsonb_object_keys(v_rows -> 0) AS key;
+
+            -- One statement, so the deletes, updates and inserts all see the rows as stored before it
+            EXECUTE format(
+                'WITH n AS ('
+                '    SELECT n.*, row_number() OVER (%3$s ORDER BY %5$s n.ordinality) AS diff_rank'
+                '    FROM jsonb_populate_recordset(NULL::%1$I, $1) WITH ORDINALITY AS n'
+                '), t AS ('
+                '    SELECT t.*, t.ctid AS diff_ctid, row_number() OVER (%4$s ORDER BY %6$s t.ctid) AS diff_rank'
+                '    FROM %1$I t WHERE t.student_id = $2'
+                '), deleted AS ('
+                '    DELETE FROM %1$I d USING t WHERE d.ctid = t.diff_ctid'
+                '    AND NOT EXISTS (SELECT 1 FROM n WHERE %2$s AND n.diff_rank = t.diff_rank)'
+                ')%7$s '
+                'INSERT INTO %1$I (%8$s) SELECT %8$s FROM n '
+                'WHERE NOT EXISTS (SELECT 1 FROM t WHERE %2$s AND t.diff_rank = n.diff_rank)',
+                child_table,
+                v_key_match,
+                v_new_partition,
+                v_old_partition,
+                CASE WHEN v_set_columns IS NULL THEN '' ELSE format('ROW(%s)::text,', v_new_values) END,
+                CASE WHEN v_set_columns IS NULL THEN '' ELSE format('ROW(%s)::text,', v_old_values) END,
+                CASE WHEN v_set_columns IS NULL THEN '' ELSE format(
+                    ', updated AS ('
+                    '    UPDATE %1$I u SET (%2$s) = ROW(%3$s) FROM t JOIN n ON %4$s AND n.diff_rank = t.diff_rank'
+                    '    WHERE u.ctid = t.diff_ctid AND ROW(%5$s) IS DISTINCT FROM ROW(%3$s)'
+                    ')',
+                    child_table, v_set_columns, v_new_values, v_key_match, v_old_values
+                ) END,
+                v_columns
+            ) USING v_rows, v_student_id;
+            CONTINUE;
+        END IF;
+
+        IF p_student_id IS NOT NULL THEN
+            EXECUTE format('DELETE FROM %I WHERE student_id = $1', child_table) USING v_student_id;
+        END IF;
+
+        IF v_rows IS NOT NULL THEN
+            SELECT string_agg(quote_ident(key), ', ') INTO v_columns FROM jsonb_object_keys(v_rows -> 0) AS key;
+            EXECUTE format(
+                'INSERT INTO %1$I (%2$s) SELECT %2$s FROM jsonb_populate_recordset(NULL::%1$I, $1)',
+                child_table, v_columns
+            ) USING v_rows;
+        END IF;
+    END LOOP;
+
+    IF v_content_hash IS NOT NULL THEN
+        UPDATE students SET content_hash = v_content_hash WHERE id = v_student_id;
+    END IF;
+
+    RETURN v_student_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Batch form of write_student_profile: p_profiles is an array of
+-- {"student": {...}, "children": {...}} objects, all written in one transaction. An object with
+-- an "id" rewrites that existing student (its listed tables are replaced); the others are
+-- inserted as new students. Returns the student ids in input order.
+CREATE OR REPLACE FUNCTION write_student_profiles(p_profiles JSONB)
+RETURNS UUID[] AS $$
+DECLARE
+    v_ids UUID[] := ARRAY[]::UUID[];
+    v_profile JSONB;
+BEGIN
+    FOR v_profile IN SELECT value FROM jsonb_array_elements(p_profiles) WITH ORDINALITY ORDER BY ordinality
+    LOOP
+        v_ids := v_ids || write_student_profile((v_profile ->> 'id')::uuid, v_profile -> 'student', v_profile -> 'children');
+    END LOOP;
+    RETURN v_ids;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Diff-mode profile update for the full-profile PATCH endpoint: applies write_student_profile
+-- with p_keys and returns the updated student row with every related table embedded as an
+-- array (the shape of the PostgREST embedded profile select), so no separate re-read is needed.
+CREATE OR REPLACE FUNCTION update_student_profile(p_student_id UUID, p_student JSONB, p_children JSONB, p_keys JSONB)
+RETURNS JSONB AS $$
+DECLARE
+    v_profile JSONB;
+    v_rows JSONB;
+    child_table TEXT;
+BEGIN
+    PERFORM write_student_profile(p_student_id, p_student, p_children, p_keys);
+
+    SELECT to_jsonb(s) INTO v_profile FROM students s WHERE s.id = p_student_id;
+    FOREACH child_table IN ARRAY ARRAY[
+        'courses', 'assessment_breakdowns', 'gpa_history', 'attendance', 'extracurricular_activities',
+        'iep_504_plans', 'college_milestones', 'narrative_comments', 'counselor_notes', 'behavior_notes', 'soft_skills'
+    ]
+    LOOP
+        EXECUTE format('SELECT COALESCE(jsonb_agg(to_jsonb(t)), ''[]''::jsonb) FROM %I t WHERE t.student_id = $1', child_table)
+        INTO v_rows USING p_student_id;
+        v_profile := v_profile || jsonb_build_object(child_table, v_rows);
+    END LOOP;
+    RETURN v_profile;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Background bulk upload jobs (ingestion_jobs.py). Saved by the worker running each job every few
+-- seconds, so any worker can report its progress and finished jobs survive restarts; updated_at
+-- doubles as the heartbeat that tells a stopped job from a running one. errors is written once
+-- the job finishes. Only the backend (service role) reads or writes it.
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id UUID PRIMARY KEY,
+    status TEXT NOT NULL,
+    state JSONB NOT NULL,
+    errors JSONB NOT NULL DEFAULT '[]'::jsonb,
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_updated_at ON ingestion_jobs (updated_at);
+ALTER TABLE ingestion_jobs ENABLE ROW LEVEL SECURITY;
@@ -1,294 +1,419 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query, UploadFile, File
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from fastapi import APIRouter, HTTPException, Depends, status, Query, UploadFile, File, Response, Header
+from typing import List, Optional, Dict, Any, AsyncIterator, BinaryIO
 from datetime import date
+import asyncio
+import os
 from supabase import Client
-from supabase_client import get_supabase_client
-from auth_utils import get_current_admin_user, get_current_user_role, decode_access_token
+from supabase_client import get_supabase_client, execute_query
+from auth_utils import get_current_admin_user, get_current_user_role
+from profile_cache import profile_cache
+from report_cache import report_cache
+from student_models import (
+    StudentInfoCore, Course, AssessmentBreakdown, GPAHistoryEntry, Absences, Tardies, AttendanceData, ExtracurricularActivity,
+    IEP504Plan, CollegeMilestone, NarrativeComment, StaffNote, SoftSkillInference, StudentProfileData, UnstructuredData,
+    StudentIngestionPayload, StudentSummary, StudentProfileResponse, StudentUpdatePayload, CommentCreate, StudentProfile,
+    StudentProfileUpdate, PROFILE_SECTION_TABLES, PROFILE_TABLE_NATURAL_KEYS, _student_insert_row, _section_rows,
+    _student_child_rows, _student_profile_rows
+)
+from http_caching import make_etag, etag_matches, not_modified, validator_headers
+from pagination import apply_keyset_page, apply_student_filters, next_page_cursor, student_select_columns, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER
+from reports_engine import compute_reports_trends
 import pandas as pd
 
 router = APIRouter()
 
-# --- Pydantic Models for Request Body Validation (kept consistent with logical structure) ---
-
-class StudentInfoCore(BaseModel):
-    full_name: str
-    grade_level: int
-    academic_year: str
-    status: str = "None"
-
-class Course(BaseModel):
-    course_id: str
-    student_id: str
-    course_name: str
-    credits: float
-    grade: str
-    semester: str
-    year: int
-
-class AssessmentBreakdown(BaseModel):
-    type: str
-    performance_metric: float
-    description: Optional[str] = None
-
-class GPAHistoryEntry(BaseModel):
-    academic_year: str
-    term: str
-    gpa_value: float
-
-class Absences(BaseModel):
-    excused: int
-    unexcused: int
-
-class Tardies(BaseModel):
-    count: int
-    dates: List[str]
-
-class AttendanceData(BaseModel):
-    absences: Optional[Absences] = None
-    tardies: Optional[Tardies] = None
-
-class ExtracurricularActivity(BaseModel):
-    activity_name: str
-    role_title: Optional[str] = None
-    start_date: str # Use string for date for simplicity with Pydantic and DB
-    end_date: Optional[str] = None
-    is_ongoing: bool = False
-    is_leadership: bool = False
-
-class IEP504Plan(BaseModel):
-    has_plan: bool
-    plan_type: Optional[str] = None
-    accommodations: Optional[List[str]] = None
-    last_updated_date: Optional[str] = None
-
-class CollegeMilestone(BaseModel):
-    milestone_name: str
-    status: str
-    date: str
-
-class NarrativeComment(BaseModel):
-    subject: str
-    teacher: str
-    term: str
-    comment_text: str
-
-class StaffNote(BaseModel):
-    staff_name: str
-    role: Optional[str] = None
-    date: str
-    note_text: str
-
-class SoftSkillInference(BaseModel):
-    skill_name: str
-    source_phrase: str
-    explanation: str
-    confidence_level: str
-
-class Attendance(BaseModel):
-    attendance_id: str
-    student_id: str
-    date: str
-    status: str # e.g., 'Present', 'Absent', 'Tardy'
-
-class FinancialAid(BaseModel):
-    financial_aid_id: str
-    student_id: str
-    aid_type: str
-    amount: float
-    date_awarded: str
-
-# Main Structured Data Section of the Student Profile
-class StudentProfileData(BaseModel):
-    student_info: StudentInfoCore
-    courses: List[Course] = Field(default_factory=list)
-    assessment_breakdown_by_type: List[AssessmentBreakdown] = Field(default_factory=list)
-    gpa_history: List[GPAHistoryEntry] = Field(default_factory=list)
-    attendance: Optional[AttendanceData] = None
-    extracurricular_activities: List[ExtracurricularActivity] = Field(default_factory=list)
-    iep_504_plan_information: Optional[IEP504Plan] = None
-    college_counseling_milestones: List[CollegeMilestone] = Field(default_factory=list)
-
-# Unstructured Data Section of the Student Profile
-class UnstructuredData(BaseModel):
-    narrative_teacher_comments: List[NarrativeComment] = Field(default_factory=list)
-    advisory_counselor_notes: List[StaffNote] = Field(default_factory=list)
-    behavior_social_emotional_notes: List[StaffNote] = Field(default_factory=list)
-
-# Overall Student Profile Input Payload
-class StudentIngestionPayload(BaseModel):
-    student_profile: StudentProfileData
-    unstructured_data: UnstructuredData = Field(default_factory=lambda: UnstructuredData())
-    soft_skill_inferences: List[SoftSkillInference] = Field(default_factory=list)
-
-# Student Summary Model (for /students GET)
-class StudentSummary(BaseModel):
-    id: str
-    full_name: str
-    grade_level: int
-    academic_year: str
-    status: str
-    has_504_plan: bool = False # Derived from iep_504_plan_information
-
-# Student Profile Response Model (for /students/{id} GET)
-class StudentProfileResponse(BaseModel):
-    student_profile: StudentProfileData
-    unstructured_data: UnstructuredData
-    soft_skill_inferences: List[SoftSkillInference]
-
-# Student Update Payload (for /students/{id} PATCH)
-class StudentUpdatePayload(BaseModel):
-    full_name: Optional[str] = None
-    grade_level: Optional[int] = None
-    academic_year: Optional[str] = None
-    status: Optional[str] = None
-    courses: Optional[List[Course]] = None
-    assessment_breakdown_by_type: Optional[List[AssessmentBreakdown]] = None
-    gpa_history: Optional[List[GPAHistoryEntry]] = None
-    attendance: Optional[AttendanceData] = None
-    extracurricular_activities: Optional[List[ExtracurricularActivity]] = None
-    iep_504_plan_information: Optional[IEP504Plan] = None
-    college_counseling_milestones: Optional[List[CollegeMilestone]] = None
-    narrative_teacher_comments: Optional[List[NarrativeComment]] = None
-    advisory_counselor_notes: Optional[List[StaffNote]] = None
-    behavior_social_emotional_notes: Optional[List[StaffNote]] = None
-    soft_skill_inferences: Optional[List[SoftSkillInference]] = None
-
-# Comment Create Model (for /students/{id}/comments POST)
-class CommentCreate(BaseModel):
-    subject: str
-    teacher: str
-    term: str
-    comment_text: str
-
-# New Student Profile Model
-class StudentProfile(BaseModel):
-    student_id: str = Field(..., description="Unique identifier for the student")
-    first_name: str
-    last_name: str
-    date_of_birth: date
-    gender: str
-    email: str
-    phone_number: str
-    address: str
-    enrollment_date: date
-    major: str
-    gpa: float
-    academic_standing: str
-    advisor: str
-    enrollment_status: str
-    financial_aid_status: str
-    scholarship_amount: float
-    # Add other fields as per your schema.sql
-
-# New Student Profile Update Model
-class StudentProfileUpdate(BaseModel):
-    first_name: Optional[str] = None
-    last_name: Optional[str] = None
-    date_of_birth: Optional[date] = None
-    gender: Optional[str] = None
-    email: Optional[str] = None
-    phone_number: Optional[str] = None
-    address: Optional[str] = None
-    enrollment_date: Optional[date] = None
-    major: Optional[str] = None
-    gpa: Optional[float] = None
-    academic_standing: Optional[str] = None
-    advisor: Optional[str] = None
-    enrollment_status: Optional[str] = None
-    financial_aid_status: Optional[str] = None
-    scholarship_amount: Optional[float] = None
+# Profiles per multi-row 'students' insert, and rows per multi-row insert into each related table
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_CHILD_CHUNK_SIZE = int(os.getenv("INGEST_CHILD_CHUNK_SIZE", "1000"))
+# CSV rows parsed, validated and written per step of a streaming upload; bounds upload memory
+INGEST_CSV_CHUNK_ROWS = int(os.getenv("INGEST_CSV_CHUNK_ROWS", str(INGEST_BATCH_SIZE)))
+
+async def iter_csv_chunks(file: BinaryIO, chunk_rows: int = INGEST_CSV_CHUNK_ROWS, **read_csv_kwargs) -> AsyncIterator[pd.DataFrame]:
+    """
+    Parse an uploaded CSV incrementally, yielding DataFrames of at most chunk_rows rows.
+    Only one chunk is held in memory at a time, and parsing runs in a worker thread so a
+    large upload does not block the event loop.
+    """
+    reader = pd.read_csv(file, chunksize=chunk_rows, **read_csv_kwargs)
+    try:
+        while True:
+            chunk = await asyncio.to_thread(next, reader, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        reader.close()
+
+def _rpc_missing(error: Exception) -> bool:
+    # PostgREST answers PGRST202 when the function has not been created (schema.sql not applied yet)
+    return getattr(error, "code", None) == "PGRST202"
+
+async def _write_student_profile_atomic(
+    supabase_client: Client,
+    student_id: Optional[str],
+    student_fields: Dict[str, Any],
+    child_rows: Dict[str, List[Dict[str, Any]]]
+) -> str:
+    """
+    Write the students row and the given related tables in one transaction through the
+    write_student_profile SQL function: a single round trip that either fully applies or fails.
+    With student_id None a new student is created; otherwise each table in child_rows replaces
+    that student's rows. Returns the student id.
+    """
+    response = await execute_query(supabase_client.rpc("write_student_profile", {
+        "p_student_id": student_id,
+        "p_student": student_fields,
+        "p_children": child_rows
+    }))
+    return response.data
+
+async def _update_student_profile_diff(
+    supabase_client: Client,
+    student_id: str,
+    student_fields: Dict[str, Any],
+    child_rows: Dict[str, List[Dict[str, Any]]]
+) -> Dict[str, Any]:
+    """
+    Apply a full-profile update through the update_student_profile SQL function in one transaction.
+    Each given section is diffed against the stored rows by PROFILE_TABLE_NATURAL_KEYS, so only
+    added, changed and removed rows are written. Returns the updated students row with every
+    related table embedded, in the shape of PROFILE_EMBEDDED_SELECT.
+    """
+    response = await execute_query(supabase_client.rpc("update_student_profile", {
+        "p_student_id": student_id,
+        "p_student": student_fields,
+        "p_children": child_rows,
+        "p_keys": {table: PROFILE_TABLE_NATURAL_KEYS[table] for table in child_rows}
+    }))
+    return response.data
 
 # --- Helper function to insert a single student profile across normalized tables ---
 async def _insert_single_student_profile_normalized(profile: StudentIngestionPayload, supabase_client: Client):
     """
     Helper function to insert a single student profile into normalized tables.
     """
+    try:
+        student_id = await _write_student_profile_atomic(supabase_client, None, _student_insert_row(profile), _student_child_rows(profile, None))
+        report_cache.invalidate()
+        return {"status": "success", "message": "Student profile created successfully", "student_id": str(student_id)}
+    except Exception as e:
+        if not _rpc_missing(e):
+            raise
+        print("Warning: write_student_profile RPC is not available, inserting profile table by table.")
+
     # 1. Insert into 'students' table first to get the student_id
-    student_info = profile.student_profile.student_info.model_dump()
-    student_insert_data = {
-        "full_name": student_info["full_name"],
-        "grade_level": student_info["grade_level"],
-        "academic_year": student_info["academic_year"],
-        "status": student_info["status"],
-    }
-    response = supabase_client.from('students').insert(student_insert_data).execute()
+    response = await execute_query(supabase_client.from_('students').insert(_student_insert_row(profile)))
 
     if not response.data:
         raise HTTPException(status_code=500, detail="Failed to insert student record into 'students' table.")
     
     student_id = response.data[0]['id']
+    report_cache.invalidate()
 
     # 2. Insert into related tables, linking with student_id
-    # Courses
-    if profile.student_profile.courses:
-        courses_to_insert = [{"student_id": student_id, **c.model_dump()} for c in profile.student_profile.courses]
-        supabase_client.from('courses').insert(courses_to_insert).execute()
-
-    # Assessment Breakdowns
-    if profile.student_profile.assessment_breakdown_by_type:
-        assessments_to_insert = [{"student_id": student_id, **a.model_dump()} for a in profile.student_profile.assessment_breakdown_by_type]
-        supabase_client.from('assessment_breakdowns').insert(assessments_to_insert).execute()
-
-    # GPA History
-    if profile.student_profile.gpa_history:
-        gpa_history_to_insert = [{"student_id": student_id, **g.model_dump()} for g in profile.student_profile.gpa_history]
-        supabase_client.from('gpa_history').insert(gpa_history_to_insert).execute()
-
-    # Attendance
-    if profile.student_profile.attendance:
-        attendance_data = profile.student_profile.attendance.model_dump()
-        supabase_client.from('attendance').insert({
-            "student_id": student_id,
-            "excused": attendance_data.get("absences", {}).get("excused", 0),
-            "unexcused": attendance_data.get("absences", {}).get("unexcused", 0),
-            "tardy_count": attendance_data.get("tardies", {}).get("count", 0),
-            "tardy_dates": attendance_data.get("tardies", {}).get("dates", [])
-        }).execute()
-
-    # Extracurricular Activities
-    if profile.student_profile.extracurricular_activities:
-        activities_to_insert = [{"student_id": student_id, **a.model_dump()} for a in profile.student_profile.extracurricular_activities]
-        supabase_client.from('extracurricular_activities').insert(activities_to_insert).execute()
-
-    # IEP/504 Plan Information
-    if profile.student_profile.iep_504_plan_information:
-        iep_data = profile.student_profile.iep_504_plan_information.model_dump()
-        supabase_client.from('iep_504_plans').insert({
-            "student_id": student_id,
-            "has_plan": iep_data.get("has_plan", False),
-            "plan_type": iep_data.get("plan_type"),
-            "accommodations": iep_data.get("accommodations", []),
-            "last_updated": iep_data.get("last_updated_date")
-        }).execute()
-
-    # College Counseling Milestones
-    if profile.student_profile.college_counseling_milestones:
-        milestones_to_insert = [{"student_id": student_id, **m.model_dump()} for m in profile.student_profile.college_counseling_milestones]
-        supabase_client.from('college_milestones').insert(milestones_to_insert).execute()
-
-    # Narrative Teacher Comments
-    if profile.unstructured_data.narrative_teacher_comments:
-        comments_to_insert = [{"student_id": student_id, **c.model_dump()} for c in profile.unstructured_data.narrative_teacher_comments]
-        supabase_client.from('narrative_comments').insert(comments_to_insert).execute()
-
-    # Advisory/Counselor Notes
-    if profile.unstructured_data.advisory_counselor_notes:
-        counselor_notes_to_insert = [{"student_id": student_id, **n.model_dump()} for n in profile.unstructured_data.advisory_counselor_notes]
-        supabase_client.from('counselor_notes').insert(counselor_notes_to_insert).execute()
-
-    # Behavior/Social Emotional Notes
-    if profile.unstructured_data.behavior_social_emotional_notes:
-        behavior_notes_to_insert = [{"student_id": student_id, **n.model_dump()} for n in profile.unstructured_data.behavior_social_emotional_notes]
-        supabase_client.from('behavior_notes').insert(behavior_notes_to_insert).execute()
-
-    # Soft Skill Inferences
-    if profile.soft_skill_inferences:
-        soft_skills_to_insert = [{"student_id": student_id, **s.model_dump()} for s in profile.soft_skill_inferences]
-        supabase_client.from('soft_skills').insert(soft_skills_to_insert).execute()
+    for table, rows in _student_child_rows(profile, student_id).items():
+        if rows:
+            await execute_query(supabase_client.from_(table).insert(rows))
 
+    # Invalidate again so reports computed while the child rows were being written are dropped
+    report_cache.invalidate()
     return {"status": "success", "message": "Student profile created successfully", "student_id": str(student_id)}
 
+async def _insert_student_batch_multirow(batch: List[Dict[str, Any]], supabase_client: Client) -> List[str]:
+    # Fallback when write_student_profiles is not deployed: one insert per table instead of one
+    # transaction, so if a related insert fails the batch's students are deleted again before raising.
+    # content_hash is left out, as its column is added by the same schema.sql
+    student_rows = [{column: value for column, value in profile_rows["student"].items() if column != "content_hash"} for profile_rows in batch]
+    response = await execute_query(supabase_client.from_('students').insert(student_rows))
+    if not response.data or len(response.data) != len(batch):
+        raise HTTPException(status_code=500, detail="Failed to insert student records into 'students' table.")
+    # PostgREST returns inserted rows in the order they were sent
+    batch_ids = [row['id'] for row in response.data]
+
+    rows_by_table: Dict[str, List[Dict[str, Any]]] = {}
+    for profile_rows, student_id in zip(batch, batch_ids):
+        for table, rows in profile_rows["children"].items():
+            rows_by_table.setdefault(table, []).extend(dict(row, student_id=student_id) for row in rows)
+
+    results = await asyncio.gather(*(
+        execute_query(supabase_client.from_(table).insert(rows[chunk_start:chunk_start + INGEST_CHILD_CHUNK_SIZE]))
+        for table, rows in rows_by_table.items()
+        for chunk_start in range(0, len(rows), INGEST_CHILD_CHUNK_SIZE)
+    ), return_exceptions=True)
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures:
+        # Undo the batch (child rows cascade) so callers can retry it, e.g. in halves, without duplicates
+        try:
+            await execute_query(supabase_client.from_('students').delete().in_('id', batch_ids))
+        except Exception as e:
+            # Not a database error about the rows, so the batch is failed as a whole rather than retried
+            raise HTTPException(status_code=500, detail=f"Failed to insert related records and to remove the partially written students: {e}")
+        raise failures[0]
+    return batch_ids
+
+async def _insert_student_rows_batch(
+    profile_rows: List[Dict[str, Any]],
+    supabase_client: Client,
+    batch_size: int = INGEST_BATCH_SIZE
+) -> List[str]:
+    """
+    Write student profiles, given as _student_profile_rows entries, one round trip per batch.
+    An entry with an "id" rewrites that existing student; the others are inserted. Each batch is
+    written by the write_student_profiles SQL function in a single transaction, so a failing
+    batch leaves nothing behind. Returns the student ids in input order.
+    """
+    student_ids: List[str] = []
+    use_rpc = True
+    try:
+        for batch_start in range(0, len(profile_rows), batch_size):
+            batch = profile_rows[batch_start:batch_start + batch_size]
+            if use_rpc:
+                try:
+                    response = await execute_query(supabase_client.rpc("write_student_profiles", {"p_profiles": batch}))
+                    student_ids.extend(response.data)
+                    continue
+                except Exception as e:
+                    if not _rpc_missing(e):
+                        raise
+                    print("Warning: write_student_profiles RPC is not available, using multi-row inserts.")
+                    use_rpc = False
+            student_ids.extend(await _insert_student_batch_multirow(batch, supabase_client))
+    finally:
+        if student_ids:
+            report_cache.invalidate()
+    return student_ids
+
+async def _insert_student_profiles_batch(
+    profiles: List[StudentIngestionPayload],
+    supabase_client: Client,
+    batch_size: int = INGEST_BATCH_SIZE
+) -> List[str]:
+    """
+    Insert many student profiles into normalized tables, one round trip per batch
+    (see _insert_student_rows_batch). Returns the new student ids in input order.
+    """
+    return await _insert_student_rows_batch([_student_profile_rows(p) for p in profiles], supabase_client, batch_size)
+
+# --- Full profile assembly ---
+
+# Related tables read for a full profile, fetched alongside the 'students' row
+PROFILE_RELATED_TABLES = [
+    "courses",
+    "assessment_breakdowns",
+    "gpa_history",
+    "attendance",
+    "extracurricular_activities",
+    "iep_504_plans",
+    "college_milestones",
+    "narrative_comments",
+    "counselor_notes",
+    "behavior_notes",
+    "soft_skills",
+]
+
+# Maximum number of related-table queries in flight for a single profile read
+PROFILE_FETCH_CONCURRENCY = int(os.getenv("PROFILE_FETCH_CONCURRENCY", "6"))
+
+# PostgREST select embedding every related table in the 'students' row (one round trip)
+PROFILE_EMBEDDED_SELECT = "*, " + ", ".join(f"{table}(*)" for table in PROFILE_RELATED_TABLES)
+
+def _build_student_profile_response(
+    student_data: Dict[str, Any],
+    related: Dict[str, List[Dict[str, Any]]],
+    unavailable_sections: Optional[List[str]] = None
+) -> StudentProfileResponse:
+    """
+    Map a 'students' row and its related-table rows onto StudentProfileResponse.
+    Tables missing from `related` are treated as empty.
+    """
+    attendance_row = (related.get("attendance") or [None])[0]
+    iep_row = (related.get("iep_504_plans") or [None])[0]
+
+    student_profile_data = StudentProfileData(
+        student_info=StudentInfoCore(
+            full_name=student_data["full_name"],
+            grade_level=student_data["grade_level"],
+            academic_year=student_data["academic_year"],
+            status=student_data.get("status") or "None"
+        ),
+        courses=[Course(**c) for c in related.get("courses") or []],
+        assessment_breakdown_by_type=[AssessmentBreakdown(**a) for a in related.get("assessment_breakdowns") or []],
+        gpa_history=[GPAHistoryEntry(**g) for g in related.get("gpa_history") or []],
+        attendance=AttendanceData(
+            absences=Absences(excused=attendance_row.get("excused", 0), unexcused=attendance_row.get("unexcused", 0)),
+            tardies=Tardies(count=attendance_row.get("tardy_count", 0), dates=attendance_row.get("tardy_dates") or [])
+        ) if attendance_row else None,
+        extracurricular_activities=[ExtracurricularActivity(**e) for e in related.get("extracurricular_activities") or []],
+        iep_504_plan_information=IEP504Plan(
+            has_plan=iep_row.get("has_plan", False),
+            plan_type=iep_row.get("plan_type"),
+            accommodations=iep_row.get("accommodations") or [],
+            last_updated_date=iep_row.get("last_updated")
+        ) if iep_row else None,
+        college_counseling_milestones=[CollegeMilestone(**c) for c in related.get("college_milestones") or []]
+    )
+
+    unstructured_data = UnstructuredData(
+        narrative_teacher_comments=[NarrativeComment(**n) for n in related.get("narrative_comments") or []],
+        advisory_counselor_notes=[StaffNote(**s) for s in related.get("counselor_notes") or []],
+        behavior_social_emotional_notes=[StaffNote(**b) for b in related.get("behavior_notes") or []]
+    )
+
+    return StudentProfileResponse(
+        student_profile=student_profile_data,
+        unstructured_data=unstructured_data,
+        soft_skill_inferences=[SoftSkillInference(**s) for s in related.get("soft_skills") or []],
+        unavailable_sections=unavailable_sections or [],
+        updated_at=student_data.get("updated_at")
+    )
+
+async def _load_student_profile_fanout(student_id: str, supabase_client: Client) -> Optional[StudentProfileResponse]:
+    """
+    Fetch the student row and all related tables concurrently and assemble the full profile.
+    Returns None if the student does not exist. A failing related-table query does not fail
+    the whole read; the section is returned empty and listed in `unavailable_sections`.
+    """
+    semaphore = asyncio.Semaphore(PROFILE_FETCH_CONCURRENCY)
+
+    async def fetch_related(table: str):
+        async with semaphore:
+            return await execute_query(supabase_client.from_(table).select("*").eq("student_id", student_id))
+
+    student_task = execute_query(supabase_client.from_("students").select("*").eq("id", student_id).limit(1))
+    results = await asyncio.gather(
+        student_task,
+        *(fetch_related(table) for table in PROFILE_RELATED_TABLES),
+        return_exceptions=True
+    )
+
+    student_response, related_responses = results[0], results[1:]
+    if isinstance(student_response, BaseException):
+        raise student_response
+    if not student_response.data:
+        return None
+
+    related: Dict[str, List[Dict[str, Any]]] = {}
+    unavailable_sections: List[str] = []
+    for table, response in zip(PROFILE_RELATED_TABLES, related_responses):
+        if isinstance(response, BaseException):
+            print(f"Warning: Could not load '{table}' for student {student_id}: {response}")
+            unavailable_sections.append(table)
+            continue
+        related[table] = response.data or []
+
+    return _build_student_profile_response(student_response.data[0], related, unavailable_sections)
+
+async def _load_student_profile_embedded(student_id: str, supabase_client: Client) -> Optional[StudentProfileResponse]:
+    """
+    Fetch the student row with all related tables embedded as PostgREST resources in a single request.
+    Returns None if the student does not exist.
+    """
+    response = await execute_query(
+        supabase_client.from_("students").select(PROFILE_EMBEDDED_SELECT).eq("id", student_id).limit(1)
+    )
+    if not response.data:
+        return None
+
+    return _profile_from_embedded_row(response.data[0])
+
+def _profile_from_embedded_row(student_data: Dict[str, Any]) -> StudentProfileResponse:
+    """
+    Build the profile from a students row carrying its related tables as embedded lists.
+    """
+    related: Dict[str, List[Dict[str, Any]]] = {}
+    for table in PROFILE_RELATED_TABLES:
+        embedded = student_data.pop(table, None)
+        # One-to-one relationships (unique student_id) embed as an object instead of a list
+        related[table] = [embedded] if isinstance(embedded, dict) else (embedded or [])
+
+    return _build_student_profile_response(student_data, related)
+
+async def _load_student_profile(student_id: str, supabase_client: Client) -> Optional[StudentProfileResponse]:
+    """
+    Load a full student profile in one embedded-resource request. Falls back to the per-table
+    concurrent fetch if PostgREST cannot embed a relationship (e.g. a missing foreign key).
+    """
+    try:
+        return await _load_student_profile_embedded(student_id, supabase_client)
+    except Exception as e:
+        print(f"Warning: Embedded profile query failed for student {student_id}, falling back to per-table fetch: {e}")
+        return await _load_student_profile_fanout(student_id, supabase_client)
+
+def _has_504_plan(embedded_plans: Any) -> bool:
+    """
+    Derive has_504_plan from an embedded iep_504_plans resource, which PostgREST returns
+    as an object for a one-to-one relationship or a list otherwise.
+    """
+    if isinstance(embedded_plans, dict):
+        embedded_plans = [embedded_plans]
+    return any(plan.get("has_plan", False) for plan in embedded_plans or [])
+
+async def _probe_student_version(student_id: str, supabase_client: Client) -> Optional[Dict[str, Any]]:
+    """
+    Cheap revalidation query: fetch only the id and updated_at of a student row.
+    Child-table writes bump students.updated_at through the touch_student_updated_at trigger.
+    """
+    response = await execute_query(supabase_client.from_("students").select("id, updated_at").eq("id", student_id).limit(1))
+    return response.data[0] if response.data else None
+
+async def _compute_reports_trends_in_python(
+    supabase_client: Client,
+    grade_level: Optional[int],
+    min_gpa: Optional[float],
+    max_gpa: Optional[float]
+) -> Dict[str, Any]:
+    """
+    Fallback for get_reports_trends when the database function is unavailable:
+    pull students, GPA history and soft skills and aggregate them with reports_engine.
+    """
+    # Fetch students and their GPA history and soft skills
+    query = supabase_client.from_("students").select("id, full_name, grade_level, academic_year, status")
+    if grade_level is not None:
+        query = query.eq("grade_level", grade_level)
+    students_response = await execute_query(query)
+
+    if not students_response.data:
+        return {
+            "gpa_histogram": [],
+            "soft_skill_coverage": [],
+            "gpa_drops_students": []
+        }
+
+    students_data = students_response.data
+
+    # Fetch GPA history and soft skills for all fetched students
+    student_ids = [s["id"] for s in students_data]
+    gpa_history_all_students_res = await execute_query(supabase_client.from_("gpa_history").select("id, student_id, academic_year, term, gpa_value").in_("student_id", student_ids))
+    soft_skills_all_students_res = await execute_query(supabase_client.from_("soft_skills").select("student_id, skill_name").in_("student_id", student_ids))
+
+    # CPU-bound for large rosters, so keep it off the event loop
+    return await asyncio.to_thread(
+        compute_reports_trends,
+        students_data,
+        gpa_history_all_students_res.data,
+        soft_skills_all_students_res.data,
+        min_gpa=min_gpa,
+        max_gpa=max_gpa
+    )
+
+async def _compute_reports_trends(
+    supabase_client: Client,
+    grade_level: Optional[int],
+    min_gpa: Optional[float],
+    max_gpa: Optional[float]
+) -> Dict[str, Any]:
+    # Aggregate in the database so only the final histogram, coverage and drop list cross the wire
+    try:
+        rpc_response = await execute_query(supabase_client.rpc("get_reports_trends", {
+            "p_grade_level": grade_level,
+            "p_min_gpa": min_gpa,
+            "p_max_gpa": max_gpa
+        }))
+        return rpc_response.data
+    except Exception as e:
+        print(f"Warning: get_reports_trends RPC failed, aggregating in Python instead: {e}")
+    return await _compute_reports_trends_in_python(supabase_client, grade_level, min_gpa, max_gpa)
+
 # --- API Endpoints ---
 
 @router.post("/ingest", status_code=status.HTTP_201_CREATED)
@@ -303,6 +428,20 @@ async def ingest_student_data(
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+@router.post("/ingest/batch", status_code=status.HTTP_201_CREATED)
+async def ingest_student_data_batch(
+    payloads: List[StudentIngestionPayload],
+    supabase_client: Client = Depends(get_supabase_client),
+    user_role: str = Depends(get_current_admin_user) # Only admins can ingest full profiles
+):
+    try:
+        student_ids = await _insert_student_profiles_batch(payloads, supabase_client)
+        return {"status": "success", "message": f"Ingested {len(student_ids)} student profiles.", "student_ids": student_ids}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
 @router.post("/students", status_code=status.HTTP_201_CREATED)
 async def create_student_profile(
     student: StudentProfile,
@@ -314,7 +453,8 @@ async def create_student_profile(
     Requires admin authentication.
     """
     try:
-        response = supabase.table("students").insert(student.dict()).execute()
+        response = await execute_query(supabase.table("students").insert(student.dict()))
+        report_cache.invalidate()
         if response.data:
             return {"message": "Student profile created successfully", "data": response.data[0]}
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=response.error.message)
@@ -336,7 +476,7 @@ async def get_student_profile(
         if current_user.get("role") != "admin" and current_user.get("id") != student_id:
              raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view this profile")
 
-        response = supabase.table("students").select("*").eq("student_id", student_id).limit(1).execute()
+        response = await execute_query(supabase.table("students").select("*").eq("student_id", student_id).limit(1))
         if response.data:
             return response.data[0]
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
@@ -360,7 +500,9 @@ async def update_student_profile(
         if not update_data:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No fields to update provided.")
 
-        response = supabase.table("students").update(update_data).eq("student_id", student_id).execute()
+        response = await execute_query(supabase.table("students").update(update_data).eq("student_id", student_id))
+        profile_cache.invalidate(*(row.get("id") for row in response.data or []))
+        report_cache.invalidate()
         if response.data:
             return {"message": "Student profile updated successfully", "data": response.data[0]}
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found or no changes made")
@@ -378,7 +520,9 @@ async def delete_student_profile(
     Requires admin authentication.
     """
     try:
-        response = supabase.table("students").delete().eq("student_id", student_id).execute()
+        response = await execute_query(supabase.table("students").delete().eq("student_id", student_id))
+        profile_cache.invalidate(*(row.get("id") for row in response.data or []))
+        report_cache.invalidate()
         if response.data:
             return {"message": "Student profile deleted successfully"}
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found")
@@ -387,17 +531,51 @@ async def delete_student_profile(
 
 @router.get("/students")
 async def get_all_students(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[str] = Query(None, description=f"Cursor from the previous page's {NEXT_CURSOR_HEADER} header"),
+    sort: str = Query("id", description="Column to sort by"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    grade_level: Optional[int] = None,
+    status_filter: Optional[str] = Query(None, alias="status"),
+    academic_year: Optional[str] = None,
+    major: Optional[str] = None,
+    advisor: Optional[str] = None,
+    has_504_plan: Optional[bool] = None,
+    email: Optional[str] = Query(None, description="Exact email lookup"),
     supabase: Client = Depends(get_supabase_client),
     current_user: dict = Depends(get_current_admin_user) # Only admins can view all students
 ):
     """
-    Retrieve all student profiles.
+    Retrieve student profiles one keyset page at a time, filtered and sorted in the database.
+    The cursor for the next page is returned in the X-Next-Cursor response header.
     Requires admin authentication.
     """
     try:
-        response = supabase.table("students").select("*").execute()
-        if response.data:
-            return response.data
+        query = supabase.table("students").select(student_select_columns("*", has_504_plan))
+        query = apply_student_filters(
+            query,
+            grade_level=grade_level,
+            status=status_filter,
+            academic_year=academic_year,
+            major=major,
+            advisor=advisor,
+            has_504_plan=has_504_plan,
+            email=email,
+        )
+        query = apply_keyset_page(query, sort=sort, descending=order == "desc", cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    try:
+        result = await execute_query(query)
+        if result.data:
+            next_cursor = next_page_cursor(result.data, sort, limit)
+            if next_cursor:
+                response.headers[NEXT_CURSOR_HEADER] = next_cursor
+            for student in result.data:
+                student.pop("iep_504_plans", None)
+            return result.data
         return []
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -411,24 +589,21 @@ async def get_all_students_summary(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized to view student list.")
 
     try:
-        response = supabase_client.from("students").select(
-            "id, full_name, grade_level, academic_year, status"
-        ).execute()
+        # Embed the plan flag so the whole list costs one round trip instead of one per student
+        response = await execute_query(supabase_client.from_("students").select(
+            "id, full_name, grade_level, academic_year, status, iep_504_plans(has_plan)"
+        ))
 
         if response.data:
             students_summary = []
             for student in response.data:
-                # To get has_504_plan, we need to query the iep_504_plans table
-                iep_response = supabase_client.from("iep_504_plans").select("has_plan").eq("student_id", student["id"]).single().execute()
-                has_504_plan = iep_response.data.get("has_plan", False) if iep_response.data else False
-
                 students_summary.append(StudentSummary(
                     id=student["id"],
                     full_name=student["full_name"],
                     grade_level=student["grade_level"],
                     academic_year=student["academic_year"],
                     status=student["status"],
-                    has_504_plan=has_504_plan
+                    has_504_plan=_has_504_plan(student.get("iep_504_plans"))
                 ))
             return students_summary
         else:
@@ -439,6 +614,8 @@ async def get_all_students_summary(
 @router.get("/{student_id}", response_model=StudentProfileResponse)
 async def get_student_profile_full(
     student_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     supabase_client: Client = Depends(get_supabase_client),
     user_role: str = Depends(get_current_user_role)
 ):
@@ -446,63 +623,57 @@ async def get_student_profile_full(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized to view student profiles.")
 
     try:
-        # Fetch main student info
-        student_response = supabase_client.from("students").select("*").eq("id", student_id).single().execute()
-        if not student_response.data:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found.")
-        student_data = student_response.data
-
-        # Fetch all related data
-        courses_res = supabase_client.from("courses").select("*").eq("student_id", student_id).execute()
-        assessments_res = supabase_client.from("assessment_breakdowns").select("*").eq("student_id", student_id).execute()
-        gpa_history_res = supabase_client.from("gpa_history").select("*").eq("student_id", student_id).execute()
-        attendance_res = supabase_client.from("attendance").select("*").eq("student_id", student_id).execute()
-        extracurricular_res = supabase_client.from("extracurricular_activities").select("*").eq("student_id", student_id).execute()
-        iep_res = supabase_client.from("iep_504_plans").select("*").eq("student_id", student_id).single().execute()
-        college_milestones_res = supabase_client.from("college_milestones").select("*").eq("student_id", student_id).execute()
-        narrative_comments_res = supabase_client.from("narrative_comments").select("*").eq("student_id", student_id).execute()
-        counselor_notes_res = supabase_client.from("counselor_notes").select("*").eq("student_id", student_id).execute()
-        behavior_notes_res = supabase_client.from("behavior_notes").select("*").eq("student_id", student_id).execute()
-        soft_skills_res = supabase_client.from("soft_skills").select("*").eq("student_id", student_id).execute()
-
-        # Reconstruct StudentProfileData
-        student_profile_data = StudentProfileData(
-            student_info=StudentInfoCore(
-                full_name=student_data["full_name"],
-                grade_level=student_data["grade_level"],
-                academic_year=student_data["academic_year"],
-                status=student_data.get("status", "None")
-            ),
-            courses=[Course(**c) for c in courses_res.data] if courses_res.data else [],
-            assessment_breakdown_by_type=[AssessmentBreakdown(**a) for a in assessments_res.data] if assessments_res.data else [],
-            gpa_history=[GPAHistoryEntry(**g) for g in gpa_history_res.data] if gpa_history_res.data else [],
-            attendance=AttendanceData(
-                absences=Absences(excused=attendance_res.data.get("excused", 0), unexcused=attendance_res.data.get("unexcused", 0)) if attendance_res.data else Absences(excused=0, unexcused=0),
-                tardies=Tardies(count=attendance_res.data.get("tardy_count", 0), dates=attendance_res.data.get("tardy_dates", [])) if attendance_res.data else Tardies(count=0, dates=[])
-            ) if attendance_res.data else None,
-            extracurricular_activities=[ExtracurricularActivity(**e) for e in extracurricular_res.data] if extracurricular_res.data else [],
-            iep_504_plan_information=IEP504Plan(**iep_res.data) if iep_res.data else None,
-            college_counseling_milestones=[CollegeMilestone(**c) for c in college_milestones_res.data] if college_milestones_res.data else []
-        )
-
-        # Reconstruct UnstructuredData
-        unstructured_data = UnstructuredData(
-            narrative_teacher_comments=[NarrativeComment(**n) for n in narrative_comments_res.data] if narrative_comments_res.data else [],
-            advisory_counselor_notes=[StaffNote(**s) for s in counselor_notes_res.data] if counselor_notes_res.data else [],
-            behavior_social_emotional_notes=[StaffNote(**b) for b in behavior_notes_res.data] if behavior_notes_res.data else []
-        )
-
-        # Soft Skill Inferences
-        soft_skill_inferences = [SoftSkillInference(**s) for s in soft_skills_res.data] if soft_skills_res.data else []
-
-        return StudentProfileResponse(
-            student_profile=student_profile_data,
-            unstructured_data=unstructured_data,
-            soft_skill_inferences=soft_skill_inferences
-        )
+        current_version = None
+        if if_none_match:
+            # Revalidate against the version probe instead of rebuilding the profile
+            version_row = await _probe_student_version(student_id, supabase_client)
+            if version_row is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found.")
+            current_version = version_row.get("updated_at")
+            if current_version:
+                etag = make_etag(student_id, current_version, "profile")
+                if etag_matches(if_none_match, etag):
+                    return not_modified(etag, current_version)
+
+        profile = profile_cache.get(student_id)
+        if profile is None or (current_version and profile.updated_at != current_version):
+            generation = profile_cache.generation()
+            profile = await _load_student_profile(student_id, supabase_client)
+            if profile is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found.")
+            # A degraded profile (sections that failed to load) is neither cached nor given validators,
+            # so the next request retries the missing sections instead of revalidating to a 304
+            if not profile.unavailable_sections:
+                profile_cache.set(student_id, profile, generation)
+
+        if profile.updated_at and not profile.unavailable_sections:
+            response.headers.update(validator_headers(make_etag(student_id, profile.updated_at, "profile"), profile.updated_at))
+        return profile
+    except HTTPException as e:
+        raise e
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
+async def _update_student_profile_tables(
+    supabase_client: Client,
+    student_id: str,
+    student_fields: Dict[str, Any],
+    child_rows: Dict[str, List[Dict[str, Any]]]
+) -> None:
+    # Fallback when write_student_profile is not deployed: one statement per table, not atomic
+    if student_fields:
+        await execute_query(supabase_client.from_("students").update(student_fields).eq("id", student_id))
+
+    for table, rows in child_rows.items():
+        if table in ("attendance", "iep_504_plans"):
+            # One row per student, so upsert it in place
+            await execute_query(supabase_client.from_(table).upsert(rows[0], on_conflict="student_id"))
+            continue
+        # Replace existing lists
+        await execute_query(supabase_client.from_(table).delete().eq("student_id", student_id))
+        if rows:
+            await execute_query(supabase_client.from_(table).insert(rows))
+
 @router.patch("/{student_id}", status_code=status.HTTP_200_OK)
 async def update_student_profile_full(
     student_id: str,
@@ -515,91 +686,46 @@ async def update_student_profile_full(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized to update student profile.")
 
     try:
-        # Update main student info fields in 'students' table
         student_update_payload = update_data.model_dump(include={"full_name", "grade_level", "academic_year", "status"}, exclude_unset=True)
-        if student_update_payload:
-            supabase_client.from("students").update(student_update_payload).eq("id", student_id).execute()
-
-        # Handle updates for related tables (replace existing lists for simplicity)
-        if update_data.courses is not None:
-            supabase_client.from("courses").delete().eq("student_id", student_id).execute()
-            if update_data.courses:
-                courses_to_insert = [{"student_id": student_id, **c.model_dump()} for c in update_data.courses]
-                supabase_client.from("courses").insert(courses_to_insert).execute()
-
-        if update_data.assessment_breakdown_by_type is not None:
-            supabase_client.from("assessment_breakdowns").delete().eq("student_id", student_id).execute()
-            if update_data.assessment_breakdown_by_type:
-                assessments_to_insert = [{"student_id": student_id, **a.model_dump()} for a in update_data.assessment_breakdown_by_type]
-                supabase_client.from("assessment_breakdowns").insert(assessments_to_insert).execute()
-
-        if update_data.gpa_history is not None:
-            supabase_client.from("gpa_history").delete().eq("student_id", student_id).execute()
-            if update_data.gpa_history:
-                gpa_history_to_insert = [{"student_id": student_id, **g.model_dump()} for g in update_data.gpa_history]
-                supabase_client.from("gpa_history").insert(gpa_history_to_insert).execute()
-
-        if update_data.attendance is not None:
-            # For single object, upsert or update
-            attendance_data = update_data.attendance.model_dump()
-            supabase_client.from("attendance").upsert({
-                "student_id": student_id,
-                "excused": attendance_data.get("absences", {}).get("excused", 0),
-                "unexcused": attendance_data.get("absences", {}).get("unexcused", 0),
-                "tardy_count": attendance_data.get("tardies", {}).get("count", 0),
-                "tardy_dates": attendance_data.get("tardies", {}).get("dates", [])
-            }, on_conflict="student_id").execute()
-
-        if update_data.extracurricular_activities is not None:
-            supabase_client.from("extracurricular_activities").delete().eq("student_id", student_id).execute()
-            if update_data.extracurricular_activities:
-                activities_to_insert = [{"student_id": student_id, **a.model_dump()} for a in update_data.extracurricular_activities]
-                supabase_client.from("extracurricular_activities").insert(activities_to_insert).execute()
-
-        if update_data.iep_504_plan_information is not None:
-            iep_data = update_data.iep_504_plan_information.model_dump()
-            supabase_client.from("iep_504_plans").upsert({
-                "student_id": student_id,
-                "has_plan": iep_data.get("has_plan", False),
-                "plan_type": iep_data.get("plan_type"),
-                "accommodations": iep_data.get("accommodations", []),
-                "last_updated": iep_data.get("last_updated_date")
-            }, on_conflict="student_id").execute()
-
-        if update_data.college_counseling_milestones is not None:
-            supabase_client.from("college_milestones").delete().eq("student_id", student_id).execute()
-            if update_data.college_counseling_milestones:
-                milestones_to_insert = [{"student_id": student_id, **m.model_dump()} for m in update_data.college_counseling_milestones]
-                supabase_client.from("college_milestones").insert(milestones_to_insert).execute()
-
-        if update_data.narrative_teacher_comments is not None:
-            supabase_client.from("narrative_comments").delete().eq("student_id", student_id).execute()
-            if update_data.narrative_teacher_comments:
-                comments_to_insert = [{"student_id": student_id, **c.model_dump()} for c in update_data.narrative_teacher_comments]
-                supabase_client.from("narrative_comments").insert(comments_to_insert).execute()
-
-        if update_data.advisory_counselor_notes is not None:
-            supabase_client.from("counselor_notes").delete().eq("student_id", student_id).execute()
-            if update_data.advisory_counselor_notes:
-                counselor_notes_to_insert = [{"student_id": student_id, **n.model_dump()} for n in update_data.advisory_counselor_notes]
-                supabase_client.from("counselor_notes").insert(counselor_notes_to_insert).execute()
-
-        if update_data.behavior_social_emotional_notes is not None:
-            supabase_client.from("behavior_notes").delete().eq("student_id", student_id).execute()
-            if update_data.behavior_social_emotional_notes:
-                behavior_notes_to_insert = [{"student_id": student_id, **n.model_dump()} for n in update_data.behavior_social_emotional_notes]
-                supabase_client.from("behavior_notes").insert(behavior_notes_to_insert).execute()
-
-        if update_data.soft_skill_inferences is not None:
-            supabase_client.from("soft_skills").delete().eq("student_id", student_id).execute()
-            if update_data.soft_skill_inferences:
-                soft_skills_to_insert = [{"student_id": student_id, **s.model_dump()} for s in update_data.soft_skill_inferences]
-                supabase_client.from("soft_skills").insert(soft_skills_to_insert).execute()
-
-        # Return the updated profile
-        return await get_student_profile_full(student_id, supabase_client, user_role)
+        child_rows = {
+            table: _section_rows(section, getattr(update_data, section), student_id)
+            for section, table in PROFILE_SECTION_TABLES.items()
+            if getattr(update_data, section) is not None
+        }
 
+        updated_row = None
+        try:
+            # Student fields and diffed sections are written in one transaction, which also returns the new profile
+            updated_row = await _update_student_profile_diff(supabase_client, student_id, student_update_payload, child_rows)
+        except Exception as e:
+            if getattr(e, "code", None) == "P0002":
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found.")
+            if not _rpc_missing(e):
+                raise
+            print("Warning: update_student_profile RPC is not available, updating profile table by table.")
+            await _update_student_profile_tables(supabase_client, student_id, student_update_payload, child_rows)
+
+        profile_cache.invalidate(student_id)
+        report_cache.invalidate()
+        generation = profile_cache.generation()
+        if updated_row:
+            profile = _profile_from_embedded_row(updated_row)
+        else:
+            profile = await _load_student_profile(student_id, supabase_client)
+        if profile is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found.")
+        if not profile.unavailable_sections:
+            profile_cache.set(student_id, profile, generation)
+        return profile
+
+    except HTTPException as e:
+        profile_cache.invalidate(student_id)
+        report_cache.invalidate()
+        raise e
     except Exception as e:
+        # A failed write may have changed some tables already
+        profile_cache.invalidate(student_id)
+        report_cache.invalidate()
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.post("/{student_id}/comments", status_code=status.HTTP_201_CREATED)
@@ -614,15 +740,17 @@ async def add_narrative_comment(
 
     try:
         # Verify student exists
-        student_check = supabase_client.from("students").select("id").eq("id", student_id).single().execute()
+        student_check = await execute_query(supabase_client.from_("students").select("id").eq("id", student_id).single())
         if not student_check.data:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Student not found.")
 
         new_comment_data = comment.model_dump()
-        insert_response = supabase_client.from("narrative_comments").insert({
+        insert_response = await execute_query(supabase_client.from_("narrative_comments").insert({
             "student_id": student_id,
             **new_comment_data
-        }).execute()
+        }))
+
+        profile_cache.invalidate(student_id)
 
         if insert_response.data:
             return {"message": "Comment added successfully."}
@@ -644,133 +772,24 @@ async def get_reports_trends(
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Unauthorized to view reports.")
 
     try:
-        # Fetch students and their GPA history and soft skills
-        query = supabase_client.from("students").select("id, full_name, grade_level, academic_year, status")
-        if grade_level:
-            query = query.eq("grade_level", grade_level)
-        students_response = query.execute()
-
-        if not students_response.data:
-            return {
-                "gpa_histogram": [],
-                "soft_skill_coverage": [],
-                "gpa_drops_students": []
-            }
-
-        students_data = students_response.data
-        
-        # Fetch GPA history and soft skills for all fetched students
-        student_ids = [s["id"] for s in students_data]
-        gpa_history_all_students_res = supabase_client.from("gpa_history").select("*").in_("student_id", student_ids).execute()
-        soft_skills_all_students_res = supabase_client.from("soft_skills").select("*").in_("student_id", student_ids).execute()
-
-        gpa_map = {}
-        for gpa_entry in gpa_history_all_students_res.data:
-            student_id = gpa_entry["student_id"]
-            if student_id not in gpa_map:
-                gpa_map[student_id] = []
-            gpa_map[student_id].append(gpa_entry)
-
-        soft_skill_map = {}
-        for skill_entry in soft_skills_all_students_res.data:
-            student_id = skill_entry["student_id"]
-            if student_id not in soft_skill_map:
-                soft_skill_map[student_id] = []
-            soft_skill_map[student_id].append(skill_entry)
-
-        # Combine data for processing
-        processed_students = []
-        for student in students_data:
-            student["gpa_history"] = gpa_map.get(student["id"], [])
-            student["soft_skill_inferences"] = soft_skill_map.get(student["id"], [])
-            processed_students.append(student)
-
-        # Filter by GPA range if provided
-        if min_gpa is not None or max_gpa is not None:
-            filtered_students_by_gpa = []
-            for student in processed_students:
-                latest_gpa = None
-                if student.get("gpa_history"):
-                    sorted_gpas = sorted(student["gpa_history"], key=lambda x: (x.get("academic_year", ""), x.get("term", "")), reverse=True)
-                    if sorted_gpas:
-                        latest_gpa = sorted_gpas[0].get("gpa_value")
-
-                if latest_gpa is not None:
-                    if (min_gpa is None or latest_gpa >= min_gpa) and \
-                       (max_gpa is None or latest_gpa <= max_gpa):
-                        filtered_students_by_gpa.append(student)
-            processed_students = filtered_students_by_gpa
-
-        # GPA Histogram Calculation
-        gpa_ranges = {
-            "0.0-1.0": 0, "1.1-2.0": 0, "2.1-3.0": 0, "3.1-4.0": 0
-        }
-        for student in processed_students:
-            if student.get("gpa_history"):
-                sorted_gpas = sorted(student["gpa_history"], key=lambda x: (x.get("academic_year", ""), x.get("term", "")), reverse=True)
-                if sorted_gpas:
-                    latest_gpa = sorted_gpas[0].get("gpa_value")
-                    if latest_gpa is not None:
-                        if 0.0 <= latest_gpa <= 1.0:
-                            gpa_ranges["0.0-1.0"] += 1
-                        elif 1.1 <= latest_gpa <= 2.0:
-                            gpa_ranges["1.1-2.0"] += 1
-                        elif 2.1 <= latest_gpa <= 3.0:
-                            gpa_ranges["2.1-3.0"] += 1
-                        elif 3.1 <= latest_gpa <= 4.0:
-                            gpa_ranges["3.1-4.0"] += 1
-        gpa_histogram = [{"range": r, "count": c} for r, c in gpa_ranges.items()]
-
-        # Soft Skill Coverage Calculation
-        soft_skill_counts = {}
-        for student in processed_students:
-            for skill in student.get("soft_skill_inferences", []):
-                skill_name = skill.get("skill_name")
-                if skill_name:
-                    soft_skill_counts[skill_name] = soft_skill_counts.get(skill_name, 0) + 1
-        soft_skill_coverage = [{"skill_name": s, "count": c} for s, c in soft_skill_counts.items()]
-
-        # GPA Drops Calculation
-        gpa_drops_students = []
-        for student in processed_students:
-            gpa_history = sorted(student.get("gpa_history", []), key=lambda x: (x.get("academic_year", ""), x.get("term", "")))
-            if len(gpa_history) >= 2:
-                term2_gpa_entry = gpa_history[-1]
-                term1_gpa_entry = gpa_history[-2]
-
-                gpa1 = term1_gpa_entry.get("gpa_value")
-                gpa2 = term2_gpa_entry.get("gpa_value")
-
-                if gpa1 is not None and gpa2 is not None:
-                    drop_amount = round(gpa1 - gpa2, 2)
-                    if drop_amount > 0.3: # Significant drop threshold
-                        gpa_drops_students.append({
-                            "student_id": student["id"],
-                            "full_name": student["full_name"],
-                            "grade_level": student["grade_level"],
-                            "academic_year": student["academic_year"],
-                            "status": student["status"],
-                            "term1": f"{term1_gpa_entry.get('academic_year', 'N/A')} {term1_gpa_entry.get('term', 'N/A')}",
-                            "gpa1": gpa1,
-                            "term2": f"{term2_gpa_entry.get('academic_year', 'N/A')} {term2_gpa_entry.get('term', 'N/A')}",
-                            "gpa2": gpa2,
-                            "drop_amount": drop_amount
-                        })
-
-        return {
-            "gpa_histogram": gpa_histogram,
-            "soft_skill_coverage": soft_skill_coverage,
-            "gpa_drops_students": gpa_drops_students
-        }
-
+        return await report_cache.get_or_compute(
+            report_cache.trends_key(grade_level, min_gpa, max_gpa),
+            lambda: _compute_reports_trends(supabase_client, grade_level, min_gpa, max_gpa)
+        )
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
 @router.delete("/{student_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_student(student_id: str, user_role: str = Depends(get_current_admin_user)):
+async def delete_student(
+    student_id: str,
+    supabase_client: Client = Depends(get_supabase_client),
+    user_role: str = Depends(get_current_admin_user)
+):
     try:
         # Deleting from 'students' table with ON DELETE CASCADE will delete from related tables
-        response = supabase_client.from("students").delete().eq("id", student_id).execute()
+        response = await execute_query(supabase_client.from_("students").delete().eq("id", student_id))
+        profile_cache.invalidate(student_id)
+        report_cache.invalidate()
         if response.data:
             return {"message": f"Student {student_id} deleted successfully."}
         else:
@@ -787,33 +806,37 @@ async def upload_students_csv(
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only CSV files are allowed.")
 
+    uploaded_count = 0
     try:
-        df = pd.read_csv(file.file)
-        
-        # Convert DataFrame to a list of dictionaries for Supabase insertion
-        # Ensure column names match your Supabase table exactly
-        students_data = df.to_dict(orient="records")
-
-        # Basic validation (can be expanded)
-        for student in students_data:
-            # Convert date strings to date objects if necessary, or ensure format matches DB
-            if 'date_of_birth' in student and isinstance(student['date_of_birth'], str):
-                student['date_of_birth'] = date.fromisoformat(student['date_of_birth'])
-            if 'enrollment_date' in student and isinstance(student['enrollment_date'], str):
-                student['enrollment_date'] = date.fromisoformat(student['enrollment_date'])
-            # Ensure GPA is float
-            if 'gpa' in student:
-                student['gpa'] = float(student['gpa'])
-            if 'scholarship_amount' in student:
-                student['scholarship_amount'] = float(student['scholarship_amount'])
-
-        # Insert data into Supabase
-        response = supabase.table("students").insert(students_data).execute()
-
-        if response.data:
-            return {"message": f"Successfully uploaded {len(response.data)} student records."}
-        elif response.error:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=response.error.message)
+        # Each chunk is converted and inserted before the next one is read
+        async for chunk in iter_csv_chunks(file.file):
+            # Ensure column names match your Supabase table exactly
+            students_data = chunk.to_dict(orient="records")
+
+            # Basic validation (can be expanded)
+            for student in students_data:
+                # Convert date strings to date objects if necessary, or ensure format matches DB
+                if 'date_of_birth' in student and isinstance(student['date_of_birth'], str):
+                    student['date_of_birth'] = date.fromisoformat(student['date_of_birth'])
+                if 'enrollment_date' in student and isinstance(student['enrollment_date'], str):
+                    student['enrollment_date'] = date.fromisoformat(student['enrollment_date'])
+                # Ensure GPA is float
+                if 'gpa' in student:
+                    student['gpa'] = float(student['gpa'])
+                if 'scholarship_amount' in student:
+                    student['scholarship_amount'] = float(student['scholarship_amount'])
+
+            response = await execute_query(supabase.table("students").insert(students_data))
+            report_cache.invalidate()
+            if response.data:
+                uploaded_count += len(response.data)
+            elif response.error:
+                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=response.error.message)
+
+        return {"message": f"Successfully uploaded {uploaded_count} student records."}
 
     except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to process CSV: {e}")
+        detail = f"Failed to process CSV: {getattr(e, 'detail', None) or e}"
+        if uploaded_count:
+            detail += f" ({uploaded_count} records from earlier chunks were already uploaded)"
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=detail)
@@ -0,0 +1,333 @@
+import hashlib
+import json
+from datetime import date
+from typing import Any, Dict, List, Optional
+from pydantic import AfterValidator, BaseModel, Field
+from typing_extensions import Annotated
+
+# Student profile models and their conversion to table rows. Free of I/O and import-time side
+# effects: the upload validation worker processes import this module and nothing else of the app.
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """
+    Canonical form of a student email: trimmed and lowercased, with blanks as None. Every
+    write stores this form (schema.sql enforces it too), so ?email= lookups match exactly.
+    """
+    if email is None:
+        return None
+    return email.strip().lower() or None
+
+# Email field stored in canonical form (see normalize_email)
+NormalizedEmail = Annotated[str, AfterValidator(normalize_email)]
+
+# --- Pydantic Models for Request Body Validation (kept consistent with logical structure) ---
+
+class StudentInfoCore(BaseModel):
+    full_name: str
+    grade_level: int
+    academic_year: str
+    status: str = "None"
+    email: Optional[NormalizedEmail] = None # Natural key: re-uploads of the same student update it instead of adding a duplicate
+
+class Course(BaseModel):
+    course_id: str
+    student_id: str
+    course_name: str
+    credits: float
+    grade: str
+    semester: str
+    year: int
+
+class AssessmentBreakdown(BaseModel):
+    type: str
+    performance_metric: float
+    description: Optional[str] = None
+
+class GPAHistoryEntry(BaseModel):
+    academic_year: str
+    term: str
+    gpa_value: float
+
+class Absences(BaseModel):
+    excused: int
+    unexcused: int
+
+class Tardies(BaseModel):
+    count: int
+    dates: List[str]
+
+class AttendanceData(BaseModel):
+    absences: Optional[Absences] = None
+    tardies: Optional[Tardies] = None
+
+class ExtracurricularActivity(BaseModel):
+    activity_name: str
+    role_title: Optional[str] = None
+    start_date: str # Use string for date for simplicity with Pydantic and DB
+    end_date: Optional[str] = None
+    is_ongoing: bool = False
+    is_leadership: bool = False
+
+class IEP504Plan(BaseModel):
+    has_plan: bool
+    plan_type: Optional[str] = None
+    accommodations: Optional[List[str]] = None
+    last_updated_date: Optional[str] = None
+
+class CollegeMilestone(BaseModel):
+    milestone_name: str
+    status: str
+    date: str
+
+class NarrativeComment(BaseModel):
+    subject: str
+    teacher: str
+    term: str
+    comment_text: str
+
+class StaffNote(BaseModel):
+    staff_name: str
+    role: Optional[str] = None
+    date: str
+    note_text: str
+
+class SoftSkillInference(BaseModel):
+    skill_name: str
+    source_phrase: str
+    explanation: str
+    confidence_level: str
+
+class Attendance(BaseModel):
+    attendance_id: str
+    student_id: str
+    date: str
+    status: str # e.g., 'Present', 'Absent', 'Tardy'
+
+class FinancialAid(BaseModel):
+    financial_aid_id: str
+    student_id: str
+    aid_type: str
+    amount: float
+    date_awarded: str
+
+# Main Structured Data Section of the Student Profile
+class StudentProfileData(BaseModel):
+    student_info: StudentInfoCore
+    courses: List[Course] = Field(default_factory=list)
+    assessment_breakdown_by_type: List[AssessmentBreakdown] = Field(default_factory=list)
+    gpa_history: List[GPAHistoryEntry] = Field(default_factory=list)
+    attendance: Optional[AttendanceData] = None
+    extracurricular_activities: List[ExtracurricularActivity] = Field(default_factory=list)
+    iep_504_plan_information: Optional[IEP504Plan] = None
+    college_counseling_milestones: List[CollegeMilestone] = Field(default_factory=list)
+
+# Unstructured Data Section of the Student Profile
+class UnstructuredData(BaseModel):
+    narrative_teacher_comments: List[NarrativeComment] = Field(default_factory=list)
+    advisory_counselor_notes: List[StaffNote] = Field(default_factory=list)
+    behavior_social_emotional_notes: List[StaffNote] = Field(default_factory=list)
+
+# Overall Student Profile Input Payload
+class StudentIngestionPayload(BaseModel):
+    student_profile: StudentProfileData
+    unstructured_data: UnstructuredData = Field(default_factory=lambda: UnstructuredData())
+    soft_skill_inferences: List[SoftSkillInference] = Field(default_factory=list)
+
+# Student Summary Model (for /students GET)
+class StudentSummary(BaseModel):
+    id: str
+    full_name: str
+    grade_level: int
+    academic_year: str
+    status: str
+    has_504_plan: bool = False # Derived from iep_504_plan_information
+
+# Student Profile Response Model (for /students/{id} GET)
+class StudentProfileResponse(BaseModel):
+    student_profile: StudentProfileData
+    unstructured_data: UnstructuredData
+    soft_skill_inferences: List[SoftSkillInference]
+    unavailable_sections: List[str] = Field(default_factory=list) # Related tables that failed to load
+    updated_at: Optional[str] = Field(None, exclude=True) # students.updated_at the profile was built from (ETag version)
+
+# Student Update Payload (for /students/{id} PATCH)
+class StudentUpdatePayload(BaseModel):
+    full_name: Optional[str] = None
+    grade_level: Optional[int] = None
+    academic_year: Optional[str] = None
+    status: Optional[str] = None
+    courses: Optional[List[Course]] = None
+    assessment_breakdown_by_type: Optional[List[AssessmentBreakdown]] = None
+    gpa_history: Optional[List[GPAHistoryEntry]] = None
+    attendance: Optional[AttendanceData] = None
+    extracurricular_activities: Optional[List[ExtracurricularActivity]] = None
+    iep_504_plan_information: Optional[IEP504Plan] = None
+    college_counseling_milestones: Optional[List[CollegeMilestone]] = None
+    narrative_teacher_comments: Optional[List[NarrativeComment]] = None
+    advisory_counselor_notes: Optional[List[StaffNote]] = None
+    behavior_social_emotional_notes: Optional[List[StaffNote]] = None
+    soft_skill_inferences: Optional[List[SoftSkillInference]] = None
+
+# Comment Create Model (for /students/{id}/comments POST)
+class CommentCreate(BaseModel):
+    subject: str
+    teacher: str
+    term: str
+    comment_text: str
+
+# New Student Profile Model
+class StudentProfile(BaseModel):
+    student_id: str = Field(..., description="Unique identifier for the student")
+    first_name: str
+    last_name: str
+    date_of_birth: date
+    gender: str
+    email: NormalizedEmail
+    phone_number: str
+    address: str
+    enrollment_date: date
+    major: str
+    gpa: float
+    academic_standing: str
+    advisor: str
+    enrollment_status: str
+    financial_aid_status: str
+    scholarship_amount: float
+    # Add other fields as per your schema.sql
+
+class StudentData(BaseModel):
+    profile: StudentProfile
+    courses: List[Course] = Field(default_factory=list)
+    attendance: List[Attendance] = Field(default_factory=list)
+    financial_aid: List[FinancialAid] = Field(default_factory=list)
+
+# New Student Profile Update Model
+class StudentProfileUpdate(BaseModel):
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    date_of_birth: Optional[date] = None
+    gender: Optional[str] = None
+    email: Optional[NormalizedEmail] = None
+    phone_number: Optional[str] = None
+    address: Optional[str] = None
+    enrollment_date: Optional[date] = None
+    major: Optional[str] = None
+    gpa: Optional[float] = None
+    academic_standing: Optional[str] = None
+    advisor: Optional[str] = None
+    enrollment_status: Optional[str] = None
+    financial_aid_status: Optional[str] = None
+    scholarship_amount: Optional[float] = None
+
+def content_hash(row: Any) -> str:
+    """
+    Stable hash of an uploaded row or profile: SHA-256 of its JSON with sorted keys, with dates
+    and other non-JSON values written as strings. Equal content always gives the same hash.
+    """
+    return hashlib.sha256(json.dumps(row, sort_keys=True, separators=(",", ":"), default=str).encode()).hexdigest()
+
+def _student_insert_row(profile: StudentIngestionPayload) -> Dict[str, Any]:
+    student_info = profile.student_profile.student_info.model_dump()
+    return {
+        "full_name": student_info["full_name"],
+        "grade_level": student_info["grade_level"],
+        "academic_year": student_info["academic_year"],
+        "status": student_info["status"],
+        **({"email": normalize_email(student_info["email"])} if student_info.get("email") else {}),
+    }
+
+# Related table written for each profile section, keyed by StudentUpdatePayload field name
+PROFILE_SECTION_TABLES = {
+    "courses": "courses",
+    "assessment_breakdown_by_type": "assessment_breakdowns",
+    "gpa_history": "gpa_history",
+    "attendance": "attendance",
+    "extracurricular_activities": "extracurricular_activities",
+    "iep_504_plan_information": "iep_504_plans",
+    "college_counseling_milestones": "college_milestones",
+    "narrative_teacher_comments": "narrative_comments",
+    "advisory_counselor_notes": "counselor_notes",
+    "behavior_social_emotional_notes": "behavior_notes",
+    "soft_skill_inferences": "soft_skills",
+}
+
+# Natural key of each related table's rows, used to diff a section against the stored rows on
+# full-profile updates. Free-text rows (comments, notes, skills) are identified by their content,
+# so editing one replaces it; attendance and IEP plans are a single row per student. Keys need not
+# be unique: write_student_profile pairs rows sharing a key by occurrence.
+PROFILE_TABLE_NATURAL_KEYS = {
+    "courses": ["course_id"],
+    "assessment_breakdowns": ["type"],
+    "gpa_history": ["academic_year", "term"],
+    "attendance": [],
+    "extracurricular_activities": ["activity_name", "start_date"],
+    "iep_504_plans": [],
+    "college_milestones": ["milestone_name"],
+    "narrative_comments": ["subject", "teacher", "term", "comment_text"],
+    "counselor_notes": ["staff_name", "date", "note_text"],
+    "behavior_notes": ["staff_name", "date", "note_text"],
+    "soft_skills": ["skill_name", "source_phrase"],
+}
+
+def _profile_sections(profile: StudentIngestionPayload) -> Dict[str, Any]:
+    return {
+        "courses": profile.student_profile.courses,
+        "assessment_breakdown_by_type": profile.student_profile.assessment_breakdown_by_type,
+        "gpa_history": profile.student_profile.gpa_history,
+        "attendance": profile.student_profile.attendance,
+        "extracurricular_activities": profile.student_profile.extracurricular_activities,
+        "iep_504_plan_information": profile.student_profile.iep_504_plan_information,
+        "college_counseling_milestones": profile.student_profile.college_counseling_milestones,
+        "narrative_teacher_comments": profile.unstructured_data.narrative_teacher_comments,
+        "advisory_counselor_notes": profile.unstructured_data.advisory_counselor_notes,
+        "behavior_social_emotional_notes": profile.unstructured_data.behavior_social_emotional_notes,
+        "soft_skill_inferences": profile.soft_skill_inferences,
+    }
+
+def _section_rows(section: str, value: Any, student_id: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Convert one profile section (a list of models, or a single attendance / IEP model) into
+    rows of its related table.
+    """
+    if value is None:
+        return []
+    if section == "attendance":
+        attendance_data = value.model_dump()
+        absences = attendance_data.get("absences") or {}
+        tardies = attendance_data.get("tardies") or {}
+        return [{
+            "student_id": student_id,
+            "excused": absences.get("excused", 0),
+            "unexcused": absences.get("unexcused", 0),
+            "tardy_count": tardies.get("count", 0),
+            "tardy_dates": tardies.get("dates", [])
+        }]
+    if section == "iep_504_plan_information":
+        iep_data = value.model_dump()
+        return [{
+            "student_id": student_id,
+            "has_plan": iep_data.get("has_plan", False),
+            "plan_type": iep_data.get("plan_type"),
+            "accommodations": iep_data.get("accommodations", []),
+            "last_updated": iep_data.get("last_updated_date")
+        }]
+    return [{"student_id": student_id, **item.model_dump()} for item in value]
+
+def _student_child_rows(profile: StudentIngestionPayload, student_id: Optional[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Build the rows of every related table for one profile, keyed by table name.
+    """
+    return {
+        PROFILE_SECTION_TABLES[section]: _section_rows(section, value, student_id)
+        for section, value in _profile_sections(profile).items()
+    }
+
+def _student_profile_rows(profile: StudentIngestionPayload) -> Dict[str, Any]:
+    """
+    The write_student_profiles entry for one new profile: its students row and its related rows,
+    without student_id. Plain data, so it can be built in a worker process and sent back cheaply.
+    The students row carries the content_hash of the whole entry, to recognise unchanged re-uploads.
+    """
+    profile_rows = {"student": _student_insert_row(profile), "children": _student_child_rows(profile, None)}
+    profile_rows["student"]["content_hash"] = content_hash(profile_rows)
+    return profile_rows
@@ -1,5 +1,9 @@
 import os
+from typing import Any, Callable, Optional
+import anyio
+import httpx
 from supabase import create_client, Client
+from supabase.lib.client_options import SyncClientOptions
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -12,12 +16,80 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY") # Use service_role key for write operat
 if not SUPABASE_URL or not SUPABASE_KEY:
   raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set as environment variables in the .env file.")
 
-# Initialize Supabase client globally for reuse
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# HTTP connection pool settings for the shared PostgREST session
+SUPABASE_POOL_MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20"))
+SUPABASE_POOL_MAX_KEEPALIVE = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10"))
+SUPABASE_POOL_KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30"))
+SUPABASE_REQUEST_TIMEOUT = float(os.getenv("SUPABASE_REQUEST_TIMEOUT", "10"))
 
-def get_supabase_client(url: str = SUPABASE_URL, key: str = SUPABASE_KEY) -> Client:
+# Maximum number of blocking PostgREST calls running at once per worker process
+SUPABASE_QUERY_CONCURRENCY = int(os.getenv("SUPABASE_QUERY_CONCURRENCY", "16"))
+
+_client: Optional[Client] = None
+_query_limiter: Optional[anyio.CapacityLimiter] = None
+
+def _pooled_http_client() -> httpx.Client:
+  """
+  HTTP client backed by a bounded keep-alive pool, so TLS connections are
+  reused across requests. supabase-py sends every PostgREST call through it.
+  """
+  return httpx.Client(
+    timeout=SUPABASE_REQUEST_TIMEOUT,
+    limits=httpx.Limits(
+      max_connections=SUPABASE_POOL_MAX_CONNECTIONS,
+      max_keepalive_connections=SUPABASE_POOL_MAX_KEEPALIVE,
+      keepalive_expiry=SUPABASE_POOL_KEEPALIVE_EXPIRY,
+    ),
+  )
+
+def init_supabase_client() -> Client:
+  """
+  Create the process-wide Supabase client if it does not exist yet.
+  Called at app startup (or on first use); later calls return the same instance.
+  """
+  global _client
+  if _client is None:
+    _client = create_client(
+      SUPABASE_URL,
+      SUPABASE_KEY,
+      options=SyncClientOptions(httpx_client=_pooled_http_client()),
+    )
+  return _client
+
+def close_supabase_client() -> None:
+  """
+  Close the pooled HTTP connections of the shared client on app shutdown.
+  """
+  global _client
+  if _client is not None:
+    _client.postgrest.session.close()
+    _client = None
+
+def get_supabase_client() -> Client:
+  """
+  Dependency to get the shared Supabase client instance.
+  Each request checks a connection out of the keep-alive pool instead of
+  constructing a new client. Can be used in FastAPI path operations.
+  """
+  return init_supabase_client()
+
+def _get_query_limiter() -> anyio.CapacityLimiter:
+  # Created lazily so the limiter is bound to the running event loop
+  global _query_limiter
+  if _query_limiter is None:
+    _query_limiter = anyio.CapacityLimiter(SUPABASE_QUERY_CONCURRENCY)
+  return _query_limiter
+
+async def run_blocking(func: Callable[..., Any], *args: Any) -> Any:
+  """
+  Run a blocking supabase-py call (e.g. an auth request) on the same bounded
+  worker thread pool as execute_query.
+  """
+  return await anyio.to_thread.run_sync(func, *args, limiter=_get_query_limiter())
+
+async def execute_query(query: Any) -> Any:
   """
-  Dependency to get a Supabase client instance.
-  Can be used in FastAPI path operations.
+  Run a supabase-py query builder's blocking execute() on a bounded worker
+  thread pool so async routes never block the event loop while waiting on PostgREST.
   """
-  return create_client(url, key)
+  return await run_blocking(query.execute)
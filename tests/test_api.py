@@ -0,0 +1,162 @@
+import importlib
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+# The Flask app under api/ (deployed to Vercel) has modules named like the root app's, so they are
+# imported in isolation and the root modules are put back afterwards.
+API_DIR = os.path.join(os.path.dirname(__file__), "..", "api")
+API_MODULES = [
+    "supabase_client", "auth_utils", "pagination", "column_normalization", "csv_decoding",
+    "student_ingestion_route", "upload_students", "main",
+]
+
+@pytest.fixture
+def api(monkeypatch):
+    pytest.importorskip("flask")
+    pytest.importorskip("flask_cors")
+    monkeypatch.setenv("SUPABASE_URL", "http://localhost:54321")
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+    saved = {name: sys.modules.pop(name) for name in API_MODULES if name in sys.modules}
+    sys.path.insert(0, API_DIR)
+    try:
+        yield SimpleNamespace(
+            main=importlib.import_module("main"),
+            auth=importlib.import_module("auth_utils"),
+            routes=importlib.import_module("student_ingestion_route"),
+            uploads=importlib.import_module("upload_students"),
+        )
+    finally:
+        sys.path.remove(API_DIR)
+        for name in API_MODULES:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client, self.table, self.calls = client, table, []
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+        return record
+
+    def upsert(self, rows, on_conflict):
+        self.calls.append(("upsert", (rows, on_conflict)))
+        return self
+
+    def execute(self):
+        self.client.queries.append(self)
+        name, args = self.calls[0] if self.calls else (None, ())
+        if name == "upsert":
+            rows = args[0]
+            if any(row["email"] in self.client.failing_emails for row in rows):
+                raise RuntimeError("duplicate key value violates unique constraint")
+            return SimpleNamespace(data=[{**row, "id": "id-" + row["email"]} for row in rows])
+        if name == "insert":
+            return SimpleNamespace(data=args[0])
+        limit = next((args[0] for call, args in self.calls if call == "limit"), None)
+        return SimpleNamespace(data=[dict(row) for row in self.client.rows[:limit]])
+
+class FakeSupabase:
+    def __init__(self, rows=(), failing_emails=()):
+        self.rows, self.failing_emails, self.queries = list(rows), set(failing_emails), []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def written(self, table, action):
+        return [query.calls[0][1][0] for query in self.queries if query.table == table and query.calls[0][0] == action]
+
+UPLOAD_SHEET = (
+    "first_name,last_name,date_of_birth,enrollment_date,major,email,gpa,semester,year\n"
+    "Ada,Lovelace,2008-12-10,2023-09-01,Math,Ada@School.edu,3.9,Fall,2024\n"
+    "Alan,Turing,2008-06-23,2023-09-01,CS,alan@school.edu,,,\n"
+    "No,Email,2008-01-01,2023-09-01,Art,,3.0,Fall,2024\n"
+    "Grace,Hopper,2008-12-09,2023-09-01,CS,grace@school.edu,3.7,Fall,2024\n"
+)
+
+def upload_client(api, supabase):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    app = FastAPI()
+    app.include_router(api.uploads.router)
+    app.dependency_overrides[api.auth.get_current_admin_user] = lambda: {"id": "admin", "roles": ["admin"]}
+    api.uploads.supabase = supabase
+    return TestClient(app)
+
+def test_upload_students_sheet_upserts_by_email_and_links_gpa(api):
+    supabase = FakeSupabase()
+    response = upload_client(api, supabase).post("/upload-students/", files={"file": ("students.csv", UPLOAD_SHEET, "text/csv")})
+    assert response.status_code == 200, response.text
+
+    students, = supabase.written("students", "upsert")
+    assert [row["email"] for row in students] == ["ada@school.edu", "alan@school.edu", "grace@school.edu"]
+    gpa_history, = supabase.written("gpa_history", "insert")
+    assert [(row["student_id"], row["gpa"]) for row in gpa_history] == [("id-ada@school.edu", 3.9), ("id-grace@school.edu", 3.7)]
+
+def test_upload_students_sheet_reports_failed_chunks(api, monkeypatch):
+    monkeypatch.setattr(api.routes, "UPLOAD_STUDENTS_CHUNK_SIZE", 2)
+    supabase = FakeSupabase(failing_emails={"grace@school.edu"})
+    response = upload_client(api, supabase).post("/upload-students/", files={"file": ("students.csv", UPLOAD_SHEET, "text/csv")})
+    assert response.status_code == 500
+    detail = response.json()["detail"]
+    assert detail["message"] == "1 students could not be written; 2 were written."
+    assert detail["failed"][0]["students"] == "3-3" and detail["failed"][0]["emails"] == ["grace@school.edu"]
+    # GPA history is still written for the students that were
+    gpa_history, = supabase.written("gpa_history", "insert")
+    assert [row["student_id"] for row in gpa_history] == ["id-ada@school.edu"]
+
+def test_excel_students_link_gpa_history_by_sheet_position(api):
+    sheet = pd.DataFrame({
+        "First Name": ["Ada", "Alan", "Grace"],
+        "Last Name": ["Lovelace", "Turing", "Hopper"],
+        "Email": ["ada@school.edu", "alan@school.edu", "grace@school.edu"],
+        "Current GPA": [3.9, None, 3.7],
+    })
+    students, gpa_history = api.routes.map_excel_students(sheet)
+    assert [student["first_name"] for student in students] == ["Ada", "Alan", "Grace"]
+    inserted = [{"id": f"id-{position}"} for position in range(len(students))]
+    linked = api.routes.link_gpa_history(gpa_history, inserted)
+    assert [(row["student_id"], row["gpa"]) for row in linked] == [("id-0", 3.9), ("id-2", 3.7)]
+
+def test_flask_student_list_pages_with_next_cursor(api, monkeypatch):
+    supabase = FakeSupabase(rows=[{"id": f"id-{i}", "last_name": f"N{i}"} for i in range(3)])
+    monkeypatch.setattr(api.routes, "supabase", supabase)
+    client = api.main.app.test_client()
+
+    response = client.get("/api/students?limit=2&sort=last_name&email=Ada@School.edu")
+    assert response.status_code == 200
+    assert [row["id"] for row in response.get_json()] == ["id-0", "id-1"]
+    cursor = response.headers["X-Next-Cursor"]
+    assert ("eq", ("email", "ada@school.edu")) in supabase.queries[-1].calls
+
+    client.get(f"/api/students?limit=2&sort=last_name&cursor={cursor}")
+    assert ("or_", ('last_name.gt."N1",and(last_name.eq."N1",id.gt."id-1"),last_name.is.null',)) in supabase.queries[-1].calls
+
+    assert client.get("/api/students?sort=password").status_code == 400
+
+def test_csv_payloads_decode_nested_columns_and_report_bad_cells(api):
+    course = {"course_id": "M1", "student_id": "S1", "course_name": "Math", "credits": 1, "grade": "A", "semester": "Fall", "year": 2024}
+    csv = pd.DataFrame({
+        "first_name": ["Ada", "Alan"],
+        "last_name": ["Lovelace", "Turing"],
+        "email": ["ada@school.edu", "alan@school.edu"],
+        "enrollment_date": ["2023-09-01", "2023-09-01"],
+        "grade_level": [11, 11],
+        "academic_year": ["2024-2025", "2024-2025"],
+        "courses": [json.dumps([course]), "[{not json"],
+    }).to_csv(index=False)
+
+    payloads, errors = api.uploads.parse_csv_to_student_payloads(csv.encode())
+    assert [payload.student_profile.student_info.full_name for payload in payloads] == ["Ada Lovelace", "Alan Turing"]
+    assert payloads[0].student_profile.courses[0].course_id == "M1"
+    assert payloads[1].student_profile.courses == []
+    assert [(error["row"], error["column"]) for error in errors] == [(2, "courses")]
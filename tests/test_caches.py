@@ -0,0 +1,108 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import profile_cache
+from profile_cache import TTLCache
+from report_cache import ReportCache
+
+def test_get_returns_cached_value_until_ttl_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(profile_cache.time, "monotonic", lambda: now[0])
+    cache = TTLCache(ttl_seconds=10, max_bytes=1024)
+    cache.set("a", {"name": "Ada"})
+    assert cache.get("a") == {"name": "Ada"}
+    now[0] += 10
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_least_recently_used_entries_are_evicted_over_budget():
+    cache = TTLCache(ttl_seconds=60, max_bytes=20)
+    cache.set("a", "x" * 6)
+    cache.set("b", "y" * 6)
+    cache.get("a")
+    cache.set("c", "z" * 6)
+    assert cache.get("b") is None
+    assert cache.get("a") == "x" * 6 and cache.get("c") == "z" * 6
+    cache.set("huge", "w" * 50)
+    assert cache.get("huge") is None
+
+def test_set_refuses_load_that_started_before_invalidation():
+    cache = TTLCache(ttl_seconds=60, max_bytes=1024)
+    generation = cache.generation()
+    cache.invalidate("a")
+    cache.set("a", "stale", generation)
+    assert cache.get("a") is None
+    cache.set("a", "fresh", cache.generation())
+    assert cache.get("a") == "fresh"
+
+def test_invalidation_of_other_keys_does_not_block_set():
+    cache = TTLCache(ttl_seconds=60, max_bytes=1024)
+    generation = cache.generation()
+    cache.invalidate("b", None)
+    cache.set("a", "value", generation)
+    assert cache.get("a") == "value"
+
+def test_forgotten_invalidations_still_refuse_older_loads(monkeypatch):
+    monkeypatch.setattr(profile_cache, "CACHE_INVALIDATION_HISTORY", 2)
+    cache = TTLCache(ttl_seconds=60, max_bytes=1024)
+    generation = cache.generation()
+    cache.invalidate("a", "b", "c")
+    cache.set("a", "stale", generation)
+    assert cache.get("a") is None
+    cache.set("a", "fresh", cache.generation())
+    assert cache.get("a") == "fresh"
+
+def test_clear_refuses_loads_started_before_it():
+    cache = TTLCache(ttl_seconds=60, max_bytes=1024)
+    cache.set("a", "old")
+    generation = cache.generation()
+    cache.clear()
+    assert cache.get("a") is None
+    cache.set("a", "stale", generation)
+    assert cache.get("a") is None
+
+def test_report_cache_coalesces_concurrent_computations():
+    async def scenario():
+        cache = ReportCache(ttl_seconds=60, max_bytes=1024)
+        calls = []
+        release = asyncio.Event()
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return {"rows": [1, 2]}
+
+        key = ReportCache.trends_key(11, 3, None)
+        first = asyncio.ensure_future(cache.get_or_compute(key, compute))
+        second = asyncio.ensure_future(cache.get_or_compute(ReportCache.trends_key(11.0, 3.0, None), compute))
+        await asyncio.sleep(0)
+        release.set()
+        assert await first == await second == {"rows": [1, 2]}
+        assert len(calls) == 1 and cache.stats()["coalesced"] == 1
+        assert await cache.get_or_compute(key, compute) == {"rows": [1, 2]}
+        assert len(calls) == 1
+
+    asyncio.run(scenario())
+
+def test_report_cache_drops_result_computed_across_invalidation():
+    async def scenario():
+        cache = ReportCache(ttl_seconds=60, max_bytes=1024)
+        release = asyncio.Event()
+        versions = iter(["before write", "after write"])
+
+        async def compute():
+            await release.wait()
+            return next(versions)
+
+        key = ReportCache.trends_key(None, None, None)
+        running = asyncio.ensure_future(cache.get_or_compute(key, compute))
+        await asyncio.sleep(0)
+        cache.invalidate()
+        release.set()
+        assert await running == "before write"
+        assert await cache.get_or_compute(key, compute) == "after write"
+
+    asyncio.run(scenario())
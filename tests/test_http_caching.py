@@ -0,0 +1,46 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from http_caching import etag_matches, http_date, make_etag, not_modified, validator_headers
+
+ETAG = make_etag("student-1", "2024-09-01T10:00:00+00:00", "full")
+
+def test_make_etag_is_strong_and_depends_on_every_part():
+    assert ETAG.startswith('"') and ETAG.endswith('"')
+    assert ETAG == make_etag("student-1", "2024-09-01T10:00:00+00:00", "full")
+    assert ETAG != make_etag("student-1", "2024-09-01T10:00:01+00:00", "full")
+    assert ETAG != make_etag("student-1", "2024-09-01T10:00:00+00:00", "summary")
+
+@pytest.mark.parametrize("header", [
+    ETAG,
+    f"W/{ETAG}",
+    f'"other", {ETAG}',
+    f'"other",W/{ETAG}',
+    "*",
+])
+def test_etag_matches(header):
+    assert etag_matches(header, ETAG)
+
+@pytest.mark.parametrize("header", [None, "", '"other"', ETAG.strip('"'), f"w/{ETAG}"])
+def test_etag_does_not_match(header):
+    assert not etag_matches(header, ETAG)
+
+def test_weak_stored_etag_matches_strong_header():
+    assert etag_matches(ETAG, f"W/{ETAG}")
+
+def test_http_date():
+    assert http_date("2024-09-01T12:30:00+02:00") == "Sun, 01 Sep 2024 10:30:00 GMT"
+    assert http_date(None) is None
+    assert http_date("yesterday") is None
+
+def test_not_modified_carries_validators():
+    response = not_modified(ETAG, "2024-09-01T10:00:00+00:00")
+    assert response.status_code == 304
+    assert response.body == b""
+    assert response.headers["ETag"] == ETAG
+    assert response.headers["Last-Modified"] == "Sun, 01 Sep 2024 10:00:00 GMT"
+    assert validator_headers(ETAG, None) == {"ETag": ETAG}
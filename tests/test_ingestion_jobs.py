@@ -0,0 +1,120 @@
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "test-secret")
+
+import ingestion_jobs
+from ingestion_jobs import IngestionJob, IngestionJobManager, IngestionJobStore
+
+class FakeJobsTable:
+    """The ingestion_jobs table, shared by every 'worker' in a test."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def from_(self, table):
+        return FakeJobsQuery(self)
+
+class FakeJobsQuery:
+    def __init__(self, table):
+        self.table, self.action, self.filters = table, None, []
+
+    def upsert(self, record):
+        self.action, self.record = "upsert", record
+        return self
+
+    def select(self, columns):
+        self.action = "select"
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row[column] == value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row[column] < value)
+        return self
+
+    def execute(self):
+        rows = self.table.rows
+        if self.action == "upsert":
+            rows[self.record["id"]] = {"errors": [], **rows.get(self.record["id"], {}), **self.record}
+            return SimpleNamespace(data=[rows[self.record["id"]]])
+        matched = [row for row in rows.values() if all(f(row) for f in self.filters)]
+        if self.action == "delete":
+            for row in matched:
+                del rows[row["id"]]
+        return SimpleNamespace(data=matched)
+
+def test_other_worker_reports_progress_and_result_from_the_store(monkeypatch):
+    monkeypatch.setattr(ingestion_jobs, "INGEST_JOB_SAVE_INTERVAL_SECONDS", 0.01)
+    table = FakeJobsTable()
+
+    async def scenario():
+        worker = IngestionJobManager(1, 3600, IngestionJobStore(lambda: table))
+        other_worker = IngestionJobManager(1, 3600, IngestionJobStore(lambda: table))
+        halfway = asyncio.Event()
+        finish = asyncio.Event()
+
+        async def work(job):
+            job.record_processed(5)
+            job.record_failed(7, "grade_level: not an integer")
+            halfway.set()
+            await finish.wait()
+            job.record_processed(3)
+
+        job = worker.submit(IngestionJob(filename="students.csv", total_rows=10), work)
+        await halfway.wait()
+        await asyncio.sleep(0.05)
+        running = await other_worker.get(job.id)
+        assert running.summary()["status"] == "running"
+        assert running.summary()["rows_processed"] == 5
+        assert running.summary()["rows_remaining"] == 4
+        assert running.summary()["error_count"] == 1
+
+        finish.set()
+        while job.status == "running" or table.rows[job.id]["status"] == "running":
+            await asyncio.sleep(0.01)
+        finished = await other_worker.get(job.id)
+        assert finished.summary()["status"] == "completed"
+        assert finished.summary()["rows_processed"] == 8
+        assert finished.error_report_csv() == job.error_report_csv()
+        assert await other_worker.get("missing") is None
+
+    asyncio.run(scenario())
+
+def test_job_whose_worker_stopped_is_reported_failed():
+    job = IngestionJob(filename="students.csv")
+    job.status = "running"
+    record = job.to_record()
+    record["updated_at"] = (datetime.now(timezone.utc) - timedelta(minutes=5)).isoformat()
+    loaded = IngestionJob.from_record(record)
+    assert loaded.status == "failed"
+    assert "stopped" in loaded.error
+    assert loaded.summary()["rows_remaining"] == 0
+
+    record["updated_at"] = datetime.now(timezone.utc).isoformat()
+    assert IngestionJob.from_record(record).status == "running"
+
+def test_jobs_still_run_when_the_store_is_unavailable():
+    def broken_client():
+        raise RuntimeError("relation ingestion_jobs does not exist")
+
+    async def scenario():
+        manager = IngestionJobManager(1, 3600, IngestionJobStore(broken_client))
+        job = manager.submit(IngestionJob(filename="students.csv"), lambda job: asyncio.sleep(0))
+        while job.status != "completed":
+            await asyncio.sleep(0.01)
+        assert await manager.get(job.id) is job
+
+    asyncio.run(scenario())
@@ -0,0 +1,130 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "test-secret")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import student_ingestion_route
+from supabase_client import get_supabase_client
+from pagination import apply_keyset_page, apply_student_filters, decode_cursor, encode_cursor, next_page_cursor
+
+class RecordingQuery:
+    """Stands in for a PostgREST builder and records the calls made on it."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        def record(*args, **kwargs):
+            self.calls.append((name, args, kwargs) if kwargs else (name, args))
+            return self
+        return record
+
+    @property
+    def not_(self):
+        self.calls.append(("not_",))
+        return self
+
+def test_cursor_round_trip():
+    cursor = encode_cursor("O'Brien, Ann", 42)
+    assert decode_cursor(cursor) == ("O'Brien, Ann", "42")
+    assert decode_cursor(encode_cursor(None, "id-1")) == (None, "id-1")
+
+@pytest.mark.parametrize("cursor", ["not-base64!", encode_cursor("x", 1)[:-4], "WzFd"])
+def test_decode_cursor_rejects_malformed(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_first_page_orders_by_sort_then_id_and_looks_ahead_one_row():
+    query = apply_keyset_page(RecordingQuery(), sort="last_name", limit=50)
+    assert query.calls == [
+        ("order", ("last_name",), {"desc": False}),
+        ("order", ("id",)),
+        ("limit", (51,)),
+    ]
+
+def test_sort_by_id_seeks_on_id_only():
+    query = apply_keyset_page(RecordingQuery(), sort="id", descending=True, cursor=encode_cursor("b", "b"), limit=10)
+    assert query.calls == [
+        ("lt", ("id", "b")),
+        ("order", ("id",), {"desc": True}),
+        ("limit", (11,)),
+    ]
+
+def test_ascending_seek_quotes_values_and_keeps_nulls_last():
+    query = apply_keyset_page(RecordingQuery(), sort="last_name", cursor=encode_cursor('Smith, "Jr"', "id-7"))
+    assert query.calls[0] == (
+        "or_",
+        ('last_name.gt."Smith, \\"Jr\\"",and(last_name.eq."Smith, \\"Jr\\"",id.gt."id-7"),last_name.is.null',),
+    )
+
+def test_descending_seek_excludes_nulls_already_returned():
+    query = apply_keyset_page(RecordingQuery(), sort="major", descending=True, cursor=encode_cursor("Math", "id-3"))
+    assert query.calls[0] == ("or_", ('major.lt."Math",and(major.eq."Math",id.gt."id-3")',))
+
+def test_seek_from_null_sort_value():
+    ascending = apply_keyset_page(RecordingQuery(), sort="major", cursor=encode_cursor(None, "id-3"))
+    assert ascending.calls[0] == ("or_", ('and(major.is.null,id.gt."id-3")',))
+    descending = apply_keyset_page(RecordingQuery(), sort="major", descending=True, cursor=encode_cursor(None, "id-3"))
+    assert descending.calls[0] == ("or_", ('major.not.is.null,and(major.is.null,id.gt."id-3")',))
+
+def test_unknown_sort_column_is_rejected():
+    with pytest.raises(ValueError):
+        apply_keyset_page(RecordingQuery(), sort="password")
+
+def test_next_page_cursor_trims_look_ahead_row():
+    rows = [{"id": f"id-{i}", "last_name": f"N{i}"} for i in range(3)]
+    cursor = next_page_cursor(rows, "last_name", 2)
+    assert [row["id"] for row in rows] == ["id-0", "id-1"]
+    assert decode_cursor(cursor) == ("N1", "id-1")
+
+def test_last_page_has_no_cursor():
+    rows = [{"id": "id-0", "last_name": "N0"}]
+    assert next_page_cursor(rows, "last_name", 2) is None
+    assert len(rows) == 1
+
+def test_email_filter_is_normalized():
+    query = apply_student_filters(RecordingQuery(), email="  Ada@School.EDU ", grade_level=11)
+    assert query.calls == [("eq", ("grade_level", 11)), ("eq", ("email", "ada@school.edu"))]
+
+class FakeStudents(RecordingQuery):
+    def __init__(self, rows):
+        super().__init__()
+        self.rows = rows
+
+    def execute(self):
+        limit = next(args[0] for name, args, *_ in self.calls if name == "limit")
+        return SimpleNamespace(data=[dict(row) for row in self.rows[:limit]])
+
+def list_client(rows):
+    app = FastAPI()
+    app.include_router(student_ingestion_route.router)
+    app.dependency_overrides[get_supabase_client] = lambda: SimpleNamespace(table=lambda name: FakeStudents(rows))
+    app.dependency_overrides[student_ingestion_route.get_current_admin_user] = lambda: {"role": "admin"}
+    return TestClient(app)
+
+def test_student_list_pages_with_next_cursor_header():
+    client = list_client([{"id": f"id-{i}"} for i in range(3)])
+    response = client.get("/students", params={"limit": 2})
+    assert response.status_code == 200
+    assert [row["id"] for row in response.json()] == ["id-0", "id-1"]
+    assert decode_cursor(response.headers["X-Next-Cursor"]) == ("id-1", "id-1")
+
+    response = client.get("/students", params={"limit": 3})
+    assert len(response.json()) == 3
+    assert "X-Next-Cursor" not in response.headers
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 501}, {"order": "sideways"}])
+def test_student_list_rejects_out_of_range_paging(params):
+    assert list_client([]).get("/students", params=params).status_code == 422
+
+@pytest.mark.parametrize("params", [{"cursor": "not-a-cursor"}, {"sort": "password"}])
+def test_student_list_rejects_bad_cursor_and_sort(params):
+    assert list_client([]).get("/students", params=params).status_code == 400
@@ -0,0 +1,150 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+os.environ.setdefault("SUPABASE_JWT_SECRET", "test-secret")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+import upload_students
+from supabase_client import get_supabase_client
+
+class FakeQuery:
+    def __init__(self, client, name, params=None):
+        self.client, self.name, self.params = client, name, params
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, values):
+        return self
+
+    def execute(self):
+        if self.name == "write_student_profiles":
+            profiles = self.params["p_profiles"]
+            self.client.written.extend(profiles)
+            return SimpleNamespace(data=[f"id-{i}" for i in range(len(profiles))])
+        # Stored content-hash lookup: no students stored yet
+        return SimpleNamespace(data=[])
+
+class FakeSupabase:
+    def __init__(self):
+        self.written = []
+
+    def rpc(self, name, params):
+        return FakeQuery(self, name, params)
+
+    def from_(self, table):
+        return FakeQuery(self, table)
+
+CSV_UPLOAD = (
+    "full_name,grade_level,academic_year,status,email,soft_skill_inferences\n"
+    'Ada Lovelace,11,2024-2025,Active,Ada@School.edu,"[{""skill_name"": ""Teamwork"", ""source_phrase"": ""works well in groups"", '
+    '""explanation"": ""peer feedback"", ""confidence_level"": ""High""}]"\n'
+)
+
+def test_bulk_csv_upload_writes_mapped_row():
+    supabase = FakeSupabase()
+    app = FastAPI()
+    app.include_router(upload_students.router)
+    app.dependency_overrides[get_supabase_client] = lambda: supabase
+    app.dependency_overrides[upload_students.get_current_user_role] = lambda: "admin"
+
+    response = TestClient(app).post(
+        "/upload/students-bulk",
+        files={"file": ("students.csv", CSV_UPLOAD, "text/csv")},
+    )
+
+    assert response.status_code == 201, response.text
+    assert response.json()["details"] == []
+    assert len(supabase.written) == 1
+    profile = supabase.written[0]
+    assert profile["student"]["full_name"] == "Ada Lovelace"
+    assert profile["student"]["email"] == "ada@school.edu"
+    assert profile["children"]["soft_skills"][0]["skill_name"] == "Teamwork"
+
+def test_json_upload_declares_array_body():
+    app = FastAPI()
+    app.include_router(upload_students.router)
+    app.dependency_overrides[get_supabase_client] = FakeSupabase
+    app.dependency_overrides[upload_students.get_current_admin_user] = lambda: {"id": "admin"}
+    client = TestClient(app)
+
+    body = app.openapi()["paths"]["/upload/json"]["post"]["requestBody"]
+    schema = body["content"]["application/json"]["schema"]
+    assert body["required"] and schema["type"] == "array"
+    assert schema["items"]["properties"]["student_info"]["required"] == ["full_name", "grade_level", "academic_year"]
+
+    assert client.post("/upload/json", json={"student_info": {}}).status_code == 422
+    assert client.post("/upload/json", content="[{", headers={"Content-Type": "application/json"}).status_code == 422
+
+class FakeStudentsTable:
+    def __init__(self, lookup_error=None):
+        self.lookup_error, self.upserted = lookup_error, []
+
+    def from_(self, table):
+        return self
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, values):
+        return self
+
+    def upsert(self, rows, on_conflict):
+        self.upserted.extend(rows)
+        return self
+
+    def execute(self):
+        if self.lookup_error and not self.upserted:
+            raise self.lookup_error
+        return SimpleNamespace(data=[dict(row, id=f"id-{row['student_id']}") for row in self.upserted])
+
+def test_dataframe_upload_leaves_out_content_hash_when_lookup_fails(monkeypatch):
+    import pandas as pd
+    supabase = FakeStudentsTable(lookup_error=RuntimeError('column "content_hash" does not exist'))
+    monkeypatch.setattr(upload_students, "get_supabase_client", lambda: supabase)
+
+    uploaded = upload_students.upload_students_from_dataframe(pd.DataFrame({"student_id": ["S1", "S2"], "first_name": ["Ada", "Alan"]}))
+
+    assert [row["student_id"] for row in uploaded] == ["S1", "S2"]
+    assert all("content_hash" not in row for row in supabase.upserted)
+
+class StoredHashesQuery(FakeQuery):
+    def in_(self, column, values):
+        self.column, self.values = column, values
+        return self
+
+    def execute(self):
+        if self.name != "students":
+            return super().execute()
+        stored = [row for row in self.client.stored if row[self.column] in self.values]
+        return SimpleNamespace(data=[{"id": row["id"], self.column: row[self.column], "content_hash": row["content_hash"]} for row in stored])
+
+class FakeSupabaseWithStudents(FakeSupabase):
+    def __init__(self, stored):
+        super().__init__()
+        self.stored = stored
+
+    def from_(self, table):
+        return StoredHashesQuery(self, table)
+
+def test_bulk_upload_matches_students_without_email_on_content_hash():
+    no_email_csv = "full_name,grade_level,academic_year,status\nAda Lovelace,11,2024-2025,Active\nAlan Turing,11,2024-2025,Active\n"
+
+    def upload(supabase):
+        app = FastAPI()
+        app.include_router(upload_students.router)
+        app.dependency_overrides[get_supabase_client] = lambda: supabase
+        app.dependency_overrides[upload_students.get_current_user_role] = lambda: "admin"
+        response = TestClient(app).post("/upload/students-bulk", files={"file": ("students.csv", no_email_csv, "text/csv")})
+        assert response.status_code == 201, response.text
+        return supabase.written
+
+    first = upload(FakeSupabase())
+    stored = [{"id": "stored-ada", "email": None, "content_hash": first[0]["student"]["content_hash"]}]
+    rewritten = upload(FakeSupabaseWithStudents(stored))
+    assert [profile["student"]["full_name"] for profile in rewritten] == ["Alan Turing"]
@@ -0,0 +1,106 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from student_models import PROFILE_TABLE_NATURAL_KEYS
+
+# Runs write_student_profile from schema.sql against Postgres: TEST_DATABASE_URL if set (psql must
+# be on PATH), otherwise a throwaway server from pgserver if it is installed. Everything happens
+# in a scratch schema inside a transaction that is rolled back.
+SCHEMA_SQL = os.path.join(os.path.dirname(__file__), "..", "schema.sql")
+
+TABLES = """
+CREATE SCHEMA profile_diff_test;
+SET LOCAL search_path = profile_diff_test;
+CREATE TABLE students (id UUID PRIMARY KEY DEFAULT gen_random_uuid(), first_name TEXT, content_hash TEXT);
+CREATE TABLE courses (id UUID PRIMARY KEY DEFAULT gen_random_uuid(), student_id UUID REFERENCES students(id),
+    course_id TEXT, course_name TEXT, grade TEXT);
+CREATE TABLE narrative_comments (id UUID PRIMARY KEY DEFAULT gen_random_uuid(), student_id UUID REFERENCES students(id),
+    subject TEXT, teacher TEXT, term TEXT, comment_text TEXT);
+CREATE TABLE attendance (id UUID PRIMARY KEY DEFAULT gen_random_uuid(), student_id UUID REFERENCES students(id),
+    excused INT, unexcused INT);
+"""
+
+def comment(text):
+    return {"subject": "Math", "teacher": "T", "term": "Fall", "comment_text": text}
+
+def course(course_id, grade):
+    return {"course_id": course_id, "course_name": "Course " + course_id, "grade": grade}
+
+# (table, stored rows, incoming rows)
+SCENARIOS = [
+    ("narrative_comments", [comment("Great"), comment("Great")], [comment("Great")]),
+    ("narrative_comments", [comment("Great")], [comment("Great"), comment("Great")]),
+    ("narrative_comments", [comment("Great"), comment("Great"), comment("Late")], [comment("Late"), comment("Great")]),
+    ("courses", [course("M1", "A")], [course("M1", "B"), course("M1", "C")]),
+    ("courses", [course("M1", "B"), course("M1", "C")], [course("M1", "D")]),
+    ("courses", [course("M1", "B"), course("M1", "C"), course("S1", "A")], [course("M1", "C"), course("M1", "B"), course("S1", "B")]),
+    ("attendance", [{"excused": 1, "unexcused": 0}], [{"excused": 2, "unexcused": 0}]),
+    ("courses", [course("M1", "A")], []),
+]
+
+@pytest.fixture(scope="module")
+def run_sql(tmp_path_factory):
+    url = os.getenv("TEST_DATABASE_URL")
+    if url:
+        psql = shutil.which("psql")
+        if not psql:
+            pytest.skip("psql is not available")
+        execute = lambda script: subprocess.check_output([psql, "-X", url], input=script.encode()).decode()
+    else:
+        pgserver = pytest.importorskip("pgserver")
+        execute = pgserver.get_server(str(tmp_path_factory.mktemp("pgdata")), cleanup_mode="stop").psql
+
+    def run(sql):
+        return execute(f"\\set ON_ERROR_STOP 1\n\\set QUIET 1\n\\pset tuples_only on\n\\pset format unaligned\nBEGIN;\n{sql}\nROLLBACK;\n")
+
+    return run
+
+def write_student_profile_sql():
+    schema = open(SCHEMA_SQL).read()
+    match = re.search(r"CREATE OR REPLACE FUNCTION write_student_profile\(.*?\$\$ LANGUAGE plpgsql;", schema, re.S)
+    return match.group(0)
+
+def literal(value):
+    return "$json$" + json.dumps(value) + "$json$::jsonb"
+
+def rows_sql(table, student_id):
+    return (
+        f"(SELECT COALESCE(jsonb_agg(to_jsonb(r) - 'id' - 'student_id' ORDER BY (to_jsonb(r) - 'id' - 'student_id')::text), '[]') "
+        f"FROM {table} r WHERE r.student_id = {student_id})"
+    )
+
+def scenario_sql(table, stored, incoming):
+    keys = {table: PROFILE_TABLE_NATURAL_KEYS[table]}
+    return f"""
+SELECT write_student_profile(NULL, '{{"first_name": "diff"}}', {literal({table: stored})}) AS diff_id \\gset
+SELECT write_student_profile(NULL, '{{"first_name": "replace"}}', {literal({table: stored})}) AS replace_id \\gset
+CREATE TEMP TABLE stored_ids AS SELECT id, to_jsonb(r) - 'id' AS row_data FROM {table} r WHERE student_id = :'diff_id';
+SELECT write_student_profile(:'diff_id', '{{}}', {literal({table: incoming})}, {literal(keys)});
+SELECT write_student_profile(:'replace_id', '{{}}', {literal({table: incoming})});
+SELECT jsonb_build_object(
+    'diff', {rows_sql(table, ":'diff_id'")},
+    'replace', {rows_sql(table, ":'replace_id'")},
+    'rewritten', (SELECT count(*) FROM stored_ids s WHERE NOT EXISTS (
+        SELECT 1 FROM {table} r WHERE r.id = s.id AND to_jsonb(r) - 'id' = s.row_data))
+);
+DROP TABLE stored_ids;
+"""
+
+def test_diff_mode_matches_replace_mode_with_duplicate_rows(run_sql):
+    output = run_sql(TABLES + write_student_profile_sql() + "".join(scenario_sql(*scenario) for scenario in SCENARIOS))
+    results = [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+    assert len(results) == len(SCENARIOS)
+    for (table, stored, incoming), result in zip(SCENARIOS, results):
+        assert result["diff"] == result["replace"], (table, stored, incoming)
+        assert len(result["diff"]) == len(incoming)
+
+    # Rows unchanged by the update keep their id and values; only the differences are written
+    assert [result["rewritten"] for result in results] == [1, 0, 1, 1, 2, 1, 1, 1]
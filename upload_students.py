@@ -1,14 +1,26 @@
+import asyncio
 import csv
 import json
+import shutil
+import tempfile
 import pandas as pd
-from io import StringIO
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, status
-from typing import List, Dict, Any, Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Body, Request, Response, status
+from operator import methodcaller
+from typing import List, Dict, Any, Optional, Tuple, BinaryIO, AsyncIterator
 from pydantic import ValidationError
 from supabase import Client
-from supabase_client import get_supabase_client, supabase
-from student_ingestion_route import StudentIngestionPayload, StudentProfileData, StudentInfoCore, Course, AssessmentBreakdown, GPAHistoryEntry, AttendanceData, Absences, Tardies, ExtracurricularActivity, IEP504Plan, CollegeMilestone, NarrativeComment, StaffNote, SoftSkillInference, UnstructuredData, _insert_single_student_profile_normalized, StudentData, StudentProfile, FinancialAid
+from supabase_client import get_supabase_client, execute_query
+from student_models import StudentIngestionPayload, StudentProfileData, StudentInfoCore, Course, AssessmentBreakdown, GPAHistoryEntry, AttendanceData, Absences, Tardies, ExtracurricularActivity, IEP504Plan, CollegeMilestone, NarrativeComment, StaffNote, SoftSkillInference, UnstructuredData, StudentData, StudentProfile, FinancialAid, Attendance, _student_profile_rows, content_hash
+from student_ingestion_route import _insert_single_student_profile_normalized, _insert_student_rows_batch, iter_csv_chunks, INGEST_BATCH_SIZE
 from auth_utils import get_current_user_role, get_current_admin_user
+from profile_cache import profile_cache
+from report_cache import report_cache
+from ingestion_jobs import IngestionJob, ingestion_jobs
+from content_hashing import fetch_stored_hashes, fetch_stored_hashes_sync
+from csv_decoding import decode_json_columns
+from column_normalization import normalize_columns, frame_to_records
+from payload_validation import validate_all, validate_chunk_async, INGEST_VALIDATION_CHUNK_SIZE
+from ingestion_pipeline import IngestionPipeline, PipelineStage, INGEST_VALIDATE_CONCURRENCY, INGEST_WRITE_CONCURRENCY
 from datetime import date
 import uuid
 import requests
@@ -22,6 +34,13 @@ router = APIRouter()
 def generate_uuid():
     return str(uuid.uuid4())
 
+# CSV columns map_csv_to_student_payload reads as JSON
+CSV_JSON_COLUMNS = [
+    "assessment_breakdown_by_type", "tardies_dates", "iep_accommodations", "courses", "gpa_history",
+    "extracurricular_activities", "college_counseling_milestones", "narrative_teacher_comments",
+    "advisory_counselor_notes", "behavior_social_emotional_notes", "soft_skill_inferences",
+]
+
 def parse_csv_to_json(file_content: bytes) -> List[Dict[str, Any]]:
     decoded_content = file_content.decode('utf-8').splitlines()
     reader = csv.DictReader(decoded_content)
@@ -36,6 +55,9 @@ def map_csv_to_student_payload(csv_data: Dict[str, Any]) -> StudentIngestionPayl
     # Example of handling nested JSON strings from CSV
     def parse_json_field(field_name: str, default_value: Any = None):
         value = csv_data.get(field_name)
+        if isinstance(value, (list, dict)):
+            # Already decoded column-wise by decode_json_columns
+            return value
         if value:
             try:
                 return json.loads(value)
@@ -49,6 +71,7 @@ def map_csv_to_student_payload(csv_data: Dict[str, Any]) -> StudentIngestionPayl
         grade_level=int(csv_data.get("grade_level", 0)),
         academic_year=csv_data.get("academic_year", "N/A"),
         status=csv_data.get("status", "None"),
+        email=csv_data.get("email") or None,
         assessment_breakdown_by_type=parse_json_field("assessment_breakdown_by_type", [])
     )
 
@@ -85,9 +108,7 @@ def map_csv_to_student_payload(csv_data: Dict[str, Any]) -> StudentIngestionPayl
             advisory_counselor_notes=parse_json_field("advisory_counselor_notes", []),
             behavior_social_emotional_notes=parse_json_field("behavior_social_emotional_notes", [])
         ),
-        soft_skill_inferences=SoftSkillInferences(
-            soft_skill_inferences=parse_json_field("soft_skill_inferences", [])
-        )
+        soft_skill_inferences=[SoftSkillInference(**inference) for inference in parse_json_field("soft_skill_inferences", [])]
     )
 
 def parse_csv_to_student_data(file_path: str) -> List[StudentData]:
@@ -172,6 +193,198 @@ def parse_json_to_student_data(file_path: str) -> List[StudentData]:
             ))
         return students_data
 
+# Upload content types accepted by the bulk endpoints
+BULK_UPLOAD_CONTENT_TYPES = {
+    "text/csv",
+    "application/json",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+async def _ingest_isolating_failures(batch: List[Tuple[int, Dict[str, Any]]], supabase: Any, job: IngestionJob) -> None:
+    """
+    Write (row number, _student_profile_rows entry) pairs in one batch. If the database rejects
+    the batch, it is split in halves and retried until the offending rows are isolated, so each
+    error is reported against its own row and the other rows are still written.
+    A failed batch leaves nothing behind (write_student_profiles rolls it back; the multi-row
+    fallback deletes the students it inserted, and fails without retrying if it cannot), so
+    retrying its halves cannot duplicate rows.
+    """
+    try:
+        student_ids = await _insert_student_rows_batch([profile_rows for _, profile_rows in batch], supabase)
+        job.record_processed(len(student_ids))
+        # Rewritten existing students may have cached assembled profiles
+        profile_cache.invalidate(*(profile_rows.get("id") for _, profile_rows in batch))
+    except Exception as e:
+        message = getattr(e, 'detail', None) or str(e)
+        # Only errors raised by the database point at bad rows; anything else (e.g. a network error) fails the batch
+        if len(batch) == 1 or getattr(e, "code", None) is None:
+            for row_number, _ in batch:
+                job.record_failed(row_number, message)
+            return
+        middle = len(batch) // 2
+        await _ingest_isolating_failures(batch[:middle], supabase, job)
+        await _ingest_isolating_failures(batch[middle:], supabase, job)
+
+async def _skip_unchanged_profiles(numbered_rows: List[Tuple[int, Dict[str, Any]]], supabase: Any, job: IngestionJob) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    Match profiles to stored students by email with one batched lookup. Unchanged profiles (same
+    content_hash) are counted and dropped, changed ones get the stored student's id so they are
+    rewritten in place, and profiles without a stored match are inserted as new students.
+    Profiles without an email have no natural key, so they can only be matched on content_hash:
+    re-uploading one unchanged skips it, but a changed one is inserted as a new student.
+    """
+    emails = [profile_rows["student"].get("email") for _, profile_rows in numbered_rows]
+    unkeyed_hashes = [profile_rows["student"]["content_hash"] for _, profile_rows in numbered_rows if not profile_rows["student"].get("email")]
+    try:
+        stored_by_email, stored_by_hash = await asyncio.gather(
+            fetch_stored_hashes(supabase, "email", emails),
+            fetch_stored_hashes(supabase, "content_hash", unkeyed_hashes),
+        )
+    except Exception as e:
+        # e.g. schema.sql (and its content_hash column) not applied yet
+        print(f"Warning: could not look up stored content hashes, writing every row: {e}")
+        return numbered_rows
+
+    to_write = []
+    unchanged = 0
+    for row_number, profile_rows in numbered_rows:
+        email = profile_rows["student"].get("email")
+        match = stored_by_email.get(email) if email else stored_by_hash.get(profile_rows["student"]["content_hash"])
+        if match is None:
+            to_write.append((row_number, profile_rows))
+        elif match["content_hash"] == profile_rows["student"]["content_hash"]:
+            unchanged += 1
+        else:
+            to_write.append((row_number, {**profile_rows, "id": match["id"]}))
+    job.record_unchanged(unchanged)
+    return to_write
+
+async def _ingest_profile_rows(numbered_rows: List[Tuple[int, Dict[str, Any]]], supabase: Any, job: IngestionJob) -> None:
+    numbered_rows = await _skip_unchanged_profiles(numbered_rows, supabase, job)
+    # One multi-row insert per table per batch instead of a round trip per student
+    for batch_start in range(0, len(numbered_rows), INGEST_BATCH_SIZE):
+        await _ingest_isolating_failures(numbered_rows[batch_start:batch_start + INGEST_BATCH_SIZE], supabase, job)
+
+def _prepare_csv_chunk(chunk: pd.DataFrame, first_row: int) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]], List[Tuple[int, str]]]:
+    """
+    Decode, map and convert one chunk of a CSV upload to write_student_profiles rows; runs on a
+    worker thread. Returns (row number, profile rows) pairs, the malformed cells and the rows
+    that could not be mapped.
+    """
+    # Nested JSON columns are decoded a whole column at a time; malformed cells are reported
+    # against their row and column and fall back to the field's default
+    cell_errors: List[Dict[str, Any]] = []
+    for column, values in decode_json_columns(chunk, CSV_JSON_COLUMNS, cell_errors, first_row=first_row).items():
+        chunk[column] = pd.Series(values, index=chunk.index, dtype=object)
+
+    numbered_rows = []
+    failed_rows = []
+    for row_number, item in enumerate(chunk.to_dict(orient="records"), start=first_row):
+        try:
+            numbered_rows.append((row_number, _student_profile_rows(map_csv_to_student_payload(item))))
+        except Exception as e:
+            failed_rows.append((row_number, f"Could not parse row: {e}"))
+    return numbered_rows, cell_errors, failed_rows
+
+async def _numbered_csv_chunks(file: BinaryIO) -> AsyncIterator[Tuple[int, pd.DataFrame]]:
+    # Streamed: memory stays bounded by INGEST_CSV_CHUNK_ROWS (times the chunks queued in the pipeline)
+    first_row = 1
+    async for chunk in iter_csv_chunks(file, dtype=str, keep_default_na=False):
+        yield first_row, chunk
+        first_row += len(chunk)
+
+async def _numbered_json_chunks(file: BinaryIO, job: IngestionJob) -> AsyncIterator[Tuple[int, List[Any]]]:
+    data_list = json.loads(await asyncio.to_thread(file.read))
+    if not isinstance(data_list, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="JSON file must contain a list of student objects.")
+    job.total_rows = len(data_list)
+    for chunk_start in range(0, len(data_list), INGEST_VALIDATION_CHUNK_SIZE):
+        yield chunk_start + 1, data_list[chunk_start:chunk_start + INGEST_VALIDATION_CHUNK_SIZE]
+
+async def _ingest_students_file(file: BinaryIO, content_type: str, supabase: Any, job: IngestionJob) -> None:
+    """
+    Ingest a CSV, JSON or Excel file of student profiles, recording progress and per-row errors
+    on `job`. Shared by the synchronous bulk upload and background ingestion jobs.
+    CSV and JSON run as a parse -> validate -> write IngestionPipeline, whose per-stage timings
+    are reported in the job summary.
+    """
+    async def write(numbered_rows: List[Tuple[int, Dict[str, Any]]]) -> None:
+        await _ingest_profile_rows(numbered_rows, supabase, job)
+
+    if content_type == "text/csv":
+        async def validate_csv(numbered_chunk: Tuple[int, pd.DataFrame]) -> List[Tuple[int, Dict[str, Any]]]:
+            first_row, chunk = numbered_chunk
+            numbered_rows, cell_errors, failed_rows = await asyncio.to_thread(_prepare_csv_chunk, chunk, first_row)
+            for cell_error in cell_errors:
+                job.record_cell_error(cell_error["row"], cell_error["column"], cell_error["error"])
+            for row_number, message in failed_rows:
+                job.record_failed(row_number, message)
+            return numbered_rows
+
+        job.pipeline = IngestionPipeline("parse", _numbered_csv_chunks(file), [
+            PipelineStage("validate", validate_csv, INGEST_VALIDATE_CONCURRENCY),
+            PipelineStage("write", write, INGEST_WRITE_CONCURRENCY),
+        ])
+        await job.pipeline.run()
+    elif content_type == "application/json":
+        async def validate_json(numbered_chunk: Tuple[int, List[Any]]) -> List[Tuple[int, Dict[str, Any]]]:
+            first_row, items = numbered_chunk
+            # On the validation worker processes
+            numbered_rows, invalid_rows = await validate_chunk_async(items, StudentIngestionPayload, _student_profile_rows, first_row)
+            for row_number, message in invalid_rows:
+                job.record_failed(row_number, f"Invalid student object: {message}")
+            return numbered_rows
+
+        job.pipeline = IngestionPipeline("parse", _numbered_json_chunks(file, job), [
+            PipelineStage("validate", validate_json, INGEST_VALIDATE_CONCURRENCY),
+            PipelineStage("write", write, INGEST_WRITE_CONCURRENCY),
+        ])
+        await job.pipeline.run()
+    elif content_type == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":
+        df = await asyncio.to_thread(pd.read_excel, file)
+        job.total_rows = len(df)
+        students_data = df.to_dict(orient="records")
+        response = await execute_query(supabase.from_("students").upsert(students_data, on_conflict="student_id"))
+        # Upserts may overwrite existing students whose assembled profiles are cached
+        profile_cache.invalidate(*(row.get("id") for row in response.data or []))
+        report_cache.invalidate()
+
+        if response.data:
+            job.record_processed(len(response.data))
+        elif response.error:
+            job.record_failed(None, f"Supabase error: {response.error.message}", count=len(students_data))
+        else:
+            job.record_failed(None, "No data processed, check Excel content.", count=len(students_data))
+    else:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file type. Only CSV, JSON, and Excel are allowed.")
+
+def _spool_upload(source: BinaryIO, content_type: str) -> Tuple[BinaryIO, Optional[int]]:
+    """
+    Copy an upload to a temporary file the background job owns (the request closes its own copy
+    when the response is sent). For CSV, the data rows are counted while copying; quoted fields
+    spanning several lines make this an estimate.
+    """
+    spool = tempfile.TemporaryFile()
+    total_rows = None
+    if content_type == "text/csv":
+        line_count = 0
+        last_block = b""
+        while True:
+            block = source.read(1024 * 1024)
+            if not block:
+                break
+            spool.write(block)
+            line_count += block.count(b"\n")
+            last_block = block
+        if last_block and not last_block.endswith(b"\n"):
+            line_count += 1
+        # Minus the header row
+        total_rows = max(line_count - 1, 0)
+    else:
+        shutil.copyfileobj(source, spool)
+    spool.seek(0)
+    return spool, total_rows
+
 @router.post("/upload/students-bulk", status_code=status.HTTP_201_CREATED)
 async def upload_students_bulk(
     file: UploadFile = File(...),
@@ -184,87 +397,99 @@ async def upload_students_bulk(
     if not file.filename:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file uploaded.")
 
-    file_content = await file.read()
-    processed_count = 0
-    failed_count = 0
-    errors = []
-
+    job = IngestionJob(filename=file.filename)
     try:
-        if file.content_type == "text/csv":
-            data_list = parse_csv_to_json(file_content)
-            payloads = [map_csv_to_student_payload(item) for item in data_list]
-        elif file.content_type == "application/json":
-            data_list = json.loads(file_content)
-            if not isinstance(data_list, list):
-                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="JSON file must contain a list of student objects.")
-            payloads = [StudentIngestionPayload(**item) for item in data_list]
-        elif file.content_type == "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet":
-            df = pd.read_excel(file.file)
-            students_data = df.to_dict(orient="records")
-            response = supabase.from_("students").upsert(students_data, on_conflict="student_id").execute()
-
-            if response.data:
-                processed_count += len(response.data)
-            elif response.error:
-                errors.append(f"Supabase error: {response.error.message}")
-            else:
-                errors.append("No data processed, check Excel content.")
-        else:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file type. Only CSV, JSON, and Excel are allowed.")
-
-        for payload in payloads:
-            try:
-                student_info = payload.student_profile.student_info.model_dump()
-                courses = [c.model_dump() for c in payload.student_profile.courses]
-                gpa_history = [g.model_dump() for g in payload.student_profile.gpa_history]
-                attendance = payload.student_profile.attendance.model_dump() if payload.student_profile.attendance else None
-                extracurricular_activities = [e.model_dump() for e in payload.student_profile.extracurricular_activities]
-                iep_504_plan_information = payload.student_profile.iep_504_plan_information.model_dump() if payload.student_profile.iep_504_plan_information else None
-                college_counseling_milestones = [c.model_dump() for c in payload.student_profile.college_counseling_milestones]
-
-                narrative_teacher_comments = [c.model_dump() for c in payload.unstructured_data.narrative_teacher_comments]
-                advisory_counselor_notes = [n.model_dump() for n in payload.unstructured_data.advisory_counselor_notes]
-                behavior_social_emotional_notes = [n.model_dump() for n in payload.unstructured_data.behavior_social_emotional_notes]
-
-                soft_skill_inferences = [s.model_dump() for s in payload.soft_skill_inferences.soft_skill_inferences]
-
-                response = supabase.from_("students").insert({
-                    "full_name": student_info["full_name"],
-                    "grade_level": student_info["grade_level"],
-                    "academic_year": student_info["academic_year"],
-                    "status": student_info["status"],
-                    "assessment_breakdown_by_type": student_info["assessment_breakdown_by_type"],
-                    "courses": courses,
-                    "gpa_history": gpa_history,
-                    "attendance": attendance,
-                    "extracurricular_activities": extracurricular_activities,
-                    "iep_504_plan_information": iep_504_plan_information,
-                    "college_counseling_milestones": college_counseling_milestones,
-                    "narrative_teacher_comments": narrative_teacher_comments,
-                    "advisory_counselor_notes": advisory_counselor_notes,
-                    "behavior_social_emotional_notes": behavior_social_emotional_notes,
-                    "soft_skill_inferences": soft_skill_inferences
-                }).execute()
-
-                if response.data:
-                    processed_count += 1
-                else:
-                    failed_count += 1
-                    errors.append(f"Failed to ingest {payload.student_profile.student_info.full_name}: {response.error.message if response.error else 'Unknown error'}")
-            except Exception as e:
-                failed_count += 1
-                errors.append(f"Error processing a student record: {str(e)}")
-
+        await _ingest_students_file(file.file, file.content_type, supabase, job)
+    except HTTPException as e:
+        raise e
     except json.JSONDecodeError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid JSON format.")
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An error occurred during file processing: {str(e)}")
 
     return {
-        "message": f"Bulk upload complete. Successfully processed {processed_count} records, failed {failed_count} records.",
-        "details": errors
+        "message": f"Bulk upload complete. Successfully processed {job.rows_processed} records, skipped {job.rows_unchanged} unchanged records, failed {job.rows_failed} records.",
+        "details": job.error_messages(),
+        "stages": job.summary()["stages"]
     }
 
+@router.post("/upload/students-bulk/jobs", status_code=status.HTTP_202_ACCEPTED)
+async def submit_students_bulk_job(
+    request: Request,
+    file: UploadFile = File(...),
+    supabase: Any = Depends(get_supabase_client),
+    user_role: str = Depends(get_current_user_role)
+):
+    """
+    Accept a bulk upload as a background job and return its id immediately.
+    Poll GET /jobs/{job_id} for progress; per-row errors are at GET /jobs/{job_id}/errors.
+    The job runs in this worker process, which must outlive the request: progress is saved to
+    the ingestion_jobs table so any worker can answer the polls, but a job is not resumed if its
+    worker stops (it is then reported as failed). Serverless deployments such as Vercel freeze
+    the process after the response, so the endpoint is refused there.
+    """
+    if user_role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only administrators can bulk upload student data.")
+    if os.getenv("VERCEL"):
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Background upload jobs need a long-running server; use POST /upload/students-bulk on this deployment."
+        )
+
+    if not file.filename:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No file uploaded.")
+    if file.content_type not in BULK_UPLOAD_CONTENT_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Unsupported file type. Only CSV, JSON, and Excel are allowed.")
+
+    spool, total_rows = await asyncio.to_thread(_spool_upload, file.file, file.content_type)
+    content_type = file.content_type
+
+    async def run(job: IngestionJob) -> None:
+        try:
+            await _ingest_students_file(spool, content_type, supabase, job)
+        finally:
+            spool.close()
+
+    job = ingestion_jobs.submit(IngestionJob(filename=file.filename, total_rows=total_rows), run)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": str(request.url_for("get_ingestion_job", job_id=job.id)),
+    }
+
+async def _get_job_or_404(job_id: str) -> IngestionJob:
+    job = await ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found or expired.")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(job_id: str, request: Request, user_role: str = Depends(get_current_user_role)):
+    """
+    Status of a background upload: rows processed, failed and remaining, and throughput.
+    """
+    if user_role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only administrators can view upload jobs.")
+    job = await _get_job_or_404(job_id)
+    errors_url = str(request.url_for("download_ingestion_job_errors", job_id=job_id)) if job.errors else None
+    return {**job.summary(), "errors_url": errors_url}
+
+@router.get("/jobs/{job_id}/errors")
+async def download_ingestion_job_errors(job_id: str, user_role: str = Depends(get_current_user_role)):
+    """
+    Download the per-row errors of a background upload as CSV.
+    """
+    if user_role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only administrators can view upload jobs.")
+    job = await _get_job_or_404(job_id)
+    if job.status not in ("completed", "failed"):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Job is still running.")
+    return Response(
+        content=job.error_report_csv(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="ingestion-job-{job_id}-errors.csv"'}
+    )
+
 @router.post("/upload/csv", status_code=status.HTTP_201_CREATED)
 async def upload_students_csv(
     file: UploadFile = File(...),
@@ -278,38 +503,44 @@ async def upload_students_csv(
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only CSV files are allowed.")
 
+    uploaded_count = 0
     try:
-        contents = await file.read()
-        df = pd.read_csv(StringIO(contents.decode('utf-8')))
+        # Streamed: each chunk is validated and inserted before the next one is parsed
+        async for chunk in iter_csv_chunks(file.file):
+            # Convert the chunk to a list of dictionaries, ensuring types match Pydantic model
+            students_data = chunk.to_dict(orient="records")
+
+            # Validate each record against the StudentProfile Pydantic model
+            validated_students = []
+            for student_dict in students_data:
+                try:
+                    # Ensure all required fields are present, even if empty in CSV
+                    # Pydantic will handle type coercion where possible
+                    validated_students.append(StudentProfileData(**student_dict))
+                except Exception as e:
+                    already_uploaded = f" ({uploaded_count} profiles from earlier rows were already uploaded)" if uploaded_count else ""
+                    raise HTTPException(
+                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        detail=f"Validation error in CSV data: {e} for row: {student_dict}{already_uploaded}"
+                    )
+
+            # Insert data into Supabase
+            # Supabase client's insert method expects a list of dictionaries
+            insert_payload = [student.dict() for student in validated_students]
+            response = await execute_query(supabase.from_("students").insert(insert_payload))
+            report_cache.invalidate()
 
-        # Convert DataFrame to a list of dictionaries, ensuring types match Pydantic model
-        students_data = df.to_dict(orient="records")
-        
-        # Validate each record against the StudentProfile Pydantic model
-        validated_students = []
-        for student_dict in students_data:
-            try:
-                # Ensure all required fields are present, even if empty in CSV
-                # Pydantic will handle type coercion where possible
-                validated_students.append(StudentProfileData(**student_dict))
-            except Exception as e:
-                raise HTTPException(
-                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                    detail=f"Validation error in CSV data: {e} for row: {student_dict}"
-                )
-
-        # Insert data into Supabase
-        # Supabase client's insert method expects a list of dictionaries
-        insert_payload = [student.dict() for student in validated_students]
-        response = supabase.from_("students").insert(insert_payload).execute()
+            if response.data:
+                uploaded_count += len(response.data)
+            elif response.error:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=response.error.message)
+            else:
+                raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unknown error during CSV upload.")
 
-        if response.data:
-            return {"message": f"Successfully uploaded {len(response.data)} student profiles from CSV."}
-        elif response.error:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=response.error.message)
-        else:
-            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Unknown error during CSV upload.")
+        return {"message": f"Successfully uploaded {uploaded_count} student profiles from CSV."}
 
+    except HTTPException as e:
+        raise e
     except pd.errors.EmptyDataError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="CSV file is empty.")
     except pd.errors.ParserError:
@@ -317,20 +548,46 @@ async def upload_students_csv(
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"An error occurred: {str(e)}")
 
-@router.post("/upload/json", status_code=status.HTTP_201_CREATED)
+def _inline_schema_refs(schema: Any, definitions: Dict[str, Any]) -> Any:
+    """Replaces pydantic's local $defs references with the definitions themselves."""
+    if isinstance(schema, list):
+        return [_inline_schema_refs(item, definitions) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    if "$ref" in schema:
+        return _inline_schema_refs(definitions[schema["$ref"].rsplit("/", 1)[-1]], definitions)
+    return {key: _inline_schema_refs(value, definitions) for key, value in schema.items() if key != "$defs"}
+
+def _array_request_body(model: Any) -> Dict[str, Any]:
+    """OpenAPI requestBody for a JSON array of model, for routes that validate the items themselves."""
+    item_schema = model.model_json_schema()
+    items = _inline_schema_refs(item_schema, item_schema.get("$defs", {}))
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": {"type": "array", "items": items}}}}}
+
+# The items are declared as Any so FastAPI only checks for a JSON array; the profiles themselves are
+# validated on the worker processes, and the OpenAPI schema still documents them
+@router.post("/upload/json", status_code=status.HTTP_201_CREATED, openapi_extra=_array_request_body(StudentProfileData))
 async def upload_students_json(
-    students: List[StudentProfileData],
+    students: List[Any] = Body(..., media_type="application/json"),
     supabase: Client = Depends(get_supabase_client),
     current_user: dict = Depends(get_current_admin_user) # Only admins can upload
 ):
     """
-    Upload student profiles from a JSON array.
-    Requires admin authentication.
+    Upload student profiles from a JSON array of StudentProfileData objects.
+    Requires admin authentication. The array is validated in chunks on the validation worker
+    processes rather than on the event loop; nothing is written unless every item is valid.
     """
+    numbered_rows, invalid_rows = await validate_all(students, StudentProfileData, methodcaller("model_dump"))
+    if invalid_rows:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=[{"row": row_number, "error": message} for row_number, message in invalid_rows]
+        )
+
     try:
-        # Pydantic already validates the incoming list of StudentProfile objects
-        insert_payload = [student.dict() for student in students]
-        response = supabase.from_("students").insert(insert_payload).execute()
+        insert_payload = [row for _, row in numbered_rows]
+        response = await execute_query(supabase.from_("students").insert(insert_payload))
+        report_cache.invalidate()
 
         if response.data:
             return {"message": f"Successfully uploaded {len(response.data)} student profiles from JSON."}
@@ -347,6 +604,7 @@ def upload_students_from_excel(file_path: str):
     Reads student data from an Excel file and uploads it to Supabase.
     Assumes the Excel file has columns matching your Supabase 'students' table.
     """
+    supabase = get_supabase_client()
     try:
         df = pd.read_excel(file_path)
         # Convert DataFrame to a list of dictionaries (JSON records)
@@ -355,6 +613,8 @@ def upload_students_from_excel(file_path: str):
         # Perform bulk upsert (insert or update) into Supabase
         # Assuming 'student_id' is the unique identifier for upsert
         response = supabase.from_("students").upsert(students_data, on_conflict="student_id").execute()
+        profile_cache.invalidate(*(row.get("id") for row in response.data or []))
+        report_cache.invalidate()
 
         if response.data:
             print(f"Successfully processed {len(response.data)} student records.")
@@ -371,32 +631,60 @@ def upload_students_from_dataframe(df: pd.DataFrame) -> List[Dict[str, Any]]:
     Uploads student data from a pandas DataFrame to Supabase.
     Assumes DataFrame columns map directly to Supabase table columns,
     with complex types (JSONB) handled as JSON strings.
+    Each row is stored with a content_hash; on re-upload, rows whose stored hash matches are
+    skipped and the rest are upserted on student_id in INGEST_BATCH_SIZE chunks.
     """
+    supabase = get_supabase_client()
     uploaded_students = []
-    for index, row in df.iterrows():
-        student_data = row.to_dict()
+    if 'student_id' not in df.columns:
+        print("Skipping all rows: 'student_id' column is missing.")
+        return uploaded_students
+
+    # Convert complex fields to JSON strings and NaN values from pandas to None, a column at a time
+    object_columns = [column for column in df.columns if df[column].dtype == object]
+    normalized = normalize_columns(df, json_columns=object_columns)
 
-        # Convert complex fields to JSON strings if they are dicts/lists
-        for key, value in student_data.items():
-            if isinstance(value, (dict, list)):
-                student_data[key] = json.dumps(value)
-            elif pd.isna(value): # Handle NaN values from pandas
-                student_data[key] = None
+    # Ensure student_id is present and unique (Supabase handles uniqueness if it's primary key)
+    missing_student_id = normalized['student_id'].isna()
+    for index in normalized.index[missing_student_id]:
+        print(f"Skipping row {index}: 'student_id' is missing or null.")
 
-        # Ensure student_id is present and unique (Supabase handles uniqueness if it's primary key)
-        if 'student_id' not in student_data or student_data['student_id'] is None:
-            print(f"Skipping row {index}: 'student_id' is missing or null.")
-            continue
+    # A student_id repeated in the sheet would fail the upsert; its last row wins
+    rows_by_student_id = {}
+    for student_data in frame_to_records(normalized[~missing_student_id]):
+        student_data["content_hash"] = content_hash(student_data)
+        rows_by_student_id[student_data["student_id"]] = student_data
 
+    try:
+        stored = fetch_stored_hashes_sync(supabase, "student_id", rows_by_student_id)
+    except Exception as e:
+        print(f"Warning: could not look up stored content hashes, uploading every row: {e}")
+        stored = {}
+        # e.g. schema.sql not applied yet, in which case the content_hash column is missing too
+        for student_data in rows_by_student_id.values():
+            del student_data["content_hash"]
+    rows_to_upload = [
+        student_data for student_id, student_data in rows_by_student_id.items()
+        if student_id not in stored or stored[student_id]["content_hash"] != student_data["content_hash"]
+    ]
+    unchanged_count = len(rows_by_student_id) - len(rows_to_upload)
+    if unchanged_count:
+        print(f"Skipping {unchanged_count} unchanged students.")
+
+    for batch_start in range(0, len(rows_to_upload), INGEST_BATCH_SIZE):
+        batch = rows_to_upload[batch_start:batch_start + INGEST_BATCH_SIZE]
         try:
-            # Attempt to insert the student data
-            response = supabase.from_("students").insert([student_data]).execute()
+            # New students are inserted and changed ones updated in place, one request per chunk
+            response = supabase.from_("students").upsert(batch, on_conflict="student_id").execute()
             if response.data:
-                uploaded_students.append(response.data[0])
-            elif response.error:
-                print(f"Error uploading student {student_data.get('student_id')}: {response.error.message}")
+                uploaded_students.extend(response.data)
+            elif getattr(response, "error", None):
+                print(f"Error uploading students {batch[0]['student_id']}..{batch[-1]['student_id']}: {response.error.message}")
         except Exception as e:
-            print(f"An unexpected error occurred for student {student_data.get('student_id')}: {e}")
+            print(f"An unexpected error occurred for students {batch[0]['student_id']}..{batch[-1]['student_id']}: {e}")
+    if uploaded_students:
+        profile_cache.invalidate(*(row.get("id") for row in uploaded_students))
+        report_cache.invalidate()
     return uploaded_students
 
 def process_csv_upload(file_path: str) -> List[Dict[str, Any]]: